@@ -1,20 +1,38 @@
 from __future__ import annotations
 
+import asyncio
 import json
 import time
-from typing import Any, Dict, List, Optional
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Sequence, Tuple
 
 from pydantic import BaseModel, ValidationError
 
 from schemas.agent import AgentRunRequest
-from schemas.tools import ToolCall, ToolChoice
-from schemas.trace import StepTrace, TraceEvent
+from schemas.tools import ToolCall, ToolChoice, ToolResult
+from schemas.trace import RunTrace, StepTrace, ToolCallTiming, TraceEvent
+from utils.cache import DecisionCache, decision_cache
 from utils.config import settings
 from utils.llm import get_llm_client
+from utils.metrics import CONTROLLER_REPLIES_TOTAL, RUNS_TOTAL, elapsed_ms, span
+from utils.prompt import count_tokens, truncate_tokens, window_history
 from utils.registry import ToolRegistry
+from utils.router import Route, RuleRouter, rule_router
+from utils.speculation import Speculation, Speculator
+from utils.structured import JSONObjectScanner, extract_json_object
 from utils.tracing import TraceStore
 
 
+CONTROLLER_SYSTEM_PROMPT = (
+    "You are an agent controller. Return ONLY valid JSON for ToolChoice. "
+    "Schema: {action: 'tool'|'final', tool_call?: {tool_name, arguments}, "
+    "tool_calls?: [{tool_name, arguments}], final?: string}. "
+    "Use tool_calls to run several independent tools in one step."
+)
+_SYSTEM_TOKENS = count_tokens(CONTROLLER_SYSTEM_PROMPT)
+# "User message:", "Plan:", "Observation:", "Available tools:" and the closing line
+_TEMPLATE_TOKENS = 24
+
+
 class Agent:
     """A minimal Agent SDK-style loop.
 
@@ -32,86 +50,203 @@ class Agent:
         self,
         registry: ToolRegistry,
         trace_store: TraceStore,
+        decisions: Optional[DecisionCache] = None,
+        llm_client: Optional[Callable[[Optional[str]], Any]] = None,
+        router: Optional[RuleRouter] = None,
+        speculator: Optional[Speculator] = None,
     ):
         self.registry = registry
         self.trace_store = trace_store
+        self.decisions = decisions or decision_cache
+        # Optional factory (api_key -> client with chat/chat_stream/model, both
+        # taking json_mode=), e.g. a cassette replayer. When set, the LLM controller is used even in MOCK_MODE.
+        self.llm_client = llm_client
+        # Rule tier consulted before the LLM controller (real LLM mode only).
+        self.router = router or rule_router
+        # Runs the router's predicted tool calls while the LLM decides (real LLM mode only).
+        self.speculator = speculator or Speculator(
+            registry,
+            enabled=settings.speculation_enabled,
+            max_inflight=settings.speculation_max_inflight,
+            budget_ms=settings.speculation_budget_ms,
+        )
 
-    async def run(self, req: AgentRunRequest) -> tuple[str, str]:
-        run = self.trace_store.new_run(input_payload=req.model_dump())
-        t0 = self.trace_store.now_ms()
+    async def run(self, req: AgentRunRequest, run_id: Optional[str] = None) -> tuple[str, str]:
+        final = ""
+        async for event in self.run_stream(req, stream_tokens=False, run_id=run_id):
+            if event["type"] == "final":
+                run_id, final = event["run_id"], event["final"]
+        return run_id, final
 
-        try:
-            observation = ""
-            for step in range(1, req.max_steps + 1):
-                step_t0 = self.trace_store.now_ms()
-
-                plan = self._plan(req.message, observation)
-
-                choice = await self._choose_tool(
-                    req.message,
-                    plan,
-                    observation,
-                    api_key_override=req.api_key,
-                    force_mock=req.force_mock,
-                )
+    async def run_stream(
+        self, req: AgentRunRequest, stream_tokens: bool = True, run_id: Optional[str] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """Run the loop, yielding events as they happen.
+
+        Event types: run_started, step_started, token (controller output as
+        it streams in, real LLM mode only), tool_started, tool_finished,
+        step_finished and final (always last). ``run_id`` is preset for
+        queued runs, whose id is handed out before they start.
+        """
+        run = self.trace_store.new_run(input_payload=req.model_dump(), run_id=run_id)
+        speculation = self.speculator.session(run, self.trace_store.now_ms)
+        t0 = time.perf_counter_ns()
+        yield {"type": "run_started", "run_id": run.run_id}
+
+        with span("run", run_id=run.run_id):
+            try:
+                observation = ""
+                prev_tools: List[str] = []  # tools behind the current observation
+                # Windowed once per run: the newest turns that fit PROMPT_HISTORY_TOKENS.
+                history = window_history([m.model_dump() for m in req.history], settings.prompt_history_tokens)
+                if len(history[0]) < len(req.history):
+                    run.counters["history_dropped"] = len(req.history) - len(history[0])
+                for step in range(1, req.max_steps + 1):
+                    step_t0 = self.trace_store.now_ms()
+
+                    with span("plan"):
+                        plan = self._plan(req.message, observation)
+                    yield {"type": "step_started", "step": step, "plan": plan}
+
+                    choice = None
+                    with span("decide", step=step):
+                        async for kind, payload in self._choose_tool_events(
+                            req.message,
+                            plan,
+                            observation,
+                            api_key_override=req.api_key,
+                            force_mock=req.force_mock,
+                            stream=stream_tokens,
+                            run=run,
+                            history=history,
+                            prev_tools=prev_tools,
+                            speculation=speculation,
+                        ):
+                            if kind == "token":
+                                yield {"type": "token", "step": step, "text": payload}
+                            else:
+                                choice = payload
+
+                    calls = choice.calls() if choice.action == "tool" else []
+                    prev_tools = [c.tool_name for c in calls]
+                    results: List[ToolResult] = []
+                    timings: List[ToolCallTiming] = []
+                    if calls:
+                        for i, call in enumerate(calls):
+                            run.events.append(
+                                TraceEvent(t_ms=self.trace_store.now_ms(), type="tool_started", data={"index": i, **call.model_dump()})
+                            )
+                            yield {"type": "tool_started", "step": step, "index": i, "tool_call": call.model_dump()}
+
+                        by_index: Dict[int, Tuple[ToolResult, ToolCallTiming]] = {}
+                        with span("tools", step=step, calls=len(calls)):
+                            async for i, result, timing in self._run_tools(calls, speculation):
+                                by_index[i] = (result, timing)
+                                run.events.append(
+                                    TraceEvent(
+                                        t_ms=timing.ended_at_ms,
+                                        type="tool_cache_hit" if result.cached else "tool_finished",
+                                        data={"index": i, **result.model_dump()},
+                                    )
+                                )
+                                yield {
+                                    "type": "tool_finished",
+                                    "step": step,
+                                    "index": i,
+                                    "tool_result": result.model_dump(),
+                                    "timing": timing.model_dump(),
+                                }
+                        # Completion order varies; observations always follow call order.
+                        results = [by_index[i][0] for i in range(len(calls))]
+                        timings = [by_index[i][1] for i in range(len(calls))]
+                        with span("observe"):
+                            observation = "\n\n".join(self._observe(c, r) for c, r in zip(calls, results))
+                    speculation.discard()
 
-                tool_call: ToolCall | None = None
-                tool_result = None
-                if choice.action == "tool" and choice.tool_call is not None:
-                    tool_call = choice.tool_call
-                    run.events.append(TraceEvent(t_ms=self.trace_store.now_ms(), type="tool_started", data=tool_call.model_dump()))
-                    tool_result = self.registry.run(tool_call.tool_name, tool_call.arguments)
-                    run.events.append(
-                        TraceEvent(
-                            t_ms=self.trace_store.now_ms(),
-                            type="tool_finished",
-                            data=tool_result.model_dump(),
-                        )
-                    )
-                    observation = self._observe(tool_call, tool_result)
-                else:
-                    final = choice.final or "(no final)"
                     step_t1 = self.trace_store.now_ms()
                     run.steps.append(
                         StepTrace(
                             step=step,
                             plan=plan,
-                            tool_call=tool_call,
-                            tool_result=tool_result,
+                            tool_call=calls[0] if calls else None,
+                            tool_result=results[0] if results else None,
+                            tool_calls=calls,
+                            tool_results=results,
+                            tool_timings=timings,
                             observation=observation,
                             started_at_ms=step_t0,
                             ended_at_ms=step_t1,
                         )
                     )
-                    run.final = final
-                    run.duration_ms = self.trace_store.now_ms() - t0
-                    self.trace_store.save(run)
-                    return run.run_id, final
-
-                step_t1 = self.trace_store.now_ms()
-                run.steps.append(
-                    StepTrace(
-                        step=step,
-                        plan=plan,
-                        tool_call=tool_call,
-                        tool_result=tool_result,
-                        observation=observation,
-                        started_at_ms=step_t0,
-                        ended_at_ms=step_t1,
-                    )
-                )
+                    yield {"type": "step_finished", "step": step, "observation": observation, "ms": step_t1 - step_t0}
 
-            # max steps reached
-            run.final = f"Reached max_steps={req.max_steps}. Last observation: {observation}".strip()
-            run.duration_ms = self.trace_store.now_ms() - t0
-            self.trace_store.save(run)
-            return run.run_id, run.final
+                    if not calls:
+                        final = choice.final or "(no final)"
+                        run.final = final
+                        self._finish(run, t0, "ok")
+                        yield {"type": "final", "run_id": run.run_id, "final": final}
+                        return
+
+                # max steps reached
+                run.final = f"Reached max_steps={req.max_steps}. Last observation: {observation}".strip()
+                self._finish(run, t0, "max_steps")
+                yield {"type": "final", "run_id": run.run_id, "final": run.final}
+
+            except (asyncio.CancelledError, GeneratorExit):
+                # DELETE /api/run/{id}, or a stream client that went away: keep the partial trace.
+                # A consumer closing us at the final event finds the run already finished.
+                if run.duration_ms is None:
+                    run.error = "cancelled"
+                    self._finish(run, t0, "cancelled")
+                raise
+            except Exception as e:
+                run.error = str(e)
+                self._finish(run, t0, "error")
+                yield {"type": "final", "run_id": run.run_id, "final": f"Error: {e}", "error": str(e)}
+            finally:
+                speculation.discard()
 
-        except Exception as e:
-            run.error = str(e)
-            run.duration_ms = self.trace_store.now_ms() - t0
+    def _finish(self, run: RunTrace, t0_ns: int, status: str) -> None:
+        # Durations come from the monotonic clock; *_at_ms fields stay wall-clock timestamps.
+        run.duration_ms = elapsed_ms(t0_ns)
+        with span("persist"):
             self.trace_store.save(run)
-            return run.run_id, f"Error: {e}"
+        RUNS_TOTAL.inc(status=status)
+
+    async def _run_tools(
+        self, calls: List[ToolCall], speculation: Optional[Speculation] = None
+    ) -> AsyncIterator[Tuple[int, ToolResult, ToolCallTiming]]:
+        """Run independent calls concurrently (at most ``max_parallel_tools`` at once).
+
+        Calls already started speculatively are awaited instead of run again.
+        Yields (index, result, timing) in completion order.
+        """
+        limit = asyncio.Semaphore(max(1, settings.max_parallel_tools))
+
+        async def one(i: int, call: ToolCall) -> Tuple[int, ToolResult, ToolCallTiming]:
+            async with limit:
+                started = self.trace_store.now_ms()
+                result = await speculation.take(call) if speculation is not None else None
+                speculative = result is not None
+                if result is None:
+                    result = await self.registry.arun(call.tool_name, call.arguments)
+                timing = ToolCallTiming(
+                    index=i,
+                    tool_name=call.tool_name,
+                    started_at_ms=started,
+                    ended_at_ms=self.trace_store.now_ms(),
+                    cached=result.cached,
+                    speculative=speculative,
+                )
+                return i, result, timing
+
+        tasks = [asyncio.ensure_future(one(i, c)) for i, c in enumerate(calls)]
+        try:
+            for fut in asyncio.as_completed(tasks):
+                yield await fut
+        finally:
+            for t in tasks:
+                t.cancel()
 
     def _plan(self, user_message: str, observation: str) -> str:
         # deterministic "planner" - a real system might ask the LLM here.
@@ -126,64 +261,300 @@ class Agent:
         observation: str,
         api_key_override: str | None = None,
         force_mock: bool = False,
+        run: RunTrace | None = None,
+        history: Tuple[Sequence[Dict[str, str]], int] = ((), 0),
+        speculation: Optional[Speculation] = None,
     ) -> ToolChoice:
-        api_key = api_key_override or settings.openai_api_key
-        if force_mock or settings.mock_mode or not api_key:
+        if not self._use_llm(api_key_override, force_mock):
             return self._mock_choose_tool(user_message, observation)
 
         # Real LLM path: ask for a ToolChoice JSON object.
-        specs = [s.model_dump() for s in self.registry.list_specs()]
-        sys = (
-            "You are an agent controller. Return ONLY valid JSON for ToolChoice. "
-            "Schema: {action: 'tool'|'final', tool_call?: {tool_name, arguments}, final?: string}."
+        client = self._client(api_key_override)
+        messages = self._controller_messages(user_message, plan, observation, history, run=run)
+
+        async def ask() -> Tuple[str, bool]:
+            if speculation is not None:
+                speculation.start()  # only on a cache miss: the tools overlap the LLM call
+            resp = await client.chat(messages=messages, temperature=0.0, json_mode=True)
+            self._count(run, "llm_calls")
+            return await self._checked_reply(client, messages, resp.content, run)
+
+        key = self.decisions.key(messages, client.model, self.registry.version())
+        entry, outcome = await self.decisions.get_or_compute(key, ask)
+        self._record_decision(run, outcome, entry)
+        return self._parse_choice(entry["content"])
+
+    async def _choose_tool_events(
+        self,
+        user_message: str,
+        plan: str,
+        observation: str,
+        api_key_override: str | None = None,
+        force_mock: bool = False,
+        stream: bool = False,
+        run: RunTrace | None = None,
+        history: Tuple[Sequence[Dict[str, str]], int] = ((), 0),
+        prev_tools: Sequence[str] = (),
+        speculation: Optional[Speculation] = None,
+    ) -> AsyncIterator[Tuple[str, Any]]:
+        """Yields ("token", text) while the controller streams, then ("choice", ToolChoice).
+
+        In real LLM mode the rule router goes first: a confident route is
+        the decision and no LLM call is made; otherwise the LLM decides and
+        the route, if any, is scored against it. The rule table's predicted
+        tool calls can meanwhile run speculatively (``SPECULATION=1``).
+        """
+        use_llm = self._use_llm(api_key_override, force_mock)
+        route = self.router.route(user_message, observation, prev_tools) if use_llm else None
+        if route is not None and self.router.bypass(route):
+            self._record_route(run, route)
+            yield "choice", route.choice
+            return
+        if use_llm and speculation is not None and self.speculator.enabled:
+            predicted = route or self.router.predict(user_message, observation, prev_tools)
+            if predicted is not None:
+                speculation.expect(predicted.choice.calls())
+
+        if not stream or not use_llm:
+            choice = await self._choose_tool(
+                user_message,
+                plan,
+                observation,
+                api_key_override=api_key_override,
+                force_mock=force_mock,
+                run=run,
+                history=history,
+                speculation=speculation,
+            )
+            yield "choice", self._scored(route, choice)
+            return
+
+        client = self._client(api_key_override)
+        messages = self._controller_messages(user_message, plan, observation, history, run=run)
+        key = self.decisions.key(messages, client.model, self.registry.version())
+        entry, outcome = self.decisions.get(key), "hit"
+        if entry is None:
+            # An identical streaming or non-streaming call in flight: replay its reply as one token.
+            entry, outcome = await self.decisions.wait(key) or (None, "miss")
+        if entry is not None:
+            self._record_decision(run, outcome, entry)
+            yield "token", entry["content"]
+            yield "choice", self._scored(route, self._parse_choice(entry["content"]))
+            return
+
+        with self.decisions.leading(key) as pending:
+            t0 = time.perf_counter()
+            if speculation is not None:
+                speculation.start()
+            scanner = JSONObjectScanner()
+            deltas = client.chat_stream(messages=messages, temperature=0.0, json_mode=True)
+            try:
+                async for delta in deltas:
+                    yield "token", delta
+                    if scanner.feed(delta) is not None:
+                        break  # the object is complete; anything after it is noise
+            finally:
+                await deltas.aclose()
+            self._count(run, "llm_calls")
+            content, valid = await self._checked_reply(client, messages, scanner.result or scanner.text, run)
+            entry = self.decisions.put(key, content, (time.perf_counter() - t0) * 1000, store=valid)
+            pending.set_result(entry)
+        self._record_decision(run, "miss", entry)
+        yield "choice", self._scored(route, self._parse_choice(content))
+
+    def _scored(self, route: Optional[Route], choice: ToolChoice) -> ToolChoice:
+        """Score the router's guess against the LLM's decision (for tuning); returns the decision."""
+        if route is not None:
+            self.router.compare(route, choice)
+        return choice
+
+    def _record_route(self, run: RunTrace | None, route: Route) -> None:
+        if run is None:
+            return
+        run.events.append(
+            TraceEvent(
+                t_ms=self.trace_store.now_ms(),
+                type="router_bypass",
+                data={"rule": route.rule, "confidence": route.confidence},
+            )
+        )
+        self._count(run, "router_bypasses")
+
+    def _use_llm(self, api_key_override: str | None, force_mock: bool) -> bool:
+        if force_mock:
+            return False
+        if self.llm_client is not None:
+            return True
+        return not settings.mock_mode and bool(api_key_override or settings.openai_api_key)
+
+    def _client(self, api_key_override: str | None):
+        api_key = api_key_override or settings.openai_api_key
+        if self.llm_client is not None:
+            return self.llm_client(api_key)
+        return get_llm_client(api_key_override=api_key)
+
+    def _record_decision(self, run: RunTrace | None, outcome: str, entry: Dict[str, Any]) -> None:
+        if run is None:
+            return
+        hit = outcome != "miss"
+        run.events.append(
+            TraceEvent(
+                t_ms=self.trace_store.now_ms(),
+                type="decision_cache_hit" if hit else "decision_cache_miss",
+                data={"outcome": outcome, "llm_ms": round(entry["latency_ms"], 3)},
+            )
         )
+        c = run.counters
+        if hit:
+            c["decision_cache_hits"] = c.get("decision_cache_hits", 0) + 1
+            c["decision_cache_saved_ms"] = round(c.get("decision_cache_saved_ms", 0.0) + entry["latency_ms"], 3)
+        else:
+            c["decision_cache_misses"] = c.get("decision_cache_misses", 0) + 1
+
+    def _controller_messages(
+        self,
+        user_message: str,
+        plan: str,
+        observation: str,
+        history: Tuple[Sequence[Dict[str, str]], int] = ((), 0),
+        run: RunTrace | None = None,
+    ) -> List[Dict[str, str]]:
+        """System prompt, windowed history, then the step prompt, within ``PROMPT_MAX_TOKENS``.
+
+        Tool specs come pre-serialized from the registry, the observation is
+        cut to ``PROMPT_OBSERVATION_TOKENS`` and the user message takes what
+        is left, so prompt size stays bounded however long the run or chat.
+        """
+        specs, spec_tokens = self.registry.prompt_specs()
+        history_messages, history_tokens = history
+        observation, obs_cut = truncate_tokens(observation, settings.prompt_observation_tokens)
+        used = _SYSTEM_TOKENS + _TEMPLATE_TOKENS + spec_tokens + history_tokens + count_tokens(plan) + count_tokens(observation)
+        user_message, msg_cut = truncate_tokens(user_message, max(64, settings.prompt_max_tokens - used))
+        if run is not None:
+            c = run.counters
+            c["prompt_tokens"] = c.get("prompt_tokens", 0) + used + count_tokens(user_message)
+            if obs_cut or msg_cut:
+                c["prompt_truncations"] = c.get("prompt_truncations", 0) + obs_cut + msg_cut
+
         prompt = {
             "role": "user",
             "content": (
                 f"User message: {user_message}\n\n"
                 f"Plan: {plan}\n\n"
                 f"Observation: {observation}\n\n"
-                f"Available tools (specs): {json.dumps(specs)}\n\n"
+                f"Available tools:\n{specs}\n\n"
                 "Decide the next action."
             ),
         }
-        client = get_llm_client(api_key_override=api_key)
-        resp = await client.chat(messages=[{"role": "system", "content": sys}, prompt], temperature=0.0)
-        try:
-            data = json.loads(resp.content)
-            return ToolChoice.model_validate(data)
-        except (json.JSONDecodeError, ValidationError) as e:
+        return [{"role": "system", "content": CONTROLLER_SYSTEM_PROMPT}, *history_messages, prompt]
+
+    def _validate_choice(self, content: str) -> Tuple[Optional[ToolChoice], str, Optional[str]]:
+        """``(choice, json_text, error)`` for a controller reply.
+
+        Clean JSON takes the fast path straight into pydantic; otherwise the
+        first JSON object is extracted from around prose or code fences.
+        ``choice`` is set whenever the reply is a valid ToolChoice, even if
+        ``error`` reports arguments that fail the tool's input schema.
+        """
+        with span("parse"):
+            text = content.strip()
+            try:
+                choice = ToolChoice.model_validate_json(text)
+            except ValidationError:
+                found = extract_json_object(text)
+                if found is None:
+                    return None, content, "no JSON object found"
+                text = found[0]
+                try:
+                    choice = ToolChoice.model_validate(found[1])
+                except ValidationError as e:
+                    return None, text, "; ".join(f"{'.'.join(map(str, err['loc'])) or 'value'}: {err['msg']}" for err in e.errors())
+            if choice.action == "tool" and not choice.calls():
+                return None, text, "action 'tool' needs tool_call or tool_calls"
+            errors = [
+                f"{call.tool_name}: {err}" for call in choice.calls() for err in self.registry.validate_arguments(call.tool_name, call.arguments)
+            ]
+            return choice, text, "; ".join(errors) or None
+
+    async def _checked_reply(
+        self, client: Any, messages: List[Dict[str, str]], content: str, run: RunTrace | None
+    ) -> Tuple[str, bool]:
+        """(reply JSON text, valid), after at most ``CONTROLLER_REPAIR_ATTEMPTS`` repair round-trips.
+
+        A repair sends the bad reply back with the validation error and asks
+        for the corrected object only. Returns the last reply as-is, and
+        ``valid=False`` so it is not cached, if it still does not validate.
+        """
+        for attempt in range(settings.controller_repair_attempts + 1):
+            choice, text, error = self._validate_choice(content)
+            if error is None:
+                CONTROLLER_REPLIES_TOTAL.inc(outcome="repaired" if attempt else ("clean" if text == content.strip() else "extracted"))
+                return text, True
+            if attempt == settings.controller_repair_attempts:
+                break
+            repair = [
+                *messages,
+                {"role": "assistant", "content": content},
+                {"role": "user", "content": f"That reply was not a valid ToolChoice ({error}). Reply with only the corrected JSON object."},
+            ]
+            content = (await client.chat(messages=repair, temperature=0.0, json_mode=True)).content
+            self._count(run, "llm_calls")
+            self._count(run, "choice_repairs")
+        CONTROLLER_REPLIES_TOTAL.inc(outcome="invalid")
+        return (text if choice is not None else content), False
+
+    def _parse_choice(self, content: str) -> ToolChoice:
+        choice, _, _ = self._validate_choice(content)
+        if choice is None:
             # Fall back to safe final
-            return ToolChoice(action="final", final=f"(LLM returned invalid ToolChoice JSON) {resp.content}")
+            return ToolChoice(action="final", final=f"(LLM returned invalid ToolChoice JSON) {content}")
+        return choice
 
-    def _mock_choose_tool(self, user_message: str, observation: str) -> ToolChoice:
-        text = user_message.lower().strip()
+    @staticmethod
+    def _count(run: RunTrace | None, name: str) -> None:
+        if run is not None:
+            run.counters[name] = run.counters.get(name, 0) + 1
 
+    def _mock_choose_tool(self, user_message: str, observation: str) -> ToolChoice:
         # If we already have an observation, finalize.
         if observation:
             return ToolChoice(action="final", final=observation)
 
+        # "calculate 2*3; explain agent sdk": one call per clause, run in parallel.
+        clauses = [c.strip() for c in user_message.split(";") if c.strip()]
+        if len(clauses) > 1:
+            calls = [Agent._mock_tool_call(c) for c in clauses]
+            if all(calls):
+                return ToolChoice(action="tool", tool_calls=calls)
+
+        tool_call = Agent._mock_tool_call(user_message)
+        if tool_call is not None:
+            return ToolChoice(action="tool", tool_call=tool_call)
+
+        return ToolChoice(action="final", final="Mock mode: I can calculate, summarize, or retrieve from the local corpus. Try: 'calculate 2*(3+4)' or 'explain agent sdk'.")
+
+    @staticmethod
+    def _mock_tool_call(user_message: str) -> ToolCall | None:
+        text = user_message.lower().strip()
+
         # Heuristics to pick a tool.
         if any(tok in text for tok in ["calculate", "calc", "+", "-", "*", "/", "**"]):
             expr = user_message
             # try to extract after 'calculate'
             if "calculate" in text:
                 expr = user_message.split("calculate", 1)[1].strip() or user_message
-            return ToolChoice(action="tool", tool_call=ToolCall(tool_name="calculator", arguments={"expression": expr}))
+            return ToolCall(tool_name="calculator", arguments={"expression": expr})
 
         if text.startswith("summarize") or "summary" in text:
             payload = user_message
             if ":" in user_message:
                 payload = user_message.split(":", 1)[1].strip()
-            return ToolChoice(
-                action="tool",
-                tool_call=ToolCall(tool_name="summarize_text", arguments={"text": payload, "max_sentences": 3}),
-            )
+            return ToolCall(tool_name="summarize_text", arguments={"text": payload, "max_sentences": 3})
 
         if any(tok in text for tok in ["what is", "explain", "ollama", "fastapi", "agent sdk"]):
-            return ToolChoice(action="tool", tool_call=ToolCall(tool_name="retrieve_corpus", arguments={"query": user_message, "k": 3}))
+            return ToolCall(tool_name="retrieve_corpus", arguments={"query": user_message, "k": 3})
 
-        return ToolChoice(action="final", final="Mock mode: I can calculate, summarize, or retrieve from the local corpus. Try: 'calculate 2*(3+4)' or 'explain agent sdk'.")
+        return None
 
     def _observe(self, tool_call: ToolCall, tool_result) -> str:
         if not tool_result.ok:
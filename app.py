@@ -1,20 +1,46 @@
 from __future__ import annotations
 
-from fastapi import FastAPI, HTTPException
+import json
+import math
+from contextlib import asynccontextmanager
+from typing import Literal, Optional
+
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from fastapi.staticfiles import StaticFiles
 
 from agent import Agent
-from schemas.agent import AgentRunRequest, AgentRunResponse
+from schemas.agent import AgentRunRequest, AgentRunResponse, RunStatus
 from tools.calculator import CalculatorTool
 from tools.retrieval import RetrieveTool
 from tools.summarizer import SummarizeTool
+from utils.batch import iter_lines, run_batch
+from utils.cache import decision_cache
+from utils.config import settings
+from utils.llm import llm_pool
+from utils.metrics import metrics
 from utils.retrieval import TinyRetriever
 from utils.registry import ToolRegistry
+from utils.router import rule_router
+from utils.run_queue import QueueFull, RunQueue
 from utils.tracing import trace_store
 
 
-app = FastAPI(title="FastAPI Agent SDK Mini", version="0.1.0")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    registry.warmup()
+    await run_queue.start()
+    yield
+    await run_queue.stop()
+    # Close pooled keep-alive connections to the LLM endpoint(s).
+    await llm_pool.aclose()
+    registry.shutdown()
+    agent.speculator.shutdown()
+    trace_store.close()
+
+
+app = FastAPI(title="FastAPI Agent SDK Mini", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,6 +58,14 @@ registry.register(SummarizeTool())
 registry.register(RetrieveTool(retriever=retriever))
 
 agent = Agent(registry=registry, trace_store=trace_store)
+run_queue = RunQueue(
+    lambda req, run_id: agent.run_stream(req, stream_tokens=False, run_id=run_id),
+    path=settings.run_queue_path or f"{settings.app_log_dir}/run_queue.sqlite",
+    workers=settings.run_queue_workers,
+    max_depth=settings.run_queue_max_depth,
+    lease_s=settings.run_queue_lease_s,
+    max_attempts=settings.run_queue_max_attempts,
+)
 
 
 @app.get("/api/tools")
@@ -39,16 +73,192 @@ def list_tools():
     return {"tools": [t.model_dump() for t in registry.list_specs()]}
 
 
-@app.post("/api/run", response_model=AgentRunResponse)
-async def run_agent(req: AgentRunRequest):
+async def _once(data: bytes):
+    yield data
+
+
+def _stream_response(events, format: str) -> StreamingResponse:
+    async def body():
+        async for event in events:
+            data = json.dumps(event, ensure_ascii=False)
+            if format == "sse":
+                yield f"event: {event['type']}\ndata: {data}\n\n"
+            else:
+                yield data + "\n"
+
+    media_type = "text/event-stream" if format == "sse" else "application/x-ndjson"
+    # X-Accel-Buffering stops nginx-style proxies from holding the stream back.
+    return StreamingResponse(body(), media_type=media_type, headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.post("/api/run", response_model=AgentRunResponse, responses={202: {"model": RunStatus}, 429: {}})
+async def run_agent(req: AgentRunRequest, mode: Literal["sync", "async"] = "sync"):
+    """Run to completion (``sync``), or queue the run and return its id at once (``async``)."""
+    if mode == "async":
+        try:
+            status = run_queue.submit(req)
+        except QueueFull as e:
+            raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after_s))})
+        return JSONResponse(status_code=202, content=status)
     run_id, final = await agent.run(req)
     return AgentRunResponse(run_id=run_id, final=final)
 
 
+@app.post("/api/run/batch")
+async def run_agent_batch(
+    request: Request,
+    concurrency: int = Query(settings.batch_concurrency, ge=1, le=settings.batch_max_concurrency),
+    offset: int = Query(0, ge=0, description="skip this many records (resume after an interruption)"),
+):
+    """Body: JSONL of `AgentRunRequest`. Response: NDJSON `{"index", "run_id", "final"}` per record, as each completes."""
+    spec_version = tuple(int(x) for x in request.scope.get("asgi", {}).get("spec_version", "2.0").split("."))
+    if spec_version >= (2, 4):
+        lines = iter_lines(request.stream())  # runs start while the body is still arriving
+    else:
+        # Older ASGI servers share `receive` with the disconnect listener once the response starts.
+        lines = iter_lines(_once(await request.body()))
+    results = run_batch(agent.run, lines, concurrency, offset)
+
+    async def body():
+        async for item in results:
+            yield json.dumps(item, ensure_ascii=False) + "\n"
+
+    return StreamingResponse(body(), media_type="application/x-ndjson", headers={"X-Accel-Buffering": "no"})
+
+
+@app.get("/api/run/{run_id}", response_model=RunStatus)
+def run_status(run_id: str):
+    status = run_queue.status(run_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="run_id not found in the run queue")
+    return status
+
+
+@app.delete("/api/run/{run_id}", response_model=RunStatus)
+async def cancel_run(run_id: str):
+    status = await run_queue.cancel(run_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="run_id not found in the run queue")
+    if status["status"] in ("done", "failed"):
+        raise HTTPException(status_code=409, detail=f"run already {status['status']}")
+    return status
+
+
+@app.get("/api/run/{run_id}/events")
+def run_events(run_id: str, format: Literal["sse", "ndjson"] = "sse"):
+    """Follow a queued run: past events first, then live ones, ending with ``final``."""
+    if run_queue.status(run_id) is None:
+        raise HTTPException(status_code=404, detail="run_id not found in the run queue")
+    return _stream_response(run_queue.events(run_id), format)
+
+
+@app.get("/api/queue")
+def queue_metrics():
+    return run_queue.metrics()
+
+
+@app.post("/api/run/stream")
+async def run_agent_stream(req: AgentRunRequest, format: Literal["sse", "ndjson"] = "sse"):
+    """Stream run events (step, tool, token, final) as they happen."""
+    return _stream_response(agent.run_stream(req), format)
+
+
 @app.get("/api/traces")
-def list_traces(limit: int = 50):
-    runs = trace_store.list_runs(limit=limit)
-    return {"runs": [r.model_dump() for r in runs]}
+def list_traces(
+    limit: int = Query(50, ge=1, le=500),
+    cursor: Optional[str] = None,
+    since_ms: Optional[int] = None,
+    until_ms: Optional[int] = None,
+    tool: Optional[str] = None,
+    status: Optional[Literal["ok", "error"]] = None,
+    min_duration_ms: Optional[int] = None,
+    view: Literal["summary", "full"] = "summary",
+):
+    """Persisted runs, newest first. Pass `next_cursor` back as `cursor` for the next page."""
+    try:
+        runs, next_cursor = trace_store.index.query(
+            limit=limit,
+            cursor=cursor,
+            since_ms=since_ms,
+            until_ms=until_ms,
+            tool=tool,
+            status=status,
+            min_duration_ms=min_duration_ms,
+        )
+    except ValueError:
+        raise HTTPException(status_code=400, detail="invalid cursor")
+    if view == "full":
+        full = [trace_store.get(r["run_id"]) for r in runs]
+        runs = [r.model_dump() for r in full if r is not None]
+    return {"runs": runs, "next_cursor": next_cursor}
+
+
+@app.get("/api/traces/stats")
+def trace_stats(since_ms: Optional[int] = None, until_ms: Optional[int] = None):
+    return trace_store.index.stats(since_ms=since_ms, until_ms=until_ms)
+
+
+@app.get("/api/traces/store")
+def trace_store_metrics():
+    return trace_store.metrics()
+
+
+def _collect_stats():
+    """Counters kept by the caches, trace store, run queue and LLM pool, read at scrape time."""
+    d = decision_cache.stats
+    ts = trace_store.metrics()
+    rq = run_queue.metrics()
+    tools = registry.cache_metrics()
+    pool = llm_pool.metrics()
+    endpoints, limiters, health = pool["endpoints"], pool["limiters"], pool["health"]
+    return [
+        ("decision_cache_hits_total", "Controller decisions served from cache.", "counter", [({}, d.hits + d.coalesced)]),
+        ("decision_cache_misses_total", "Controller decisions that called the LLM.", "counter", [({}, d.misses)]),
+        ("tool_cache_hits_total", "Tool results served from cache.", "counter", [({"tool": n}, t["hits"]) for n, t in tools.items()]),
+        ("trace_queue_depth", "Trace records waiting for the writer.", "gauge", [({}, ts["queued"])]),
+        ("trace_records_dropped_total", "Trace records dropped on a full queue.", "counter", [({}, ts["dropped"])]),
+        ("trace_runs_in_memory", "Runs held in the in-memory ring.", "gauge", [({}, ts["in_memory"])]),
+        ("run_queue_depth", "Queued background runs per priority lane.", "gauge", [({"lane": l}, n) for l, n in rq["queued"].items()]),
+        ("run_queue_running", "Background runs executing on this worker.", "gauge", [({}, rq["running"])]),
+        ("run_queue_rejected_total", "Background runs refused by admission control.", "counter", [({}, rq["rejected"])]),
+        (
+            "llm_connections_opened_total",
+            "New TCP connections to LLM endpoints.",
+            "counter",
+            [({"endpoint": url}, e["connections_opened"]) for url, e in endpoints.items()],
+        ),
+        ("llm_throttled_total", "429 responses from LLM endpoints.", "counter", [({"endpoint": u}, m["throttled"]) for u, m in limiters.items()]),
+        ("llm_batches_total", "Micro-batched LLM requests sent.", "counter", [({"endpoint": u}, m["batches"]) for u, m in limiters.items()]),
+        ("llm_rate_factor", "Share of the LLM rate budget in use after 429 backoff.", "gauge", [({"endpoint": u}, m["rate_factor"]) for u, m in limiters.items()]),
+        ("llm_queued_requests", "LLM requests waiting for admission.", "gauge", [({"endpoint": u}, m["queued"]) for u, m in limiters.items()]),
+        ("llm_endpoint_health", "LLM endpoint health score (EWMA success rate).", "gauge", [({"endpoint": u}, h["success"]) for u, h in health.items()]),
+        ("llm_circuit_open", "1 while an LLM endpoint's circuit breaker is open.", "gauge", [({"endpoint": u}, int(h["state"] == "open")) for u, h in health.items()]),
+        ("llm_hedges_total", "Hedged second requests sent to LLM endpoints.", "counter", [({"endpoint": u}, h["hedges"]) for u, h in health.items()]),
+        ("llm_failovers_total", "LLM retries moved to another endpoint.", "counter", [({}, pool["routing"]["failovers"])]),
+    ]
+
+
+metrics.add_collector(_collect_stats)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+def prometheus_metrics():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/llm/pool")
+def llm_pool_metrics():
+    return llm_pool.metrics()
+
+
+@app.get("/api/cache")
+def cache_metrics():
+    return {"decisions": decision_cache.metrics(), "tools": registry.cache_metrics()}
+
+
+@app.get("/api/router")
+def router_metrics():
+    return {**rule_router.metrics(), "speculation": agent.speculator.metrics()}
 
 
 @app.get("/api/trace/{run_id}")
@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import argparse
+import math
+import random
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List, Tuple
+
+# Allow running as a script: add repo root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from utils.retrieval import Doc, TinyRetriever, tokenize
+
+
+def synthetic_docs(n_docs: int, vocab_size: int = 20000, doc_len: int = 120, seed: int = 0) -> List[Doc]:
+    """Zipf-ish synthetic corpus: a few very common terms, a long tail of rare ones."""
+    rng = random.Random(seed)
+    vocab = [f"w{i}" for i in range(vocab_size)]
+    weights = [1.0 / (i + 1) for i in range(vocab_size)]
+    docs = []
+    for i in range(n_docs):
+        words = rng.choices(vocab, weights=weights, k=doc_len)
+        docs.append(Doc(doc_id=f"doc{i}.txt", title=f"doc {i}", text=" ".join(words)))
+    return docs
+
+
+def synthetic_queries(n_queries: int, vocab_size: int = 20000, seed: int = 1) -> List[str]:
+    rng = random.Random(seed)
+    # Mix one mid-frequency term with one rarer term, like a real keyword query.
+    return [f"w{rng.randint(10, 500)} w{rng.randint(500, vocab_size - 1)}" for _ in range(n_queries)]
+
+
+class ScanRetriever:
+    """Reference copy of the original full-scan scorer, kept for comparison.
+
+    Scans the same passages as TinyRetriever and keeps the best one per doc.
+    """
+
+    def __init__(self, docs: List[Doc]):
+        self.docs = docs
+        self._unit_doc = [i for i, d in enumerate(docs) for _ in TinyRetriever.split(d.text)]
+        self._doc_tf = [Counter(tokenize(d.text[a:b])) for d in docs for a, b in TinyRetriever.split(d.text)]
+        self._df: Counter[str] = Counter()
+        for tf in self._doc_tf:
+            self._df.update(tf.keys())
+
+    def search(self, query: str, k: int = 3) -> List[Tuple[Doc, float]]:
+        q_terms = tokenize(query)
+        if not q_terms or not self.docs:
+            return []
+
+        N = len(self._doc_tf)
+        q_tf = Counter(q_terms)
+
+        def idf(term: str) -> float:
+            df = self._df.get(term, 0)
+            return math.log((N + 1) / (df + 1)) + 1.0
+
+        q_vec = {t: q_tf[t] * idf(t) for t in q_tf}
+
+        scored: List[Tuple[int, float]] = []
+        for i, tf in enumerate(self._doc_tf):
+            dot = 0.0
+            for t, w in q_vec.items():
+                dot += w * (tf.get(t, 0) * idf(t))
+            norm_d = math.sqrt(sum((tf.get(t, 0) * idf(t)) ** 2 for t in q_vec.keys())) or 1.0
+            norm_q = math.sqrt(sum(w ** 2 for w in q_vec.values())) or 1.0
+            scored.append((i, dot / (norm_q * norm_d)))
+
+        scored.sort(key=lambda x: x[1], reverse=True)
+        out: List[Tuple[Doc, float]] = []
+        seen = set()
+        for i, s in scored:
+            d = self._unit_doc[i]
+            if s <= 0 or len(out) == k:
+                break
+            if d not in seen:
+                seen.add(d)
+                out.append((self.docs[d], float(s)))
+        return out
+
+
+def _time_queries(search, queries: List[str], k: int) -> float:
+    t0 = time.perf_counter()
+    for q in queries:
+        search(q, k=k)
+    return (time.perf_counter() - t0) / len(queries) * 1000
+
+
+def _same(a: List[Tuple[Doc, float]], b: List[Tuple[Doc, float]], tol: float = 1e-9) -> bool:
+    """Same ranking up to float round-off: docs may only differ where their scores tie."""
+    if len(a) != len(b) or any(abs(sa - sb) > tol for (_, sa), (_, sb) in zip(a, b)):
+        return False
+    if not a:
+        return True
+    cutoff = a[-1][1] + tol
+    return {d.doc_id for d, s in a if s > cutoff} == {d.doc_id for d, s in b if s > cutoff}
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Compare the retrieval backends against the original full scan.")
+    ap.add_argument("--docs", type=int, nargs="+", default=[1000, 10000])
+    ap.add_argument("--queries", type=int, default=50)
+    ap.add_argument("-k", type=int, default=3)
+    args = ap.parse_args()
+
+    queries = synthetic_queries(args.queries)
+    print("| docs | backend | ms/query | batch ms/query | speedup vs scan | same results |")
+    print("|---:|---|---:|---:|---:|:---:|")
+    for n in args.docs:
+        docs = synthetic_docs(n)
+        scan = ScanRetriever(docs)
+        expected = [scan.search(q, args.k) for q in queries]
+        scan_ms = _time_queries(scan.search, queries, args.k)
+        print(f"| {n} | scan | {scan_ms:.3f} | - | 1.0x | yes |")
+
+        for backend in ("python", "numpy"):
+            r = TinyRetriever.from_docs(docs, backend=backend)
+            if r.backend != backend:
+                print(f"| {n} | {backend} | - | - | - | (not installed) |")
+                continue
+            same = all(_same(e, got) for e, got in zip(expected, r.search_batch(queries, k=args.k)))
+            ms = _time_queries(r.search, queries, args.k)
+            t0 = time.perf_counter()
+            r.search_batch(queries, k=args.k)
+            batch_ms = (time.perf_counter() - t0) / len(queries) * 1000
+            print(
+                f"| {n} | {backend} | {ms:.3f} | {batch_ms:.3f} | {scan_ms / min(ms, batch_ms):.1f}x "
+                f"| {'yes' if same else 'NO'} |"
+            )
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
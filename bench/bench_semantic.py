@@ -0,0 +1,138 @@
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import string
+import sys
+import time
+from pathlib import Path
+from typing import Callable, List, Tuple
+
+# Allow running as a script: add repo root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from utils.retrieval import Doc, TinyRetriever, tokenize
+from utils.semantic import DenseIndex
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def topical_passages(
+    n: int, n_topics: int = 1000, topic_words: int = 50, vocab_size: int = 20000, length: int = 60, seed: int = 0
+) -> List[List[str]]:
+    """Passages that each mostly talk about one topic, so neighbours exist to be found.
+
+    70% of a passage's words come from its topic's small vocabulary, the rest
+    from a Zipf-ish background shared by all passages.
+    """
+    rng = random.Random(seed)
+    # Random letter strings: "w17"-style tokens would share character n-grams and all look alike.
+    vocab = sorted({"".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 10))) for _ in range(vocab_size)})
+    rng.shuffle(vocab)
+    weights = [1.0 / (i + 1) for i in range(len(vocab))]
+    topics = [rng.sample(vocab, topic_words) for _ in range(n_topics)]
+    out = []
+    for _ in range(n):
+        topic = rng.choice(topics)
+        n_topic = int(length * 0.7)
+        out.append(rng.choices(topic, k=n_topic) + rng.choices(vocab, weights=weights, k=length - n_topic))
+    return out
+
+
+def typo(word: str, rng: random.Random) -> str:
+    if len(word) < 4:
+        return word
+    i = rng.randrange(1, len(word) - 2)
+    return word[:i] + word[i + 1] + word[i] + word[i + 2 :]
+
+
+def inflect(word: str) -> str:
+    if len(word) <= 3:
+        return word
+    return word[:-1] if word.endswith("s") else word + "s"
+
+
+# How a six-word query copied from a passage is disturbed before it is asked.
+PERTURBATIONS: List[Tuple[str, Callable[[List[str], random.Random], List[str]]]] = [
+    ("exact", lambda ws, rng: ws),
+    ("typos", lambda ws, rng: [typo(w, rng) if rng.random() < 0.5 else w for w in ws]),
+    ("inflected", lambda ws, rng: [inflect(w) for w in ws]),
+    ("half the words dropped", lambda ws, rng: [w for w in ws if rng.random() < 0.5] or ws[:1]),
+]
+
+
+def recall_latency(sizes: List[int], dim: int, probes: List[int], n_queries: int, k: int) -> None:
+    print("| passages | dim | encode+build s | lists | n_probe | recall@%d | ms/query | exact ms/query |" % k)
+    print("|---:|---:|---:|---:|---:|---:|---:|---:|")
+    for n in sizes:
+        texts = topical_passages(n)
+        t0 = time.perf_counter()
+        dense = DenseIndex(texts, dim=dim)
+        build_s = time.perf_counter() - t0
+        rng = random.Random(1)
+        queries = []
+        for _ in range(n_queries):
+            words = rng.choice(texts)
+            i = rng.randrange(0, len(words) - 6)
+            queries.append(words[i : i + 6])
+        q = dense.encoder.encode(queries)
+        index = dense.index
+
+        t0 = time.perf_counter()
+        truth = index.exact(q, k)
+        exact_ms = (time.perf_counter() - t0) / n_queries * 1000
+        for n_probe in probes:
+            t0 = time.perf_counter()
+            got = index.search(q, k, n_probe=n_probe)
+            ms = (time.perf_counter() - t0) / n_queries * 1000
+            hit = sum(len({i for i, _ in g} & {i for i, _ in t}) for g, t in zip(got, truth))
+            recall = hit / sum(len(t) for t in truth)
+            print(
+                f"| {n} | {dim} | {build_s:.1f} | {index.n_lists} | {n_probe} | {recall:.3f} | {ms:.3f} | {exact_ms:.3f} |"
+            )
+            if index.centroids is None:
+                break  # small corpus: exact scan, probing does not apply
+
+
+def quality(n_queries: int, seed: int = 0) -> None:
+    """Top-1 section accuracy on this README split into sections, per mode and perturbation."""
+    sections = re.split(r"\n#+ ", (ROOT / "README.md").read_text(encoding="utf-8"))
+    docs = [Doc(doc_id=f"s{i}", title=s.split("\n", 1)[0], text=s) for i, s in enumerate(sections) if len(tokenize(s)) > 30]
+    r = TinyRetriever.from_docs(docs)
+    rng = random.Random(seed)
+    print(f"\n{len(docs)} README sections, {len(r.passages)} passages, {n_queries} six-word queries per row")
+    print("| queries | " + " | ".join(r.MODES) + " |")
+    print("|---|" + "---:|" * len(r.MODES))
+    for name, perturb in PERTURBATIONS:
+        asked: List[Tuple[str, str]] = []
+        for _ in range(n_queries):
+            p = rng.choice(r.passages)
+            words = tokenize(docs[p.doc_index].text[p.start : p.end])
+            i = rng.randrange(0, max(1, len(words) - 6))
+            asked.append((" ".join(perturb(words[i : i + 6], rng)), docs[p.doc_index].doc_id))
+        cells = []
+        for mode in r.MODES:
+            got = r.search_batch([q for q, _ in asked], k=1, mode=mode)
+            acc = sum(bool(g) and g[0][0].doc_id == want for g, (_, want) in zip(got, asked)) / n_queries
+            cells.append(f"{acc:.2f}")
+        print(f"| {name} | " + " | ".join(cells) + " |")
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Semantic retrieval: IVF recall vs latency, and quality against lexical.")
+    ap.add_argument("--passages", type=int, nargs="+", default=[10000, 100000])
+    ap.add_argument("--dim", type=int, default=256, help="use 128 for 1M passages to stay within ~1 GB")
+    ap.add_argument("--probe", type=int, nargs="+", default=[1, 4, 8, 16, 32])
+    ap.add_argument("--queries", type=int, default=200)
+    ap.add_argument("-k", type=int, default=10)
+    ap.add_argument("--quality-queries", type=int, default=300)
+    args = ap.parse_args()
+
+    recall_latency(args.passages, args.dim, args.probe, args.queries, args.k)
+    quality(args.quality_queries)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,85 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Allow running as a script: add repo root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from bench.stub_llm import create_app, serve
+from utils.llm import LLMClientPool, LLMEndpoint, MultiEndpointClient
+
+# (name, stub A options, stub B options); A is the primary, B the fallback.
+SCENARIOS = [
+    ("tail", {"latency_ms": 20, "slow_rate": 0.02, "slow_ms": 1500}, {"latency_ms": 20, "slow_rate": 0.02, "slow_ms": 1500}),
+    ("errors", {"latency_ms": 20, "error_rate": 0.3}, {"latency_ms": 40}),
+    ("outage", {"latency_ms": 20, "error_rate": 1.0}, {"latency_ms": 40}),
+]
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+async def drive(client: MultiEndpointClient, calls: int, concurrency: int) -> Dict[str, Any]:
+    sem = asyncio.Semaphore(concurrency)
+    latencies: List[float] = []
+    errors = 0
+
+    async def one() -> None:
+        nonlocal errors
+        async with sem:
+            t0 = time.perf_counter()
+            try:
+                await client.chat([{"role": "user", "content": "User message: calculate 1+1\n\n"}])
+            except Exception:
+                errors += 1
+            latencies.append((time.perf_counter() - t0) * 1000)
+
+    await asyncio.gather(*(one() for _ in range(calls)))
+    latencies.sort()
+    return {"errors": errors, "p50_ms": _percentile(latencies, 0.5), "p99_ms": _percentile(latencies, 0.99), "max_ms": latencies[-1]}
+
+
+async def run(calls: int, concurrency: int) -> int:
+    print("| scenario | endpoints | errors | p50 ms | p99 ms | max ms | retries | failovers | hedges (won) | A requests | A circuit |")
+    print("|---|---|---:|---:|---:|---:|---:|---:|---|---:|---|")
+    ok = True
+    for name, a_opts, b_opts in SCENARIOS:
+        rows = {}
+        for label in ("A", "A+B"):
+            app_a, app_b = create_app(**a_opts), create_app(**b_opts)
+            async with serve(app_a) as url_a, serve(app_b) as url_b:
+                pool = LLMClientPool()
+                endpoints = [LLMEndpoint(url_a, "stub")] + ([LLMEndpoint(url_b, "stub")] if label == "A+B" else [])
+                # The lone endpoint is the baseline: retries, but no hedging.
+                client = MultiEndpointClient(endpoints, "stub", pool=pool, hedge_percentile=0 if label == "A" else None)
+                row = rows[label] = await drive(client, calls, concurrency)
+                await pool.aclose()
+                r, health = pool.routing, pool.health(url_a)
+                print(
+                    f"| {name} | {label} | {row['errors']} | {row['p50_ms']:.0f} | {row['p99_ms']:.0f} | {row['max_ms']:.0f} "
+                    f"| {r.retries} | {r.failovers} | {r.hedges} ({r.hedge_wins}) | {app_a.state.calls} | {health.state} |"
+                )
+        # With a healthy fallback nothing may fail, and hedging must cut the tail.
+        ok &= rows["A+B"]["errors"] == 0
+        if name == "tail":
+            ok &= rows["A+B"]["p99_ms"] < rows["A"]["p99_ms"]
+    print("OK" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Hedging, retries and circuit breaking against local stub LLM servers.")
+    ap.add_argument("--calls", type=int, default=400)
+    ap.add_argument("--concurrency", type=int, default=8)
+    args = ap.parse_args()
+    return asyncio.run(run(args.calls, args.concurrency))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
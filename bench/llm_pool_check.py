@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+
+# Allow running as a script: add repo root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from bench.stub_llm import create_app, serve
+from utils.llm import LLMClientPool, OpenAICompatibleClient
+
+
+async def run(calls: int, concurrency: int, latency_ms: float) -> int:
+    pool = LLMClientPool()
+    async with serve(create_app(latency_ms=latency_ms)) as base_url:
+        client = OpenAICompatibleClient(base_url=base_url, api_key="stub", model="stub", pool=pool)
+        sem = asyncio.Semaphore(concurrency)
+
+        async def one() -> None:
+            async with sem:
+                await client.chat([{"role": "user", "content": "User message: calculate 1+1\n\n"}])
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(calls)))
+        elapsed = time.perf_counter() - t0
+        await pool.aclose()
+
+    stats = pool.stats(base_url)
+    print(f"calls={stats.requests} connections_opened={stats.connections_opened} reuse_ratio={stats.reuse_ratio:.3f}")
+    print(f"http_versions={stats.http_versions} elapsed={elapsed * 1000:.1f} ms")
+
+    # Connections are bounded by concurrency, not by the number of calls.
+    ok = stats.errors == 0 and stats.connections_opened <= concurrency
+    print("OK" if ok else "FAIL: connections were not reused")
+    return 0 if ok else 1
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Check LLM connection reuse against a local stub server.")
+    ap.add_argument("--calls", type=int, default=50)
+    ap.add_argument("--concurrency", type=int, default=4)
+    ap.add_argument("--latency-ms", type=float, default=5.0)
+    args = ap.parse_args()
+    return asyncio.run(run(args.calls, args.concurrency, args.latency_ms))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
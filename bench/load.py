@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import resource
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List
+
+# Keep benchmark traces out of the repo's .runs/ (read when utils.config is first imported).
+os.environ.setdefault("APP_LOG_DIR", str(Path(tempfile.gettempdir()) / "agent-bench-runs"))
+
+# Allow running as a script: add repo root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+import httpx
+
+from bench.stub_llm import create_app, serve
+
+
+def _messages(i: int) -> str:
+    # Vary the inputs so the tool and decision caches do not turn the run into a cache benchmark.
+    return [
+        f"calculate {i}*{i}+1",
+        f"explain agent sdk {i}",
+        f"summarize: Sentence {i}. Another one. A third. A fourth.",
+        f"calculate {i} + 2; explain fastapi {i}",
+    ][i % 4]
+
+
+def _rss_peak_mb() -> float:
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+async def run_load(
+    modes: List[str], requests: int, concurrency: int, llm_latency_ms: float = 20.0
+) -> Dict[str, Dict[str, Any]]:
+    """Drive POST /api/run in-process over ASGI with ``concurrency`` clients, once per mode.
+
+    ``stub`` points the real-LLM controller at a local stub server answering
+    after ``llm_latency_ms``; ``mock`` uses the heuristic controller (no
+    network). The decision cache is off so every step pays the LLM call.
+    """
+    import app as server
+    from utils.config import settings
+
+    async def drive(client: httpx.AsyncClient) -> Dict[str, Any]:
+        sem = asyncio.Semaphore(concurrency)
+        latencies: List[float] = []
+        errors = 0
+
+        async def one(i: int) -> None:
+            nonlocal errors
+            async with sem:
+                t0 = time.perf_counter()
+                r = await client.post("/api/run", json={"message": _messages(i), "max_steps": 4})
+                latencies.append((time.perf_counter() - t0) * 1000)
+                if r.status_code != 200 or r.json()["final"].startswith("Error"):
+                    errors += 1
+
+        await one(-1)  # warm up pools and lazy imports
+        latencies.clear()
+        errors = 0
+        t0 = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - t0
+
+        latencies.sort()
+        return {
+            "requests": requests,
+            "concurrency": concurrency,
+            "errors": errors,
+            "rps": requests / elapsed,
+            "p50_ms": _percentile(latencies, 0.50),
+            "p95_ms": _percentile(latencies, 0.95),
+            "p99_ms": _percentile(latencies, 0.99),
+            "max_ms": latencies[-1],
+            "rss_peak_mb": _rss_peak_mb(),
+        }
+
+    saved = (settings.mock_mode, settings.openai_api_key, settings.openai_base_url, server.decision_cache.enabled)
+    results: Dict[str, Dict[str, Any]] = {}
+    transport = httpx.ASGITransport(app=server.app)
+    try:
+        server.decision_cache.enabled = False
+        async with server.app.router.lifespan_context(server.app):
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60) as client:
+                for mode in modes:
+                    if mode == "stub":
+                        async with serve(create_app(latency_ms=llm_latency_ms)) as base_url:
+                            settings.mock_mode, settings.openai_api_key, settings.openai_base_url = False, "stub", base_url
+                            results[mode] = await drive(client)
+                    else:
+                        settings.mock_mode = True
+                        results[mode] = await drive(client)
+    finally:
+        settings.mock_mode, settings.openai_api_key, settings.openai_base_url, server.decision_cache.enabled = saved
+    return results
@@ -0,0 +1,78 @@
+from __future__ import annotations
+
+import ast
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+# Allow running as a script: add repo root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from bench.bench_retrieval import synthetic_docs, synthetic_queries
+from schemas.tools import ToolCall, ToolResult
+from schemas.trace import RunTrace, StepTrace, TraceEvent
+from tools.calculator import _eval
+from tools.summarizer import SummarizeTool
+from utils.retrieval import TinyRetriever, tokenize
+
+
+def measure(fn: Callable[[], Any], min_time_s: float = 0.2, max_samples: int = 20000) -> Dict[str, float]:
+    """Call ``fn`` repeatedly for about ``min_time_s``; per-call latency stats in microseconds."""
+    fn()  # warm up caches and lazy imports
+    samples: List[int] = []
+    deadline = time.perf_counter_ns() + int(min_time_s * 1e9)
+    while len(samples) < max_samples and (len(samples) < 5 or time.perf_counter_ns() < deadline):
+        t0 = time.perf_counter_ns()
+        fn()
+        samples.append(time.perf_counter_ns() - t0)
+    samples.sort()
+    n = len(samples)
+    return {
+        "n": n,
+        "mean_us": sum(samples) / n / 1e3,
+        "p50_us": samples[n // 2] / 1e3,
+        "p99_us": samples[min(n - 1, int(n * 0.99))] / 1e3,
+    }
+
+
+def _sample_trace(steps: int = 3) -> Dict[str, Any]:
+    call = ToolCall(tool_name="retrieve_corpus", arguments={"query": "agent sdk", "k": 3})
+    result = ToolResult(tool_name="retrieve_corpus", ok=True, output={"results": [{"title": "t", "snippet": "s" * 200}] * 3})
+    return RunTrace(
+        run_id="bench",
+        created_at_ms=0,
+        input={"message": "explain agent sdk"},
+        steps=[
+            StepTrace(step=i, plan="plan", tool_call=call, tool_result=result, observation="obs " * 50, started_at_ms=0, ended_at_ms=1)
+            for i in range(1, steps + 1)
+        ],
+        events=[TraceEvent(t_ms=0, type="tool_finished", data=result.model_dump())] * steps,
+        final="final",
+    ).model_dump()
+
+
+def run_micro(doc_counts: List[int], min_time_s: float = 0.2) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+
+    text = " ".join(synthetic_docs(1, doc_len=200)[0].text.split()) + ". FastAPI, agents & tools!"
+    results["tokenize_200w"] = measure(lambda: tokenize(text), min_time_s)
+
+    expr = ast.parse("2*(3+4)**2 - 10/4 % 3", mode="eval").body
+    results["calculator_eval"] = measure(lambda: _eval(expr), min_time_s)
+
+    summarizer = SummarizeTool()
+    paragraph = {"text": "FastAPI is great. It is fast. It uses Pydantic. " * 20, "max_sentences": 3}
+    results["summarizer_run"] = measure(lambda: summarizer.run(paragraph), min_time_s)
+
+    payload = _sample_trace()
+    results["runtrace_validate"] = measure(lambda: RunTrace.model_validate(payload), min_time_s)
+    trace = RunTrace.model_validate(payload)
+    results["runtrace_dump_json"] = measure(lambda: trace.model_dump_json(), min_time_s)
+
+    queries = synthetic_queries(64)
+    for n in doc_counts:
+        retriever = TinyRetriever.from_docs(synthetic_docs(n))
+        it = iter(range(1 << 62))
+        results[f"retrieval_search_{n}"] = measure(lambda: retriever.search(queries[next(it) % len(queries)], k=3), min_time_s)
+    return results
@@ -0,0 +1,215 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import random
+import re
+import sys
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List
+
+# Allow running as a script: add repo root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from agent import Agent
+
+
+USER_RE = re.compile(r"User message: (.*?)\n\n", re.S)
+OBS_RE = re.compile(r"Observation: (.*?)\n\nAvailable tools", re.S)
+
+
+def decide(messages: List[Dict[str, str]]) -> str:
+    """Answer like a well-behaved controller, using the mock heuristics."""
+    # The step prompt is the last message, unless a repair request follows it.
+    prompts = [m["content"] for m in messages if USER_RE.search(m["content"])]
+    prompt = prompts[-1] if prompts else (messages[-1]["content"] if messages else "")
+    m = USER_RE.search(prompt)
+    o = OBS_RE.search(prompt)
+    user_message = m.group(1) if m else prompt
+    observation = o.group(1).strip() if o else ""
+    choice = Agent._mock_choose_tool(None, user_message, observation)
+    return choice.model_dump_json(exclude_none=True)
+
+
+def render(content: str, style: str = "json", malformed_rate: float = 0.0) -> str:
+    """Dress a JSON reply the way sloppy models do: in a code fence or after some prose."""
+    if malformed_rate and random.random() < malformed_rate:
+        content = content[: len(content) // 2]
+    if style == "fenced":
+        return f"```json\n{content}\n```"
+    if style == "prose":
+        return f"Sure! Here is the decision:\n{content}\nLet me know if you need anything else."
+    return content
+
+
+def completion(content: str, model: str) -> Dict[str, Any]:
+    return {
+        "id": f"stub-{time.time_ns()}",
+        "object": "chat.completion",
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+    }
+
+
+def completion_chunks(content: str, model: str, chunk_chars: int = 8) -> AsyncIterator[str]:
+    async def gen() -> AsyncIterator[str]:
+        for i in range(0, len(content), chunk_chars):
+            chunk = {
+                "object": "chat.completion.chunk",
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": content[i : i + chunk_chars]}, "finish_reason": None}],
+            }
+            yield f"data: {json.dumps(chunk)}\n\n"
+            await asyncio.sleep(0)
+        yield "data: [DONE]\n\n"
+
+    return gen()
+
+
+def create_app(
+    latency_ms: float = 0.0,
+    jitter_ms: float = 0.0,
+    error_rate: float = 0.0,
+    error_status: int = 500,
+    rpm: int = 0,
+    style: str = "json",
+    malformed_rate: float = 0.0,
+    slow_rate: float = 0.0,
+    slow_ms: float = 0.0,
+) -> FastAPI:
+    """OpenAI-compatible stub LLM server with injectable latency, errors and a rate limit.
+
+    ``style`` wraps replies in a code fence (``fenced``) or prose (``prose``)
+    and ``malformed_rate`` cuts that share of replies in half, to exercise
+    the controller's JSON extraction and repair round-trip.
+
+    ``slow_rate`` of requests stall for another ``slow_ms`` (a latency
+    tail, for hedging).
+
+    ``rpm > 0`` enforces a requests-per-minute budget (one second of burst)
+    and answers 429 with ``Retry-After`` beyond it, like a hosted provider.
+    ``POST /v1/chat/completions/batch`` answers several prompts in one
+    request, after a single latency delay; a batch counts as one request.
+    """
+    app = FastAPI(title="stub-llm")
+    app.state.calls = 0
+    app.state.batches = 0
+    app.state.throttled = 0
+    rate = rpm / 60.0
+    bucket = {"level": max(1.0, rate), "t": time.monotonic()}
+
+    def throttle() -> JSONResponse | None:
+        if not rpm:
+            return None
+        now = time.monotonic()
+        bucket["level"] = min(max(1.0, rate), bucket["level"] + (now - bucket["t"]) * rate)
+        bucket["t"] = now
+        if bucket["level"] >= 1.0:
+            bucket["level"] -= 1.0
+            return None
+        app.state.throttled += 1
+        wait_ms = (1.0 - bucket["level"]) / rate * 1000
+        return JSONResponse(
+            {"error": {"message": "rate limit exceeded", "type": "rate_limit_exceeded"}},
+            status_code=429,
+            headers={"retry-after": str(max(1, round(wait_ms / 1000))), "retry-after-ms": str(round(wait_ms))},
+        )
+
+    async def delay_and_fail() -> JSONResponse | None:
+        delay = latency_ms + random.uniform(0, jitter_ms)
+        if slow_rate and random.random() < slow_rate:
+            delay += slow_ms
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if error_rate and random.random() < error_rate:
+            return JSONResponse({"error": {"message": "injected failure"}}, status_code=error_status)
+        return None
+
+    @app.post("/v1/chat/completions")
+    async def chat(request: Request):
+        app.state.calls += 1
+        body = await request.json()
+        rejected = throttle() or await delay_and_fail()
+        if rejected is not None:
+            return rejected
+        content = render(decide(body.get("messages", [])), style, malformed_rate)
+        if body.get("stream"):
+            return StreamingResponse(completion_chunks(content, body.get("model", "stub")), media_type="text/event-stream")
+        return completion(content, body.get("model", "stub"))
+
+    @app.post("/v1/chat/completions/batch")
+    async def chat_batch(request: Request):
+        app.state.batches += 1
+        body = await request.json()
+        rejected = throttle() or await delay_and_fail()
+        if rejected is not None:
+            return rejected
+        model = body.get("model", "stub")
+        return {
+            "responses": [
+                completion(render(decide(r.get("messages", [])), style, malformed_rate), model) for r in body.get("requests", [])
+            ]
+        }
+
+    return app
+
+
+@asynccontextmanager
+async def serve(app: FastAPI, port: int = 0) -> AsyncIterator[str]:
+    """Run ``app`` on a local port inside the current loop; yields its /v1 base URL."""
+    import uvicorn
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        if task.done():
+            task.result()
+        await asyncio.sleep(0.01)
+    bound = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{bound}/v1"
+    finally:
+        server.should_exit = True
+        await task
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Run a local OpenAI-compatible stub LLM server.")
+    ap.add_argument("--port", type=int, default=8001)
+    ap.add_argument("--latency-ms", type=float, default=0.0)
+    ap.add_argument("--jitter-ms", type=float, default=0.0)
+    ap.add_argument("--error-rate", type=float, default=0.0)
+    ap.add_argument("--error-status", type=int, default=500)
+    ap.add_argument("--rpm", type=int, default=0, help="answer 429 beyond this many requests per minute")
+    ap.add_argument("--style", choices=["json", "fenced", "prose"], default="json")
+    ap.add_argument("--malformed-rate", type=float, default=0.0)
+    ap.add_argument("--slow-rate", type=float, default=0.0, help="share of requests delayed by another --slow-ms")
+    ap.add_argument("--slow-ms", type=float, default=0.0)
+    args = ap.parse_args()
+
+    import uvicorn
+
+    app = create_app(
+        args.latency_ms,
+        args.jitter_ms,
+        args.error_rate,
+        args.error_status,
+        args.rpm,
+        args.style,
+        args.malformed_rate,
+        args.slow_rate,
+        args.slow_ms,
+    )
+    uvicorn.run(app, host="127.0.0.1", port=args.port, log_level="warning")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+# Allow running as a script: add repo root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from bench.load import run_load  # first: sets APP_LOG_DIR before utils.config is imported
+from bench.micro import run_micro
+
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+
+# Which metrics are compared against the baseline, and which direction is better.
+_COMPARED = {"mean_us": "lower", "rps": "higher", "p50_ms": "lower", "p95_ms": "lower", "rss_peak_mb": "lower"}
+
+
+def flatten(results: Dict[str, Dict[str, Dict[str, float]]]) -> Dict[str, Tuple[float, str]]:
+    """{"micro.tokenize_200w.mean_us": (value, "lower"), ...} for the compared metrics."""
+    out: Dict[str, Tuple[float, str]] = {}
+    for group, benches in results.items():
+        for name, stats in benches.items():
+            for metric, better in _COMPARED.items():
+                if metric in stats:
+                    out[f"{group}.{name}.{metric}"] = (stats[metric], better)
+    return out
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[Dict[str, Any]]:
+    """Metrics that got worse than the baseline by more than ``threshold`` (a fraction)."""
+    now, before = flatten(current["results"]), flatten(baseline["results"])
+    regressions = []
+    for key, (value, better) in sorted(now.items()):
+        if key not in before or not before[key][0]:
+            continue
+        old = before[key][0]
+        change = (value - old) / old
+        worse = change > threshold if better == "lower" else change < -threshold
+        if worse:
+            regressions.append({"metric": key, "baseline": old, "current": value, "change": change})
+    return regressions
+
+
+def _print_tables(results: Dict[str, Dict[str, Dict[str, float]]]) -> None:
+    if results.get("micro"):
+        print("| benchmark | calls | mean µs | p50 µs | p99 µs |")
+        print("|---|---:|---:|---:|---:|")
+        for name, s in results["micro"].items():
+            print(f"| {name} | {s['n']} | {s['mean_us']:.2f} | {s['p50_us']:.2f} | {s['p99_us']:.2f} |")
+        print()
+    if results.get("load"):
+        print("| scenario | requests | conc. | errors | req/s | p50 ms | p95 ms | p99 ms | peak RSS MB |")
+        print("|---|---:|---:|---:|---:|---:|---:|---:|---:|")
+        for name, s in results["load"].items():
+            print(
+                f"| {name} | {s['requests']} | {s['concurrency']} | {s['errors']} | {s['rps']:.1f} "
+                f"| {s['p50_ms']:.1f} | {s['p95_ms']:.1f} | {s['p99_ms']:.1f} | {s['rss_peak_mb']:.0f} |"
+            )
+        print()
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Micro-benchmarks and an in-process load test, compared to a saved baseline.")
+    ap.add_argument("--docs", type=int, nargs="+", default=[1000, 10000], help="synthetic corpus sizes (e.g. 1000 10000 100000)")
+    ap.add_argument("--min-time", type=float, default=0.2, help="seconds per micro-benchmark")
+    ap.add_argument("--modes", nargs="+", default=["mock", "stub"], choices=["mock", "stub"])
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=16)
+    ap.add_argument("--llm-latency-ms", type=float, default=20.0)
+    ap.add_argument("--skip-micro", action="store_true")
+    ap.add_argument("--skip-load", action="store_true")
+    ap.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    ap.add_argument("--save-baseline", action="store_true", help="write this run as the new baseline")
+    ap.add_argument("--threshold", type=float, default=0.2, help="allowed slowdown before flagging, as a fraction")
+    ap.add_argument("--json", type=Path, help="also write this run's results here")
+    args = ap.parse_args()
+
+    results: Dict[str, Dict[str, Dict[str, float]]] = {}
+    if not args.skip_micro:
+        results["micro"] = run_micro(args.docs, args.min_time)
+    if not args.skip_load:
+        results["load"] = asyncio.run(run_load(args.modes, args.requests, args.concurrency, args.llm_latency_ms))
+
+    report = {
+        "meta": {"created_at": time.strftime("%Y-%m-%dT%H:%M:%S"), "python": platform.python_version(), "machine": platform.machine()},
+        "results": results,
+    }
+    _print_tables(results)
+    if args.json:
+        args.json.write_text(json.dumps(report, indent=2), encoding="utf-8")
+
+    status = 0
+    if args.baseline.exists() and not args.save_baseline:
+        baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"Regressions vs {args.baseline} (threshold {args.threshold:.0%}):")
+            for r in regressions:
+                print(f"- {r['metric']}: {r['baseline']:.3f} -> {r['current']:.3f} ({r['change']:+.0%})")
+            status = 1
+        else:
+            print(f"No regressions vs {args.baseline} (threshold {args.threshold:.0%}).")
+    if args.save_baseline or not args.baseline.exists():
+        args.baseline.write_text(json.dumps(report, indent=2), encoding="utf-8")
+        print(f"Wrote baseline {args.baseline}")
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,153 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import httpx
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def _messages(i: int) -> str:
+    return [
+        f"calculate {i}*{i}+1",
+        f"explain agent sdk {i}",
+        f"summarize: Sentence {i}. Another one. A third. A fourth.",
+        f"calculate {i} + 2; explain fastapi {i}",
+    ][i % 4]
+
+
+def _percentile(sorted_values: List[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def _client(args: Tuple[str, List[int], int]) -> Tuple[List[float], int, List[str]]:
+    """One load-generator process: its share of the requests at ``concurrency`` in flight."""
+    base_url, ids, concurrency = args
+
+    async def main() -> Tuple[List[float], int, List[str]]:
+        sem = asyncio.Semaphore(concurrency)
+        latencies: List[float] = []
+        run_ids: List[str] = []
+        errors = 0
+
+        async def one(client: httpx.AsyncClient, i: int) -> None:
+            nonlocal errors
+            async with sem:
+                t0 = time.perf_counter()
+                r = await client.post("/api/run", json={"message": _messages(i), "max_steps": 4, "force_mock": True})
+                latencies.append((time.perf_counter() - t0) * 1000)
+                if r.status_code != 200:
+                    errors += 1
+                else:
+                    run_ids.append(r.json()["run_id"])
+
+        async with httpx.AsyncClient(base_url=base_url, timeout=60) as client:
+            await asyncio.gather(*(one(client, i) for i in ids))
+        return latencies, errors, run_ids
+
+    return asyncio.run(main())
+
+
+def _start_server(workers: int, port: int, env: Dict[str, str]) -> subprocess.Popen:
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=ROOT,
+        env=env,
+    )
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{port}/api/tools", timeout=1).status_code == 200:
+                return proc
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"uvicorn with {workers} workers did not come up on port {port}")
+
+
+def _missing_traces(base_url: str, run_ids: List[str]) -> int:
+    """Runs whose trace 404s; each GET may land on any worker."""
+    missing = run_ids
+    with httpx.Client(base_url=base_url, timeout=10) as client:
+        for _ in range(10):  # writer threads batch asynchronously; give them a moment
+            missing = [r for r in missing if client.get(f"/api/trace/{r}").status_code != 200]
+            if not missing:
+                break
+            time.sleep(0.2)
+    return len(missing)
+
+
+def run_workers(worker_counts: List[int], requests: int, concurrency: int, clients: int, port: int, backend: str) -> Dict[str, Dict[str, Any]]:
+    """Start ``uvicorn --workers N`` for each N and drive ``POST /api/run`` over real HTTP.
+
+    Load comes from ``clients`` processes so the generator does not become
+    the bottleneck. Afterwards every run's trace is fetched back through the
+    load-balanced port to check that any worker can serve any run.
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    ctx = multiprocessing.get_context("spawn")
+    for n in worker_counts:
+        log_dir = tempfile.mkdtemp(prefix=f"agent-workers-{n}-")
+        env = {**os.environ, "APP_LOG_DIR": log_dir, "TRACE_BACKEND": backend, "DECISION_CACHE": "0", "MOCK_MODE": "1"}
+        proc = _start_server(n, port, env)
+        base_url = f"http://127.0.0.1:{port}"
+        try:
+            _client((base_url, list(range(-clients * 2, 0)), clients))  # warm up every worker's lazy state
+            shares = [(base_url, list(range(c, requests, clients)), max(1, concurrency // clients)) for c in range(clients)]
+            t0 = time.perf_counter()
+            with ctx.Pool(clients) as pool:
+                parts = pool.map(_client, shares)
+            elapsed = time.perf_counter() - t0
+            latencies = sorted(x for p in parts for x in p[0])
+            run_ids = [r for p in parts for r in p[2]]
+            results[f"workers_{n}"] = {
+                "requests": requests,
+                "concurrency": concurrency,
+                "errors": sum(p[1] for p in parts),
+                "rps": requests / elapsed,
+                "p50_ms": _percentile(latencies, 0.50),
+                "p95_ms": _percentile(latencies, 0.95),
+                "trace_misses": _missing_traces(base_url, run_ids),
+            }
+        finally:
+            proc.terminate()
+            proc.wait(timeout=30)
+    return results
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Throughput vs uvicorn worker count, with cross-worker trace reads.")
+    ap.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    ap.add_argument("--requests", type=int, default=400)
+    ap.add_argument("--concurrency", type=int, default=32)
+    ap.add_argument("--clients", type=int, default=max(2, min(8, os.cpu_count() or 1)), help="load-generator processes")
+    ap.add_argument("--port", type=int, default=8765)
+    ap.add_argument("--backend", default="sqlite", choices=["local", "sqlite"], help="TRACE_BACKEND for the server")
+    args = ap.parse_args()
+
+    results = run_workers(args.workers, args.requests, args.concurrency, args.clients, args.port, args.backend)
+    base = results[f"workers_{args.workers[0]}"]["rps"]
+    print(f"CPUs: {os.cpu_count()}, TRACE_BACKEND={args.backend}\n")
+    print("| workers | requests | errors | req/s | speedup | p50 ms | p95 ms | trace 404s |")
+    print("|---:|---:|---:|---:|---:|---:|---:|---:|")
+    for n in args.workers:
+        s = results[f"workers_{n}"]
+        print(
+            f"| {n} | {s['requests']} | {s['errors']} | {s['rps']:.1f} | {s['rps'] / base:.2f}x "
+            f"| {s['p50_ms']:.1f} | {s['p95_ms']:.1f} | {s['trace_misses']} |"
+        )
+    return 1 if any(s["errors"] or s["trace_misses"] for s in results.values()) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
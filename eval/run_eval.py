@@ -1,9 +1,12 @@
 from __future__ import annotations
 
+import argparse
+import asyncio
 import json
-import os
 import sys
+import time
 from pathlib import Path
+from typing import Any, Dict, List
 
 # Allow running as a script: add repo root to path
 sys.path.append(str(Path(__file__).resolve().parent.parent))
@@ -12,17 +15,22 @@ from schemas.agent import AgentRunRequest
 from tools.calculator import CalculatorTool
 from tools.retrieval import RetrieveTool
 from tools.summarizer import SummarizeTool
+from utils.cache import DecisionCache, TieredCache, TTLCache
+from utils.cassette import Cassette, CassetteClient
+from utils.config import settings
+from utils.llm import OpenAICompatibleClient
 from utils.retrieval import TinyRetriever
 from utils.registry import ToolRegistry
+from utils.router import RuleRouter
 from utils.tracing import TraceStore
 from agent import Agent
 
+EVAL_DIR = Path(__file__).resolve().parent
+DEFAULT_CASSETTE = EVAL_DIR / "cassettes" / "golden_cases.jsonl"
 
-def main() -> int:
-    # Force mock mode for evals
-    os.environ["MOCK_MODE"] = "1"
 
-    corpus_dir = Path(__file__).resolve().parent.parent / "data" / "corpus"
+def build_agent(mode: str, cassette: Cassette | None, base_url: str, model: str) -> Agent:
+    corpus_dir = EVAL_DIR.parent / "data" / "corpus"
     retriever = TinyRetriever(corpus_dir=str(corpus_dir))
 
     registry = ToolRegistry()
@@ -31,23 +39,78 @@ def main() -> int:
     registry.register(RetrieveTool(retriever=retriever))
 
     trace_store = TraceStore(log_dir=str(Path(".runs") / "eval"))
-    agent = Agent(registry=registry, trace_store=trace_store)
+    # A private, memory-only decision cache: results must not depend on earlier runs.
+    decisions = DecisionCache(TieredCache(TTLCache(max_entries=100_000)))
+
+    llm_client = None
+    if mode in ("replay", "record"):
+        inner = OpenAICompatibleClient(base_url=base_url, api_key=settings.openai_api_key, model=model) if mode == "record" else None
+        client = CassetteClient(cassette, model=model, mode=mode, inner=inner)
+        llm_client = lambda _api_key: client  # noqa: E731
+    # No shadow sampling: which steps reach the LLM must not vary between record and replay.
+    router = RuleRouter(enabled=settings.router_enabled, threshold=settings.router_threshold, shadow_rate=0.0)
+    return Agent(registry=registry, trace_store=trace_store, decisions=decisions, llm_client=llm_client, router=router)
+
+
+async def run_cases(agent: Agent, cases: List[Dict[str, Any]], parallel: int, force_mock: bool) -> List[Dict[str, Any]]:
+    """Run every case on the current loop, at most ``parallel`` at a time; rows keep case order."""
+    sem = asyncio.Semaphore(max(1, parallel))
 
-    cases = json.loads((Path(__file__).parent / "golden_cases.json").read_text(encoding="utf-8"))
+    async def one(c: Dict[str, Any]) -> Dict[str, Any]:
+        async with sem:
+            req = AgentRunRequest(message=c["input"], history=[], max_steps=6, force_mock=force_mock)
+            run_id, final = await agent.run(req)
+        expected = c["expect_contains"]
+        ok = all(e in final for e in ([expected] if isinstance(expected, str) else expected))
+        return {"name": c["name"], "ok": ok, "run_id": run_id, "final": final}
 
-    rows = []
-    passed = 0
-    for c in cases:
-        req = AgentRunRequest(message=c["input"], history=[], max_steps=6)
-        run_id, final = __import__("asyncio").run(agent.run(req))
-        ok = c["expect_contains"] in final
-        passed += int(ok)
-        rows.append({"name": c["name"], "ok": ok, "run_id": run_id, "final": final})
+    return await asyncio.gather(*(one(c) for c in cases))
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Run the golden eval cases.")
+    ap.add_argument("--cases", type=Path, default=EVAL_DIR / "golden_cases.json")
+    ap.add_argument("--parallel", type=int, default=16, help="cases in flight at once")
+    ap.add_argument(
+        "--mode",
+        choices=["mock", "replay", "record"],
+        default="mock",
+        help="mock: heuristic controller; replay: LLM controller answered from the cassette, offline; "
+        "record: call the real endpoint for requests missing from the cassette and save them",
+    )
+    ap.add_argument("--cassette", type=Path, default=DEFAULT_CASSETTE)
+    ap.add_argument("--base-url", default=settings.openai_base_url, help="endpoint used when recording")
+    ap.add_argument("--model", default=settings.openai_model)
+    ap.add_argument("--repeat", type=int, default=1, help="run each case N times (load/speed check)")
+    args = ap.parse_args()
+
+    cases = json.loads(args.cases.read_text(encoding="utf-8"))
+    if args.repeat > 1:
+        cases = [{**c, "name": f"{c['name']}#{i}"} for i in range(args.repeat) for c in cases]
+
+    cassette = Cassette(str(args.cassette)) if args.mode != "mock" else None
+    agent = build_agent(args.mode, cassette, args.base_url, args.model)
+
+    agent.registry.warmup()  # start the tool process pool outside the timed section
+    t0 = time.perf_counter()
+    rows = asyncio.run(run_cases(agent, cases, args.parallel, force_mock=args.mode == "mock"))
+    elapsed = time.perf_counter() - t0
+    agent.registry.shutdown()
+    agent.trace_store.close()
+    if args.mode == "record":
+        cassette.save()
+    passed = sum(r["ok"] for r in rows)
+    runs = [agent.trace_store.get(r["run_id"]) for r in rows]
+    llm_calls = sum(run.counters.get("llm_calls", 0) for run in runs if run is not None)
+    bypasses = sum(run.counters.get("router_bypasses", 0) for run in runs if run is not None)
 
     # Markdown report
     report = []
     report.append(f"# Eval report\n")
     report.append(f"- Passed: **{passed}/{len(cases)}**\n")
+    report.append(f"- Mode: {args.mode}, parallel={args.parallel}, {elapsed:.2f}s\n")
+    if args.mode != "mock":
+        report.append(f"- LLM calls: {llm_calls} ({llm_calls / len(rows):.2f} per run), router bypasses: {bypasses}\n")
     report.append("| case | ok | notes |\n|---|---:|---|\n")
     for r in rows:
         report.append(f"| {r['name']} | {'✅' if r['ok'] else '❌'} | run_id={r['run_id']} |\n")
@@ -56,7 +119,12 @@ def main() -> int:
     out_path.parent.mkdir(parents=True, exist_ok=True)
     out_path.write_text("".join(report), encoding="utf-8")
 
-    print("".join(report))
+    if len(rows) <= 50:
+        print("".join(report))
+    else:
+        print("".join(report[:3]))
+    if cassette is not None:
+        print(f"Cassette {args.cassette}: {len(cassette)} entries, {cassette.hits} replayed, {cassette.recorded} recorded")
     print(f"\nWrote {out_path}")
 
     return 0 if passed == len(cases) else 1
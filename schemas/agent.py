@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import List, Optional
+from typing import List, Literal, Optional
 from pydantic import BaseModel, Field
 
 
@@ -14,6 +14,8 @@ class AgentRunRequest(BaseModel):
     history: List[ChatMessage] = Field(default_factory=list)
     max_steps: int = 6
     run_name: Optional[str] = None
+    # Lane for queued runs (POST /api/run?mode=async); ignored for synchronous runs.
+    priority: Literal["high", "normal", "low"] = "normal"
 
     # UI/runtime overrides
     api_key: Optional[str] = None  # optional per-run override for real LLM mode
@@ -23,3 +25,18 @@ class AgentRunRequest(BaseModel):
 class AgentRunResponse(BaseModel):
     run_id: str
     final: str
+
+
+class RunStatus(BaseModel):
+    """A queued run (``POST /api/run?mode=async``); poll ``GET /api/run/{run_id}``."""
+
+    run_id: str
+    status: Literal["queued", "running", "done", "failed", "cancelled", "cancelling"]
+    priority: str
+    position: Optional[int] = None  # jobs ahead of it, while queued on this worker
+    attempts: int = 0
+    created_at_ms: int
+    started_at_ms: Optional[int] = None
+    finished_at_ms: Optional[int] = None
+    final: Optional[str] = None
+    error: Optional[str] = None
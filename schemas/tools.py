@@ -11,12 +11,27 @@ class ToolPermission(BaseModel):
     reason: Optional[str] = None
 
 
+class ToolCachePolicy(BaseModel):
+    """Result caching for tools that are pure functions of their arguments."""
+
+    cacheable: bool = False
+    ttl_s: Optional[float] = None
+    max_entries: int = 256
+
+
 class ToolSpec(BaseModel):
     name: str
     description: str
     input_schema: Dict[str, Any]
     output_schema: Dict[str, Any]
     permission: ToolPermission = Field(default_factory=ToolPermission)
+    version: str = "1"  # bump when a tool's output for the same arguments changes
+    cache: ToolCachePolicy = Field(default_factory=ToolCachePolicy)
+    # Where a sync tool runs: on the event loop, a thread pool or a process pool.
+    execution: Literal["inline", "thread", "process"] = "inline"
+    timeout_s: Optional[float] = None  # per-call limit; registry default if unset
+    # Pure and cheap: may be started on the rule router's guess before the controller asks for it.
+    speculative: bool = False
 
 
 class ToolCall(BaseModel):
@@ -29,6 +44,7 @@ class ToolResult(BaseModel):
     ok: bool = True
     output: Dict[str, Any] = Field(default_factory=dict)
     error: Optional[str] = None
+    cached: bool = False
 
 
 class ToolChoice(BaseModel):
@@ -36,5 +52,13 @@ class ToolChoice(BaseModel):
 
     action: Literal["tool", "final"]
     tool_call: Optional[ToolCall] = None
+    # Several independent calls to run concurrently in one step.
+    tool_calls: List[ToolCall] = Field(default_factory=list)
     final: Optional[str] = None
     reasoning: Optional[str] = None
+
+    def calls(self) -> List[ToolCall]:
+        """Every requested call, in order: ``tool_calls``, else the single ``tool_call``."""
+        if self.tool_calls:
+            return list(self.tool_calls)
+        return [self.tool_call] if self.tool_call is not None else []
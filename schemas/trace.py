@@ -16,15 +16,35 @@ class TraceEvent(BaseModel):
         "observation",
         "final",
         "error",
+        "decision_cache_hit",
+        "decision_cache_miss",
+        "tool_cache_hit",
+        "router_bypass",
+        "speculation_hit",
+        "speculation_wasted",
     ]
     data: Dict[str, Any] = Field(default_factory=dict)
 
 
+class ToolCallTiming(BaseModel):
+    index: int
+    tool_name: str
+    started_at_ms: int
+    ended_at_ms: int
+    cached: bool = False
+    # Started speculatively while the controller was deciding; the times are when it was used.
+    speculative: bool = False
+
+
 class StepTrace(BaseModel):
     step: int
     plan: str
+    # First call of the step (kept for single-call clients); all calls below.
     tool_call: Optional[ToolCall] = None
     tool_result: Optional[ToolResult] = None
+    tool_calls: List[ToolCall] = Field(default_factory=list)
+    tool_results: List[ToolResult] = Field(default_factory=list)
+    tool_timings: List[ToolCallTiming] = Field(default_factory=list)
     observation: Optional[str] = None
     started_at_ms: int
     ended_at_ms: int
@@ -39,3 +59,5 @@ class RunTrace(BaseModel):
     final: Optional[str] = None
     error: Optional[str] = None
     duration_ms: Optional[int] = None
+    # Per-run counters, e.g. decision_cache_hits / decision_cache_saved_ms.
+    counters: Dict[str, float] = Field(default_factory=dict)
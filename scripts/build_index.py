@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# Allow running as a script: add repo root to path
+sys.path.append(str(Path(__file__).resolve().parent.parent))
+
+from utils.retrieval import TinyRetriever, tokenize
+from utils.retrieval_index import MappedIndex, build_index
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Build or update the on-disk retrieval index ahead of time.")
+    ap.add_argument("--corpus", default="data/corpus", help="Folder of *.txt documents")
+    ap.add_argument("--out", default=None, help="Index file (default: RETRIEVAL_INDEX_DIR or next to the corpus)")
+    args = ap.parse_args()
+
+    corpus_dir = Path(args.corpus)
+    out = Path(args.out) if args.out else TinyRetriever.default_index_path(corpus_dir)
+    if out is None:
+        print("RETRIEVAL_PERSIST_INDEX is off and no --out was given.", file=sys.stderr)
+        return 2
+
+    t0 = time.perf_counter()
+    stats = build_index(corpus_dir, out, tokenize)
+    ms = (time.perf_counter() - t0) * 1000
+    index = MappedIndex(out)
+
+    status = "updated" if stats.written else "already current"
+    print(f"{out}: {status} in {ms:.1f} ms")
+    print(f"  docs={index.n_docs} terms={index.n_terms} reused={stats.reused} reindexed={stats.reindexed} removed={stats.removed}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
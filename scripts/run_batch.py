@@ -0,0 +1,109 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import time
+from pathlib import Path
+from typing import AsyncIterator, Set
+
+import httpx
+
+
+def _done_indices(out: Path) -> Set[int]:
+    """Indices already answered in an earlier (possibly interrupted) run's output."""
+    done: Set[int] = set()
+    if out.exists():
+        for line in out.read_text(encoding="utf-8").splitlines():
+            try:
+                done.add(json.loads(line)["index"])
+            except (ValueError, KeyError, TypeError):
+                continue  # torn last line from an interruption
+    return done
+
+
+def _ends_torn(out: Path) -> bool:
+    if not out.exists() or out.stat().st_size == 0:
+        return False
+    with out.open("rb") as f:
+        f.seek(-1, 2)
+        return f.read(1) != b"\n"
+
+
+async def _pending(path: Path, skip: Set[int], offset: int) -> AsyncIterator[bytes]:
+    """Input records still to run, tagged with their position so results keep it."""
+    position = -1
+    with path.open(encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            position += 1
+            if position < offset or position in skip:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                record = None
+            if not isinstance(record, dict):
+                # Wrapped so the server reports why it is invalid under this index.
+                record = {"unparsed": line.rstrip("\n")}
+            record["index"] = position
+            yield (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+async def run(args: argparse.Namespace) -> int:
+    out = args.out or args.input.with_suffix(".results.jsonl")
+    done = _done_indices(out)
+    total = sum(1 for line in args.input.open(encoding="utf-8") if line.strip())
+    todo = total - args.offset - len([i for i in done if i >= args.offset])
+    print(f"{args.input}: {total} records, {len(done)} already in {out}, {todo} to run")
+    if todo <= 0:
+        return 0
+
+    received = errors = 0
+    t0 = time.perf_counter()
+    timeout = httpx.Timeout(args.timeout, connect=10)
+    async with httpx.AsyncClient(base_url=args.url, timeout=timeout) as client:
+        async with client.stream(
+            "POST",
+            "/api/run/batch",
+            params={"concurrency": args.concurrency},
+            content=_pending(args.input, done, args.offset),
+            headers={"Content-Type": "application/x-ndjson"},
+        ) as resp:
+            resp.raise_for_status()
+            torn = _ends_torn(out)
+            with out.open("a", encoding="utf-8") as f:
+                if torn:
+                    f.write("\n")  # keep the torn line from swallowing the first new result
+                async for line in resp.aiter_lines():
+                    if not line:
+                        continue
+                    f.write(line + "\n")
+                    f.flush()  # a kill leaves at most one torn line; rerun to resume
+                    received += 1
+                    errors += "error" in json.loads(line)
+                    if received % args.progress == 0:
+                        print(f"  {received}/{todo} ({received / (time.perf_counter() - t0):.1f}/s)")
+
+    elapsed = time.perf_counter() - t0
+    print(f"Done: {received}/{todo} in {elapsed:.1f}s, {errors} errors -> {out}")
+    return 0 if received == todo else 1
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser(description="Run a JSONL file of AgentRunRequest records through POST /api/run/batch.")
+    ap.add_argument("input", type=Path, help="JSONL, one AgentRunRequest per line")
+    ap.add_argument("--out", type=Path, help="results JSONL (default: <input>.results.jsonl); appended to, never truncated")
+    ap.add_argument("--url", default="http://127.0.0.1:8000")
+    ap.add_argument("--concurrency", type=int, default=8, help="runs in flight on the server")
+    ap.add_argument("--offset", type=int, default=0, help="skip the first N records")
+    ap.add_argument("--timeout", type=float, default=600, help="seconds to wait for the next result line")
+    ap.add_argument("--progress", type=int, default=100, help="print progress every N results")
+    args = ap.parse_args()
+    # Records already present in --out are skipped, so rerunning after an interruption resumes where it stopped.
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
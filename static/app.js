@@ -1,5 +1,9 @@
 const $ = (sel) => document.querySelector(sel);
 
+// Earlier turns sent as `history`; the server keeps the newest that fit its token budget.
+const chatHistory = [];
+const MAX_HISTORY = 40;
+
 function addMessage(role, content) {
   const wrap = document.createElement('div');
   wrap.className = `msg ${role}`;
@@ -22,8 +26,10 @@ function renderTrace(trace) {
     const step = document.createElement('div');
     step.className = 'step';
 
-    const tool = s.tool_call ? `${s.tool_call.tool_name}(${JSON.stringify(s.tool_call.arguments)})` : '(none)';
-    const toolResult = s.tool_result ? JSON.stringify(s.tool_result, null, 2) : '';
+    const calls = (s.tool_calls && s.tool_calls.length) ? s.tool_calls : (s.tool_call ? [s.tool_call] : []);
+    const results = (s.tool_results && s.tool_results.length) ? s.tool_results : (s.tool_result ? [s.tool_result] : []);
+    const tool = calls.length ? calls.map((c) => `${c.tool_name}(${JSON.stringify(c.arguments)})`).join('\n') : '(none)';
+    const toolResult = results.length ? results.map((r) => JSON.stringify(r, null, 2)).join('\n') : '';
 
     step.innerHTML = `
       <div class="k">Step ${s.step} • ${(s.ended_at_ms - s.started_at_ms)} ms</div>
@@ -31,6 +37,7 @@ function renderTrace(trace) {
       <div class="v">${escapeHtml(s.plan)}</div>
       <div class="k">Tool</div>
       <div class="v">${escapeHtml(tool)}</div>
+      ${renderTimings(s)}
       <div class="k">Observation</div>
       <div class="v">${escapeHtml(s.observation || '')}</div>
       <div class="k">Tool result</div>
@@ -41,6 +48,21 @@ function renderTrace(trace) {
   });
 }
 
+// One bar per tool call on a shared time axis, so parallel calls visibly overlap.
+function renderTimings(s) {
+  const timings = (s.tool_timings || []).filter(Boolean);
+  if (timings.length < 2) return '';
+  const t0 = Math.min(...timings.map((t) => t.started_at_ms));
+  const span = Math.max(1, Math.max(...timings.map((t) => t.ended_at_ms)) - t0);
+  const rows = timings.map((t) => {
+    const left = ((t.started_at_ms - t0) / span) * 100;
+    const width = Math.max(1, ((t.ended_at_ms - t.started_at_ms) / span) * 100);
+    const label = `${t.tool_name} • ${t.ended_at_ms - t.started_at_ms} ms${t.cached ? ' (cached)' : ''}`;
+    return `<div class="timing"><div class="bar" style="left:${left}%;width:${width}%"></div><span>${escapeHtml(label)}</span></div>`;
+  });
+  return `<div class="k">Tool timings</div><div class="timings">${rows.join('')}</div>`;
+}
+
 function escapeHtml(str) {
   return (str || '')
     .replaceAll('&', '&amp;')
@@ -227,6 +249,25 @@ function loadMockToggle(){
   catch(e){ return true; }
 }
 
+async function readEvents(resp, onEvent){
+  // Minimal SSE reader over fetch() (EventSource can't POST a body).
+  const reader = resp.body.getReader();
+  const decoder = new TextDecoder();
+  let buf = '';
+  while(true){
+    const { value, done } = await reader.read();
+    if(done) break;
+    buf += decoder.decode(value, { stream: true });
+    let i;
+    while((i = buf.indexOf('\n\n')) >= 0){
+      const block = buf.slice(0, i);
+      buf = buf.slice(i + 2);
+      const data = block.split('\n').filter((l) => l.startsWith('data:')).map((l) => l.slice(5).trim()).join('\n');
+      if(data) onEvent(JSON.parse(data));
+    }
+  }
+}
+
 function saveMockToggle(on){
   try { localStorage.setItem('FASTAPI_AGENT_SDK_FORCE_MOCK', on ? '1' : '0'); }
   catch(e){}
@@ -256,22 +297,53 @@ async function runAgent() {
 
     const forceMock = shouldForceMock();
 
-    const resp = await fetch('./api/run', {
+    const resp = await fetch('./api/run/stream', {
       method: 'POST',
       headers: { 'Content-Type': 'application/json' },
-      body: JSON.stringify({ message: text, history: [], max_steps: 6, api_key: apiKey || null, force_mock: forceMock })
+      body: JSON.stringify({ message: text, history: chatHistory.slice(-MAX_HISTORY), max_steps: 6, api_key: apiKey || null, force_mock: forceMock })
+    });
+    if (!resp.ok || !resp.body) throw new Error(await resp.text());
+
+    // Render steps, tool calls and controller tokens as they arrive.
+    const live = { steps: [] };
+    let runId = null;
+    let tokens = '';
+    await readEvents(resp, (ev) => {
+      const step = live.steps[live.steps.length - 1];
+      if (ev.type === 'run_started') {
+        runId = ev.run_id;
+        $('#runId').textContent = runId;
+      } else if (ev.type === 'step_started') {
+        const now = Math.round(performance.now());
+        live.steps.push({ step: ev.step, plan: ev.plan, tool_calls: [], tool_results: [], tool_timings: [], observation: '', started_at_ms: now, ended_at_ms: now });
+        tokens = '';
+        assistantMsg.textContent = `Running step ${ev.step}...`;
+      } else if (ev.type === 'token') {
+        tokens += ev.text;
+        assistantMsg.textContent = `Thinking (step ${ev.step})...\n${tokens}`;
+      } else if (ev.type === 'tool_started' && step) {
+        step.tool_calls[ev.index || 0] = ev.tool_call;
+        assistantMsg.textContent = `Running ${step.tool_calls.map((c) => c.tool_name).join(', ')}...`;
+      } else if (ev.type === 'tool_finished' && step) {
+        step.tool_results[ev.index || 0] = ev.tool_result;
+        if (ev.timing) step.tool_timings[ev.index || 0] = ev.timing;
+      } else if (ev.type === 'step_finished' && step) {
+        step.observation = ev.observation;
+        step.ended_at_ms = step.started_at_ms + ev.ms;
+      } else if (ev.type === 'final') {
+        runId = ev.run_id;
+        assistantMsg.textContent = ev.final;
+        chatHistory.push({ role: 'user', content: text }, { role: 'assistant', content: ev.final });
+      }
+      if (ev.type !== 'token') renderTrace(live);
     });
-    if (!resp.ok) throw new Error(await resp.text());
-
-    const data = await resp.json();
-    $('#runId').textContent = data.run_id;
-
-    assistantMsg.textContent = data.final;
 
-    const t = await fetch(`./api/trace/${data.run_id}`);
-    if (t.ok) {
-      const trace = await t.json();
-      renderTrace(trace);
+    if (runId) {
+      const t = await fetch(`./api/trace/${runId}`);
+      if (t.ok) {
+        const trace = await t.json();
+        renderTrace(trace);
+      }
     }
   } catch (e) {
     // fall back to mock mode if backend isn't available
@@ -6,7 +6,7 @@ from typing import Any, Dict
 
 from pydantic import BaseModel, Field
 
-from schemas.tools import ToolResult, ToolSpec
+from schemas.tools import ToolCachePolicy, ToolResult, ToolSpec
 from tools.base import BaseTool
 
 
@@ -45,6 +45,8 @@ class CalculatorTool(BaseTool):
             description="Safely evaluate a basic math expression (+ - * / ** % and parentheses).",
             input_schema=CalculatorInput.model_json_schema(),
             output_schema={"type": "object", "properties": {"result": {"type": "number"}}},
+            cache=ToolCachePolicy(cacheable=True),
+            execution="process",
         )
         super().__init__(spec)
 
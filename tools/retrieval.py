@@ -1,17 +1,23 @@
 from __future__ import annotations
 
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Literal
 
 from pydantic import BaseModel, Field
 
-from schemas.tools import ToolResult, ToolSpec
+from schemas.tools import ToolCachePolicy, ToolResult, ToolSpec
 from tools.base import BaseTool
+from utils.config import settings
 from utils.retrieval import TinyRetriever
 
 
 class RetrieveInput(BaseModel):
     query: str = Field(..., description="Search query")
     k: int = Field(3, ge=1, le=10)
+    passages_per_doc: int = Field(1, ge=1, le=3, description="Best passages to return per document")
+    mode: Literal["lexical", "semantic", "hybrid"] = Field(
+        settings.retrieval_mode,
+        description="lexical: exact terms; semantic: also near spellings and word forms; hybrid: both",
+    )
 
 
 class RetrieveTool(BaseTool):
@@ -19,7 +25,7 @@ class RetrieveTool(BaseTool):
         self.retriever = retriever
         spec = ToolSpec(
             name="retrieve_corpus",
-            description="Search a tiny local corpus and return top passages.",
+            description="Search a tiny local corpus and return the best matching passage per document.",
             input_schema=RetrieveInput.model_json_schema(),
             output_schema={
                 "type": "object",
@@ -33,19 +39,48 @@ class RetrieveTool(BaseTool):
                                 "title": {"type": "string"},
                                 "score": {"type": "number"},
                                 "snippet": {"type": "string"},
+                                "start": {"type": "integer"},
+                                "end": {"type": "integer"},
+                                "highlights": {
+                                    "type": "array",
+                                    "items": {"type": "array", "items": {"type": "integer"}},
+                                },
                             },
                         },
-                    }
+                    },
+                    "mode": {"type": "string", "enum": ["lexical", "semantic", "hybrid"]},
                 },
             },
+            cache=ToolCachePolicy(cacheable=True),
+            execution="thread",
+            speculative=True,
         )
         super().__init__(spec)
 
+    def cache_version(self) -> str:
+        # Cached results are only valid for the corpus they were computed on.
+        return f"{self.spec.version}:{self.retriever.version}"
+
+    def warmup(self) -> None:
+        self.retriever.warmup()
+
     def run(self, arguments: Dict[str, Any]) -> ToolResult:
         inp = RetrieveInput(**arguments)
-        hits = self.retriever.search(inp.query, k=inp.k)
+        mode = self.retriever.resolve_mode(inp.mode)
+        hits = self.retriever.search_passages(inp.query, k=inp.k, per_doc=inp.passages_per_doc, mode=mode)
         results: List[Dict[str, Any]] = []
-        for doc, score in hits:
-            snippet = doc.text.strip().replace("\n", " ")[:280]
-            results.append({"doc_id": doc.doc_id, "title": doc.title, "score": score, "snippet": snippet})
-        return ToolResult(tool_name=self.spec.name, ok=True, output={"results": results})
+        for h in hits:
+            results.append(
+                {
+                    "doc_id": h.doc.doc_id,
+                    "title": h.doc.title,
+                    "score": h.score,
+                    "snippet": h.snippet,
+                    # character offsets of the passage in the document, and of
+                    # the matched query terms within the snippet
+                    "start": h.start,
+                    "end": h.end,
+                    "highlights": [list(span) for span in h.highlights],
+                }
+            )
+        return ToolResult(tool_name=self.spec.name, ok=True, output={"results": results, "mode": mode})
@@ -4,7 +4,7 @@ from typing import Any, Dict
 
 from pydantic import BaseModel, Field
 
-from schemas.tools import ToolResult, ToolSpec
+from schemas.tools import ToolCachePolicy, ToolResult, ToolSpec
 from tools.base import BaseTool
 
 
@@ -20,6 +20,9 @@ class SummarizeTool(BaseTool):
             description="Deterministic summarizer (mock): returns the first N sentences.",
             input_schema=SummarizeInput.model_json_schema(),
             output_schema={"type": "object", "properties": {"summary": {"type": "string"}}},
+            cache=ToolCachePolicy(cacheable=True),
+            execution="thread",
+            speculative=True,
         )
         super().__init__(spec)
 
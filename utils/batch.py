@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import asyncio
+import json
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional, Set, Tuple, Union
+
+from pydantic import ValidationError
+
+from schemas.agent import AgentRunRequest
+
+# AgentRunRequest -> (run_id, final), i.e. Agent.run
+RunFn = Callable[[AgentRunRequest], Awaitable[Tuple[str, str]]]
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Split a byte stream into lines as it arrives (the last line may lack a newline)."""
+    buf = b""
+    async for chunk in chunks:
+        buf += chunk
+        *lines, buf = buf.split(b"\n")
+        for line in lines:
+            yield line.decode("utf-8")
+    if buf:
+        yield buf.decode("utf-8")
+
+
+async def _records(lines: AsyncIterator[str], offset: int) -> AsyncIterator[Tuple[int, Union[AgentRunRequest, str]]]:
+    """(index, request or parse error) per non-blank line, skipping the first ``offset`` records.
+
+    The index is the record's position in the stream unless the record
+    carries its own ``"index"`` (the CLI sets it when resending only the
+    records missing from an earlier, interrupted batch), valid or not. A
+    line the CLI could not tag (not a JSON object) arrives wrapped as
+    ``{"index", "unparsed"}`` and is reported under that index.
+    """
+    position = -1
+    async for line in lines:
+        if not line.strip():
+            continue
+        position += 1
+        if position < offset:
+            continue
+        index = position
+        try:
+            data = json.loads(line)
+            if isinstance(data, dict):
+                tagged = data.pop("index", None)
+                if isinstance(tagged, int) and not isinstance(tagged, bool):
+                    index = tagged
+                if set(data) == {"unparsed"}:
+                    data = json.loads(data["unparsed"])
+            yield index, AgentRunRequest.model_validate(data)
+        except (ValueError, TypeError, ValidationError) as e:
+            yield index, "invalid request: " + " ".join(str(e).split())[:300]
+
+
+async def run_batch(
+    run: RunFn, lines: AsyncIterator[str], concurrency: int, offset: int = 0
+) -> AsyncIterator[Dict[str, Any]]:
+    """Run JSONL ``AgentRunRequest`` records with at most ``concurrency`` in flight.
+
+    Yields ``{"index", "run_id", "final"}`` (or ``{"index", "error"}`` for a
+    bad record) in completion order. Input is read only when a slot frees
+    up, so an arbitrarily long stream is never buffered. Closing the
+    iterator (e.g. the client went away) cancels the runs still going.
+    """
+    slots = asyncio.Semaphore(max(1, concurrency))
+    out: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue()
+    running: Set[asyncio.Task] = set()
+
+    async def one(index: int, req: AgentRunRequest) -> None:
+        try:
+            run_id, final = await run(req)
+            item: Dict[str, Any] = {"index": index, "run_id": run_id, "final": final}
+        except Exception as e:
+            item = {"index": index, "error": str(e)}
+        finally:
+            slots.release()
+        out.put_nowait(item)
+
+    async def feed() -> None:
+        try:
+            async for index, req in _records(lines, offset):
+                if isinstance(req, str):
+                    out.put_nowait({"index": index, "error": req})
+                    continue
+                await slots.acquire()
+                task = asyncio.create_task(one(index, req))
+                running.add(task)
+                task.add_done_callback(running.discard)
+            if running:
+                await asyncio.wait(set(running))
+        finally:
+            out.put_nowait(None)
+
+    feeder = asyncio.create_task(feed())
+    try:
+        while (item := await out.get()) is not None:
+            yield item
+        await feeder  # surface errors reading the input
+    finally:
+        for task in (feeder, *running):
+            task.cancel()
@@ -0,0 +1,269 @@
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, Tuple
+
+from utils.config import settings
+
+
+class TTLCache:
+    """In-memory LRU cache with a per-entry time-to-live."""
+
+    def __init__(self, max_entries: int = 1024, ttl_s: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Any:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at and expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        expires_at = time.monotonic() + self.ttl_s if self.ttl_s else 0.0
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.max_entries:
+            self._data.popitem(last=False)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SQLiteCache:
+    """Small JSON key/value cache in SQLite (WAL), shareable across workers."""
+
+    def __init__(self, path: str, max_entries: int = 10000, ttl_s: Optional[float] = None, table: str = "cache"):
+        self.max_entries = max_entries
+        self.ttl_s = ttl_s
+        self.table = table
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} (key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+        )
+        self._writes = 0
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            row = self._db.execute(f"SELECT value, expires_at FROM {self.table} WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at and expires_at < time.time():
+            return None
+        return json.loads(value)
+
+    def set(self, key: str, value: Any) -> None:
+        expires_at = time.time() + self.ttl_s if self.ttl_s else 0.0
+        with self._lock:
+            self._db.execute(
+                f"INSERT OR REPLACE INTO {self.table} (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, json.dumps(value, ensure_ascii=False), expires_at),
+            )
+            self._writes += 1
+            if self._writes % 100 == 0:
+                self._evict()
+
+    def _evict(self) -> None:
+        self._db.execute(f"DELETE FROM {self.table} WHERE expires_at > 0 AND expires_at < ?", (time.time(),))
+        self._db.execute(
+            f"DELETE FROM {self.table} WHERE rowid IN (SELECT rowid FROM {self.table} ORDER BY rowid DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+
+class TieredCache:
+    """Memory tier in front of an optional shared SQLite tier.
+
+    ``dump``/``load`` convert values to and from JSON for the SQLite tier
+    only; the memory tier keeps the original objects.
+    """
+
+    def __init__(
+        self,
+        memory: TTLCache,
+        disk: Optional[SQLiteCache] = None,
+        dump: Optional[Callable[[Any], Any]] = None,
+        load: Optional[Callable[[Any], Any]] = None,
+    ):
+        self.memory = memory
+        self.disk = disk
+        self._dump = dump
+        self._load = load
+
+    def get(self, key: str) -> Any:
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                if self._load is not None:
+                    value = self._load(value)
+                self.memory.set(key, value)
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, self._dump(value) if self._dump is not None else value)
+
+    def clear(self) -> None:
+        """Clear this process's memory tier; shared entries are left to their TTL and size bound."""
+        self.memory.clear()
+
+    def __len__(self) -> int:
+        return len(self.memory)
+
+
+def stable_hash(payload: Any) -> str:
+    """SHA-256 of the canonical JSON form of ``payload``."""
+    data = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+@dataclass
+class DecisionCacheStats:
+    hits: int = 0
+    misses: int = 0
+    coalesced: int = 0
+    saved_ms: float = 0.0
+
+
+class DecisionCache:
+    """Cache of controller (LLM) decisions for deterministic prompts.
+
+    Keys hash the whitespace-normalised messages, the model and the tool-spec
+    version. Concurrent misses on the same key share one in-flight call.
+    Each entry remembers how long the call took, so hits can report the
+    latency they saved. Replies the caller marks as not storable (e.g.
+    invalid JSON) are handed back but never cached.
+    """
+
+    def __init__(self, store: TieredCache, enabled: bool = True):
+        self.store = store
+        self.enabled = enabled
+        self.stats = DecisionCacheStats()
+        self._inflight: Dict[str, "asyncio.Future[Dict[str, Any]]"] = {}
+
+    @staticmethod
+    def key(messages: List[Dict[str, str]], model: str, tools_version: str) -> str:
+        normalized = [{"role": m["role"], "content": " ".join(m["content"].split())} for m in messages]
+        return stable_hash({"messages": normalized, "model": model, "tools": tools_version})
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        if not self.enabled:
+            return None
+        value = self.store.get(key)
+        if value is not None:
+            self.stats.hits += 1
+            self.stats.saved_ms += value.get("latency_ms", 0.0)
+        return value
+
+    def put(self, key: str, content: str, latency_ms: float, store: bool = True) -> Dict[str, Any]:
+        """Record a freshly computed decision (a miss); kept only when ``store`` is true."""
+        self.stats.misses += 1
+        value = {"content": content, "latency_ms": latency_ms}
+        if self.enabled and store:
+            self.store.set(key, value)
+        return value
+
+    async def wait(self, key: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        """Wait for an identical call in flight: (entry, "coalesced"), or None if there is none.
+
+        If the caller computing it is cancelled, waits for whoever took over;
+        None then means this caller should compute it (under ``leading``).
+        """
+        while (pending := self._inflight.get(key)) is not None:
+            try:
+                value = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise  # this caller was cancelled
+                continue  # the leader was; take over unless another waiter already has
+            self.stats.coalesced += 1
+            self.stats.saved_ms += value["latency_ms"]
+            return value, "coalesced"
+        return None
+
+    @contextmanager
+    def leading(self, key: str) -> Iterator["asyncio.Future[Dict[str, Any]]"]:
+        """Mark ``key`` as being computed by this caller until the block exits.
+
+        Set the yielded future's result to ``put``'s entry; ``wait`` callers
+        get it. Leaving the block by an error hands that error to them, and
+        by cancellation (or a closed generator) lets one of them take over.
+        """
+        fut: "asyncio.Future[Dict[str, Any]]" = asyncio.get_running_loop().create_future()
+        if self.enabled:
+            self._inflight[key] = fut
+        try:
+            yield fut
+        except Exception as e:
+            if not fut.done():
+                fut.set_exception(e)
+                fut.exception()  # mark retrieved: waiters are optional
+            raise
+        finally:
+            fut.cancel()  # no-op once settled
+            if self._inflight.get(key) is fut:
+                del self._inflight[key]
+
+    async def get_or_compute(
+        self, key: str, compute: Callable[[], Awaitable[Tuple[str, bool]]]
+    ) -> Tuple[Dict[str, Any], str]:
+        """Returns (entry, outcome) where outcome is "hit", "coalesced" or "miss".
+
+        ``compute`` returns (content, store); see ``put``.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value, "hit"
+        coalesced = await self.wait(key)
+        if coalesced is not None:
+            return coalesced
+        with self.leading(key) as pending:
+            t0 = time.perf_counter()
+            content, store = await compute()
+            value = self.put(key, content, (time.perf_counter() - t0) * 1000, store=store)
+            pending.set_result(value)
+        return value, "miss"
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"enabled": self.enabled, "entries": len(self.store.memory), **asdict(self.stats)}
+
+
+def _make_decision_cache() -> DecisionCache:
+    disk = None
+    if settings.decision_cache_sqlite_path:
+        disk = SQLiteCache(
+            settings.decision_cache_sqlite_path,
+            max_entries=settings.decision_cache_max_entries * 10,
+            ttl_s=settings.decision_cache_ttl_s,
+            table="decisions",
+        )
+    memory = TTLCache(max_entries=settings.decision_cache_max_entries, ttl_s=settings.decision_cache_ttl_s)
+    return DecisionCache(TieredCache(memory, disk), enabled=settings.decision_cache_enabled)
+
+
+decision_cache = _make_decision_cache()
@@ -0,0 +1,88 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+from utils.cache import stable_hash
+from utils.llm import LLMResponse, OpenAICompatibleClient
+
+
+class CassetteMiss(LookupError):
+    """Replay mode found no recorded response for a request."""
+
+
+class Cassette:
+    """Recorded chat.completions responses keyed by (model, messages, temperature).
+
+    Stored as JSONL, one interaction per line, sorted by key so re-recording
+    the same suite produces a stable diff.
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self.hits = 0
+        self.recorded = 0
+        if self.path.exists():
+            for line in self.path.read_text(encoding="utf-8").splitlines():
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[entry["key"]] = entry
+
+    @staticmethod
+    def key(model: str, messages: List[Dict[str, str]], temperature: float) -> str:
+        return stable_hash({"model": model, "messages": messages, "temperature": temperature})
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(key)
+        if entry is not None:
+            self.hits += 1
+        return entry
+
+    def put(self, key: str, model: str, messages: List[Dict[str, str]], content: str) -> None:
+        self._entries[key] = {"key": key, "model": model, "messages": messages, "content": content}
+        self.recorded += 1
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        lines = [json.dumps(self._entries[k], ensure_ascii=False, sort_keys=True) for k in sorted(self._entries)]
+        self.path.write_text("\n".join(lines) + ("\n" if lines else ""), encoding="utf-8")
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class CassetteClient:
+    """Drop-in for ``OpenAICompatibleClient`` that replays (and optionally records) a cassette.
+
+    ``mode="replay"`` never touches the network and raises ``CassetteMiss``
+    for unknown requests; ``mode="record"`` forwards misses to ``inner`` and
+    stores the responses. Call ``cassette.save()`` after recording.
+    ``json_mode`` is passed through when recording but is not part of the key.
+    """
+
+    def __init__(self, cassette: Cassette, model: str, mode: str = "replay", inner: Optional[OpenAICompatibleClient] = None):
+        if mode == "record" and inner is None:
+            raise ValueError("record mode needs a real client to forward to")
+        self.cassette = cassette
+        self.model = model
+        self.mode = mode
+        self.inner = inner
+
+    async def chat(self, messages: List[Dict[str, str]], temperature: float = 0.0, json_mode: bool = False) -> LLMResponse:
+        key = Cassette.key(self.model, messages, temperature)
+        entry = self.cassette.get(key)
+        if entry is not None:
+            return LLMResponse(content=entry["content"], raw={"cassette": key})
+        if self.mode != "record":
+            raise CassetteMiss(f"no recorded response for request {key[:12]} in {self.cassette.path}")
+        resp = await self.inner.chat(messages, temperature=temperature, json_mode=json_mode)
+        self.cassette.put(key, self.model, messages, resp.content)
+        return resp
+
+    async def chat_stream(
+        self, messages: List[Dict[str, str]], temperature: float = 0.0, json_mode: bool = False
+    ) -> AsyncIterator[str]:
+        resp = await self.chat(messages, temperature=temperature, json_mode=json_mode)
+        yield resp.content
@@ -12,7 +12,131 @@ class Settings:
     openai_base_url: str = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1")
     openai_model: str = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
 
+    # Shared HTTP connection pool for LLM calls (see utils/llm.LLMClientPool).
+    # HTTP/2 needs the optional `h2` package and is skipped if it is missing.
+    llm_http2: bool = os.getenv("LLM_HTTP2", "0") not in ("0", "false", "False")
+    llm_max_connections: int = int(os.getenv("LLM_MAX_CONNECTIONS", "100"))
+    llm_max_keepalive: int = int(os.getenv("LLM_MAX_KEEPALIVE", "20"))
+    llm_keepalive_expiry_s: float = float(os.getenv("LLM_KEEPALIVE_EXPIRY_S", "30"))
+    llm_connect_timeout_s: float = float(os.getenv("LLM_CONNECT_TIMEOUT_S", "5"))
+    llm_read_timeout_s: float = float(os.getenv("LLM_READ_TIMEOUT_S", "60"))
+    llm_write_timeout_s: float = float(os.getenv("LLM_WRITE_TIMEOUT_S", "10"))
+    llm_pool_timeout_s: float = float(os.getenv("LLM_POOL_TIMEOUT_S", "5"))
+
+    # Client-side admission for LLM calls, per endpoint: FIFO concurrency cap,
+    # requests/tokens per minute (0 = unlimited) and retries on 429 with
+    # adaptive backoff. LLM_BATCH_WINDOW_MS > 0 collects controller calls for
+    # that long and posts them together to LLM_BATCH_PATH (see bench/stub_llm.py).
+    llm_max_concurrency: int = int(os.getenv("LLM_MAX_CONCURRENCY", "64"))
+    llm_rpm: int = int(os.getenv("LLM_RPM", "0"))
+    llm_tpm: int = int(os.getenv("LLM_TPM", "0"))
+    llm_max_retries: int = int(os.getenv("LLM_MAX_RETRIES", "4"))
+    llm_backoff_base_s: float = float(os.getenv("LLM_BACKOFF_BASE_S", "0.5"))
+    llm_backoff_max_s: float = float(os.getenv("LLM_BACKOFF_MAX_S", "20"))
+    llm_batch_window_ms: float = float(os.getenv("LLM_BATCH_WINDOW_MS", "0"))
+    llm_batch_max: int = int(os.getenv("LLM_BATCH_MAX", "16"))
+    llm_batch_path: str = os.getenv("LLM_BATCH_PATH", "/chat/completions/batch")
+
+    # Several LLM backends (utils/llm.MultiEndpointClient), comma-separated entries of
+    # "<base_url> [model=<name>] [weight=<w>] [key_env=<VAR>]"; empty = OPENAI_BASE_URL alone.
+    # With two or more endpoints, slow calls are hedged on another one after the endpoint's
+    # LLM_HEDGE_PERCENTILE latency (0 = never);
+    # LLM_BREAKER_FAILURES consecutive failures open an endpoint's circuit for the cooldown.
+    llm_endpoints: str = os.getenv("LLM_ENDPOINTS", "")
+    llm_hedge_percentile: float = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+    llm_hedge_min_ms: float = float(os.getenv("LLM_HEDGE_MIN_MS", "200"))
+    llm_hedge_max_ratio: float = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.1"))
+    llm_breaker_failures: int = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+    llm_breaker_cooldown_s: float = float(os.getenv("LLM_BREAKER_COOLDOWN_S", "30"))
+
     app_log_dir: str = os.getenv("APP_LOG_DIR", ".runs")
 
+    # Trace store: in-memory ring bounds and persistence backend (utils/tracing.py).
+    # local: JSONL segments readable only by the writing process; sqlite: one file shared by all workers.
+    trace_backend: str = os.getenv("TRACE_BACKEND", "local")  # local | sqlite
+    trace_db_path: str = os.getenv("TRACE_DB_PATH", "")  # default: <APP_LOG_DIR>/traces.sqlite
+    trace_db_max_runs: int = int(os.getenv("TRACE_DB_MAX_RUNS", "100000"))
+    trace_capacity: int = int(os.getenv("TRACE_CAPACITY", "1000"))
+    trace_max_age_s: float = float(os.getenv("TRACE_MAX_AGE_S", "3600"))
+    trace_segment_max_bytes: int = int(os.getenv("TRACE_SEGMENT_MAX_BYTES", str(8 * 1024 * 1024)))
+    trace_max_segments: int = int(os.getenv("TRACE_MAX_SEGMENTS", "50"))
+    trace_fsync: str = os.getenv("TRACE_FSYNC", "interval")  # always | interval | never
+    trace_fsync_interval_s: float = float(os.getenv("TRACE_FSYNC_INTERVAL_S", "1"))
+    trace_queue_size: int = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+    trace_queue_policy: str = os.getenv("TRACE_QUEUE_POLICY", "drop")  # drop | block
+    trace_index_path: str = os.getenv("TRACE_INDEX_PATH", "")  # default: <APP_LOG_DIR>/trace_index.sqlite
+
+    # Off-loop tool execution (see ToolSpec.execution) and per-call timeout.
+    tool_thread_workers: int = int(os.getenv("TOOL_THREAD_WORKERS", "8"))
+    tool_process_workers: int = int(os.getenv("TOOL_PROCESS_WORKERS", "2"))
+    tool_timeout_s: float = float(os.getenv("TOOL_TIMEOUT_S", "10"))
+    # Background runs (POST /api/run?mode=async): worker pool, admission limit and the journal
+    # that lets queued/running runs survive a restart (default: <APP_LOG_DIR>/run_queue.sqlite).
+    run_queue_workers: int = int(os.getenv("RUN_QUEUE_WORKERS", "4"))
+    run_queue_max_depth: int = int(os.getenv("RUN_QUEUE_MAX_DEPTH", "1000"))
+    run_queue_path: str = os.getenv("RUN_QUEUE_PATH", "")
+    run_queue_lease_s: float = float(os.getenv("RUN_QUEUE_LEASE_S", "15"))
+    run_queue_max_attempts: int = int(os.getenv("RUN_QUEUE_MAX_ATTEMPTS", "3"))
+    # POST /api/run/batch: default and maximum runs in flight per batch.
+    batch_concurrency: int = int(os.getenv("BATCH_CONCURRENCY", "8"))
+    batch_max_concurrency: int = int(os.getenv("BATCH_MAX_CONCURRENCY", "64"))
+    # Optional SQLite tier behind the per-tool result caches, shared across workers.
+    tool_cache_sqlite_path: str = os.getenv("TOOL_CACHE_SQLITE_PATH", "")
+    # Upper bound on concurrent calls within one multi-tool step.
+    max_parallel_tools: int = int(os.getenv("MAX_PARALLEL_TOOLS", "4"))
+
+    # Latency histograms/counters served at /metrics; optional OTLP/JSON span file.
+    metrics_enabled: bool = os.getenv("METRICS", "1") not in ("0", "false", "False")
+    otel_span_file: str = os.getenv("OTEL_SPAN_FILE", "")
+
+    # Controller prompt budget, in estimated tokens (utils/prompt.py): long
+    # observations are truncated and history is a sliding window of recent turns.
+    prompt_max_tokens: int = int(os.getenv("PROMPT_MAX_TOKENS", "4000"))
+    prompt_observation_tokens: int = int(os.getenv("PROMPT_OBSERVATION_TOKENS", "1200"))
+    prompt_history_tokens: int = int(os.getenv("PROMPT_HISTORY_TOKENS", "1500"))
+
+    # Structured controller output: ask for JSON mode (dropped automatically if
+    # the endpoint rejects it) and allow this many repair round-trips.
+    llm_json_mode: bool = os.getenv("LLM_JSON_MODE", "1") not in ("0", "false", "False")
+    controller_repair_attempts: int = int(os.getenv("CONTROLLER_REPAIR_ATTEMPTS", "1"))
+
+    # Rule router in front of the LLM controller (utils/router.py): routes at or above the
+    # threshold skip the LLM; a shadow sample of those still asks it to measure agreement.
+    router_enabled: bool = os.getenv("ROUTER_ENABLED", "1") not in ("0", "false", "False")
+    router_threshold: float = float(os.getenv("ROUTER_THRESHOLD", "0.85"))
+    router_shadow_rate: float = float(os.getenv("ROUTER_SHADOW_RATE", "0.05"))
+    # Speculative tool calls (utils/speculation.py): run the router's predicted calls while
+    # the LLM decides; at most this many at once, and a run stops once it wasted the budget.
+    speculation_enabled: bool = os.getenv("SPECULATION", "0") not in ("0", "false", "False")
+    speculation_max_inflight: int = int(os.getenv("SPECULATION_MAX_INFLIGHT", "4"))
+    speculation_budget_ms: float = float(os.getenv("SPECULATION_BUDGET_MS", "250"))
+
+    # Controller decision cache (temperature=0 prompts are deterministic).
+    # Set DECISION_CACHE_SQLITE_PATH to share entries across workers.
+    decision_cache_enabled: bool = os.getenv("DECISION_CACHE", "1") not in ("0", "false", "False")
+    decision_cache_max_entries: int = int(os.getenv("DECISION_CACHE_MAX_ENTRIES", "1024"))
+    decision_cache_ttl_s: float = float(os.getenv("DECISION_CACHE_TTL_S", "600"))
+    decision_cache_sqlite_path: str = os.getenv("DECISION_CACHE_SQLITE_PATH", "")
+
+    # Retrieval scoring backend: "python" (pure-Python postings) or "numpy"
+    # (NumPy/SciPy sparse matrix; falls back to "python" if not installed).
+    retrieval_backend: str = os.getenv("RETRIEVAL_BACKEND", "python")
+
+    # Persistent memory-mapped retrieval index (shared by all workers). When
+    # RETRIEVAL_INDEX_DIR is empty the index lives next to the corpus folder.
+    retrieval_persist_index: bool = os.getenv("RETRIEVAL_PERSIST_INDEX", "1") not in ("0", "false", "False")
+    retrieval_index_dir: str = os.getenv("RETRIEVAL_INDEX_DIR", "")
+
+    # Passage chunking: documents are scored as overlapping token windows.
+    retrieval_passage_tokens: int = int(os.getenv("RETRIEVAL_PASSAGE_TOKENS", "48"))
+    retrieval_passage_overlap: int = int(os.getenv("RETRIEVAL_PASSAGE_OVERLAP", "12"))
+
+    # Default retrieve_corpus mode: "lexical" (exact terms), "semantic" (hashed n-gram
+    # embeddings + IVF index, needs numpy) or "hybrid" (ALPHA * semantic + rest lexical).
+    retrieval_mode: str = os.getenv("RETRIEVAL_MODE", "lexical")
+    retrieval_embed_dim: int = int(os.getenv("RETRIEVAL_EMBED_DIM", "256"))
+    retrieval_ivf_probe: int = int(os.getenv("RETRIEVAL_IVF_PROBE", "16"))
+    retrieval_hybrid_alpha: float = float(os.getenv("RETRIEVAL_HYBRID_ALPHA", "0.5"))
+
 
 settings = Settings()
@@ -1,12 +1,19 @@
 from __future__ import annotations
 
+import asyncio
 import json
-from dataclasses import dataclass
-from typing import Any, Dict, List, Optional
+import os
+import random
+import time
+import weakref
+from collections import OrderedDict, deque
+from dataclasses import asdict, dataclass, field
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Sequence, Tuple
 
 import httpx
 
 from utils.config import settings
+from utils.metrics import LLM_REQUESTS_TOTAL, LLM_SECONDS, span
 
 
 @dataclass
@@ -15,6 +22,503 @@ class LLMResponse:
     raw: Dict[str, Any]
 
 
+@dataclass
+class PoolStats:
+    requests: int = 0
+    connections_opened: int = 0
+    errors: int = 0
+    http_versions: Dict[str, int] = field(default_factory=dict)
+
+    @property
+    def reuse_ratio(self) -> float:
+        """Share of requests served on an already-open connection."""
+        if not self.requests:
+            return 0.0
+        return max(0.0, 1.0 - self.connections_opened / self.requests)
+
+
+def estimate_tokens(messages: List[Dict[str, str]]) -> int:
+    """Rough prompt size in tokens (about four characters each), for rate budgeting."""
+    return sum(len(m.get("content") or "") for m in messages) // 4 + 4 * len(messages)
+
+
+class FairSemaphore:
+    """Semaphore that admits waiters strictly in arrival order.
+
+    ``asyncio.Semaphore`` lets a task that arrives just as a slot frees up
+    take it ahead of tasks already waiting; under sustained load that starves
+    early callers. The limit can be changed at runtime.
+    """
+
+    def __init__(self, limit: int):
+        self.limit = max(1, limit)
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, front: bool = False) -> None:
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            return
+        fut = asyncio.get_running_loop().create_future()
+        if front:
+            self._waiters.appendleft(fut)
+        else:
+            self._waiters.append(fut)
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if fut.cancelled():
+                if fut in self._waiters:
+                    self._waiters.remove(fut)
+            else:
+                self.release()  # the slot was handed over as we were cancelled
+            raise
+
+    def release(self) -> None:
+        self.active -= 1
+        self._wake()
+
+    def set_limit(self, limit: int) -> None:
+        self.limit = max(1, limit)
+        self._wake()
+
+    def _wake(self) -> None:
+        while self._waiters and self.active < self.limit:
+            fut = self._waiters.popleft()
+            if not fut.done():
+                self.active += 1
+                fut.set_result(None)
+
+
+class _Bucket:
+    """Token bucket refilled at ``per_minute / 60`` per second, holding about one second's worth."""
+
+    def __init__(self, per_minute: float):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, cost: float, factor: float, now: float) -> float:
+        """Take ``cost`` (going into debt if needed); seconds until the debt is paid off."""
+        rate = self.rate * factor
+        self.level = min(self.capacity, self.level + (now - self.updated) * rate)
+        self.updated = now
+        self.level -= min(cost, self.capacity)
+        return max(0.0, -self.level / rate)
+
+
+@dataclass
+class LimiterStats:
+    admitted: int = 0
+    throttled: int = 0
+    retries: int = 0
+    waited_s: float = 0.0
+    batches: int = 0
+    batched_calls: int = 0
+
+
+class RateLimiter:
+    """Per-endpoint admission: FIFO concurrency cap plus RPM/TPM budgets, with AIMD on 429s.
+
+    Callers reserve from token buckets and sleep off any debt, so bursts
+    queue here instead of at the provider. A 429 halves the budgets and the
+    concurrency cap and pauses admissions until ``Retry-After``; each
+    success wins back a little, so throughput settles just under the
+    provider's real ceiling instead of tipping into retry storms. Only
+    requests admitted after the last cut can cut again, so one burst of
+    429s counts as one signal. With no RPM configured, the first 429 sets
+    the request budget to the rate actually offered over the last second.
+    """
+
+    def __init__(
+        self,
+        rpm: int = 0,
+        tpm: int = 0,
+        max_concurrency: int = 64,
+        backoff_base_s: float = 0.5,
+        backoff_max_s: float = 20.0,
+        min_factor: float = 0.02,
+        recover_step: float = 0.02,
+    ):
+        self.requests = _Bucket(rpm) if rpm > 0 else None
+        self.tokens = _Bucket(tpm) if tpm > 0 else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.slots = FairSemaphore(self.max_concurrency)
+        self.backoff_base_s = backoff_base_s
+        self.backoff_max_s = backoff_max_s
+        self.min_factor = min_factor
+        self.recover_step = recover_step
+        self.factor = 1.0
+        self.paused_until = 0.0
+        self.cut_at = 0.0
+        self.stats = LimiterStats()
+        self._admitted: Deque[float] = deque(maxlen=4096)
+
+    async def acquire(self, tokens: int, retry: bool = False) -> float:
+        """Wait for a concurrency slot, then for rate budget; returns the admission time.
+
+        Retries rejoin the queue at the front.
+        """
+        await self.slots.acquire(front=retry)
+        try:
+            t0 = time.monotonic()
+            while True:
+                while self.paused_until > time.monotonic():
+                    await asyncio.sleep(self.paused_until - time.monotonic())
+                reserved_at = time.monotonic()
+                delay = 0.0
+                for bucket, cost in ((self.requests, 1), (self.tokens, tokens)):
+                    if bucket is not None:
+                        delay = max(delay, bucket.reserve(cost, self.factor, reserved_at))
+                if delay:
+                    await asyncio.sleep(delay)
+                if self.cut_at <= reserved_at:
+                    break
+                # budgets were cut while we slept on the old pace: queue again at the new one
+            now = time.monotonic()
+            self.stats.admitted += 1
+            self.stats.waited_s += now - t0
+            self._admitted.append(now)
+            return now
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def release(self) -> None:
+        self.slots.release()
+
+    def on_success(self) -> None:
+        if self.factor < 1.0:
+            self.factor = min(1.0, self.factor + self.recover_step)
+            self.slots.set_limit(round(self.max_concurrency * self.factor))
+
+    def on_throttled(self, retry_after_s: Optional[float], attempt: int, admitted_at: float) -> None:
+        """Record a 429 for a request admitted at ``admitted_at``: back off and pause admissions."""
+        self.stats.throttled += 1
+        now = time.monotonic()
+        if admitted_at >= self.cut_at:
+            if self.requests is None:
+                offered = sum(1 for t in self._admitted if t > now - 1.0)
+                self.requests = _Bucket(max(1, offered) * 60)
+            self.factor = max(self.min_factor, self.factor * 0.5)
+            self.slots.set_limit(round(self.max_concurrency * self.factor))
+            for bucket in (self.requests, self.tokens):
+                if bucket is not None:
+                    bucket.level = 0.0  # the provider's budget is spent; waiters re-reserve
+            self.cut_at = now
+        delay = retry_after_s if retry_after_s is not None else min(self.backoff_max_s, self.backoff_base_s * 2**attempt)
+        # jitter so paused callers do not all retry in the same instant
+        self.paused_until = max(self.paused_until, now + delay * random.uniform(1.0, 1.25))
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            **asdict(self.stats),
+            "waited_s": round(self.stats.waited_s, 3),
+            "rate_factor": round(self.factor, 3),
+            "rpm": round(self.requests.rate * 60 * self.factor, 1) if self.requests else None,
+            "concurrency_limit": self.slots.limit,
+            "in_flight": self.slots.active,
+            "queued": self.slots.waiting,
+        }
+
+
+@dataclass
+class HealthStats:
+    requests: int = 0
+    failures: int = 0
+    circuit_opened: int = 0
+    hedges: int = 0  # hedged second requests sent to this endpoint
+    hedge_wins: int = 0
+
+
+class EndpointHealth:
+    """Circuit breaker and health score of one LLM endpoint.
+
+    ``failures`` consecutive retryable failures (5xx, 429, transport
+    errors) open the circuit: the endpoint gets no traffic for
+    ``cooldown_s``, then a single probe request (half-open) closes it again
+    on success or re-opens it on failure. Callers ``claim`` a request slot
+    when they pick the endpoint and ``end`` it when the request is over, so
+    concurrent callers cannot all take the one probe. The score, an EWMA of the success
+    rate times the endpoint's EWMA latency relative to the fastest one,
+    weights endpoint choice; recent latencies give the hedging threshold.
+    """
+
+    def __init__(self, failures: int = 5, cooldown_s: float = 30.0, alpha: float = 0.2, window: int = 256):
+        self.failures = max(1, failures)
+        self.cooldown_s = cooldown_s
+        self.alpha = alpha
+        self.state = "closed"
+        self.consecutive = 0
+        self.opened_at = 0.0
+        self.probing = False
+        self.success = 1.0
+        self.latency_s: Optional[float] = None
+        self.stats = HealthStats()
+        self._latencies: Deque[float] = deque(maxlen=window)
+
+    def available(self) -> bool:
+        if self.state == "open" and time.monotonic() - self.opened_at >= self.cooldown_s:
+            self.state = "half_open"
+        return self.state == "closed" or (self.state == "half_open" and not self.probing)
+
+    def claim(self) -> bool:
+        """Take a request slot on an ``available`` endpoint; True if it is the half-open probe."""
+        self.stats.requests += 1
+        if self.state == "half_open":
+            self.probing = True
+            return True
+        return False
+
+    def end(self, probe: bool) -> None:
+        """The request is over (answered, failed or cancelled): free the probe slot if it held it."""
+        if probe:
+            self.probing = False
+
+    def on_success(self, latency_s: Optional[float] = None) -> None:
+        """A good reply; ``latency_s`` is the full request time (None for streams)."""
+        self.success += self.alpha * (1.0 - self.success)
+        if latency_s is not None:
+            self.latency_s = latency_s if self.latency_s is None else self.latency_s + self.alpha * (latency_s - self.latency_s)
+            self._latencies.append(latency_s)
+        self.consecutive = 0
+        self.state = "closed"
+
+    def on_failure(self) -> None:
+        self.stats.failures += 1
+        self.success -= self.alpha * self.success
+        self.consecutive += 1
+        if self.state == "half_open" or (self.state == "closed" and self.consecutive >= self.failures):
+            self.state = "open"
+            self.opened_at = time.monotonic()
+            self.stats.circuit_opened += 1
+
+    def percentile(self, q: float, min_samples: int = 20) -> Optional[float]:
+        if len(self._latencies) < min_samples:
+            return None
+        ordered = sorted(self._latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * q / 100))]
+
+    def score(self, best_latency_s: Optional[float]) -> float:
+        speed = 1.0
+        if self.latency_s and best_latency_s:
+            speed = min(1.0, best_latency_s / self.latency_s)
+        return max(0.02, self.success * speed)  # never zero: a recovered endpoint wins traffic back
+
+    def metrics(self) -> Dict[str, Any]:
+        p95 = self.percentile(95)
+        return {
+            **asdict(self.stats),
+            "state": self.state,
+            "success": round(self.success, 4),
+            "latency_ms": round(self.latency_s * 1000, 1) if self.latency_s is not None else None,
+            "p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+        }
+
+
+@dataclass
+class RoutingStats:
+    calls: int = 0
+    retries: int = 0
+    failovers: int = 0  # retries that moved to another endpoint
+    hedges: int = 0
+    hedge_wins: int = 0
+    exhausted: int = 0  # calls that failed on every attempt
+
+
+def _retry_after(r: httpx.Response) -> Optional[float]:
+    for header, scale in (("retry-after-ms", 1000.0), ("retry-after", 1.0)):
+        value = r.headers.get(header)
+        if value:
+            try:
+                return max(0.0, float(value) / scale)
+            except ValueError:
+                pass  # HTTP-date form: fall back to exponential backoff
+    return None
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+class LLMClientPool:
+    """Process-wide pool of keep-alive ``httpx.AsyncClient`` objects.
+
+    One client (and therefore one connection pool) per base_url, so
+    consecutive agent steps reuse the TCP/TLS connection to the LLM
+    endpoint. API keys travel as per-request headers, so callers with their
+    own key share the pool instead of each opening one. Clients are bound to the event loop that created them, so the
+    pool is kept per loop. Close it on shutdown via ``aclose()``.
+    """
+
+    def __init__(self):
+        self._clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, httpx.AsyncClient]]" = (
+            weakref.WeakKeyDictionary()
+        )
+        self._stats: Dict[str, PoolStats] = {}
+        self._limiters: Dict[str, RateLimiter] = {}
+        self._health: Dict[str, EndpointHealth] = {}
+        self.routing = RoutingStats()
+        self.http2 = settings.llm_http2 and _http2_available()
+
+    def _new_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            http2=self.http2,
+            limits=httpx.Limits(
+                max_connections=settings.llm_max_connections,
+                max_keepalive_connections=settings.llm_max_keepalive,
+                keepalive_expiry=settings.llm_keepalive_expiry_s,
+            ),
+            timeout=httpx.Timeout(
+                connect=settings.llm_connect_timeout_s,
+                read=settings.llm_read_timeout_s,
+                write=settings.llm_write_timeout_s,
+                pool=settings.llm_pool_timeout_s,
+            ),
+        )
+
+    def get(self, base_url: str) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        clients = self._clients.setdefault(loop, {})
+        client = clients.get(base_url)
+        if client is None or client.is_closed:
+            client = clients[base_url] = self._new_client()
+        return client
+
+    def stats(self, base_url: str) -> PoolStats:
+        return self._stats.setdefault(base_url, PoolStats())
+
+    def limiter(self, base_url: str) -> RateLimiter:
+        limiter = self._limiters.get(base_url)
+        if limiter is None:
+            limiter = self._limiters[base_url] = RateLimiter(
+                rpm=settings.llm_rpm,
+                tpm=settings.llm_tpm,
+                max_concurrency=settings.llm_max_concurrency,
+                backoff_base_s=settings.llm_backoff_base_s,
+                backoff_max_s=settings.llm_backoff_max_s,
+            )
+        return limiter
+
+    def health(self, base_url: str) -> EndpointHealth:
+        health = self._health.get(base_url)
+        if health is None:
+            health = self._health[base_url] = EndpointHealth(
+                failures=settings.llm_breaker_failures, cooldown_s=settings.llm_breaker_cooldown_s
+            )
+        return health
+
+    def tracer(self, base_url: str):
+        """httpcore trace hook: counts new TCP connections per endpoint."""
+        stats = self.stats(base_url)
+
+        async def trace(event_name: str, info: Dict[str, Any]) -> None:
+            if event_name == "connection.connect_tcp.complete":
+                stats.connections_opened += 1
+
+        return trace
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "http2": self.http2,
+            "endpoints": {
+                url: {**asdict(s), "reuse_ratio": round(s.reuse_ratio, 4)} for url, s in self._stats.items()
+            },
+            "limiters": {url: limiter.metrics() for url, limiter in self._limiters.items()},
+            "health": {url: health.metrics() for url, health in self._health.items()},
+            "routing": asdict(self.routing),
+        }
+
+    async def aclose(self) -> None:
+        clients = [c for per_loop in self._clients.values() for c in per_loop.values()]
+        self._clients = weakref.WeakKeyDictionary()
+        for c in clients:
+            await c.aclose()
+
+
+llm_pool = LLMClientPool()
+
+
+class ChatBatcher:
+    """Collects ``chat`` calls arriving within ``window_ms`` and posts them as one request.
+
+    The batch body is ``{"model", "requests": [{"messages", "temperature", ...}, ...]}``
+    and the reply ``{"responses": [<chat.completion or {"error": ...}>, ...]}``
+    in the same order (``bench/stub_llm.py`` serves it). A window holding a
+    single call goes to the normal route, and so does everything once the
+    endpoint answers 404/405.
+    """
+
+    def __init__(self, client: "OpenAICompatibleClient", window_ms: float, max_batch: int):
+        self.client = client
+        self.window_s = window_ms / 1000.0
+        self.max_batch = max(1, max_batch)
+        self.supported = True
+        self._pending: List[Tuple[Dict[str, Any], asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+
+    async def submit(self, body: Dict[str, Any]) -> LLMResponse:
+        if not self.supported:
+            return await self.client._chat_one(body)
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((body, fut))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window_s, self._flush)
+        return await fut
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._send(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _send(self, batch: List[Tuple[Dict[str, Any], asyncio.Future]]) -> None:
+        bodies = [body for body, _ in batch]
+        results: List[Any] = []
+        try:
+            if len(bodies) > 1 and self.supported:
+                try:
+                    results = await self.client._chat_batch(bodies)
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code in (404, 405):
+                        self.supported = False
+                    elif not self.client._rejected_json_mode(e.response):
+                        raise
+            if not results:
+                results = await asyncio.gather(*(self.client._chat_one(b) for b in bodies), return_exceptions=True)
+        except Exception as e:
+            results = [e] * len(batch)
+        finally:
+            for i, (_, fut) in enumerate(batch):
+                if fut.done():
+                    continue
+                if i >= len(results):  # _send itself was cancelled
+                    fut.cancel()
+                    continue
+                res = results[i]
+                if isinstance(res, BaseException):
+                    fut.set_exception(res)
+                else:
+                    fut.set_result(res)
+
+
 class OpenAICompatibleClient:
     """Minimal OpenAI-compatible chat.completions client.
 
@@ -23,36 +527,450 @@ class OpenAICompatibleClient:
     - Ollama: http://localhost:11434/v1 (with an OpenAI-compatible shim)
 
     Note: Ollama's native API is different; use the /v1 compatibility layer.
+
+    Every request is admitted by the pool's per-endpoint ``RateLimiter`` and
+    retried on 429. With ``LLM_BATCH_WINDOW_MS`` set, ``chat`` calls are
+    micro-batched by a ``ChatBatcher``; ``chat_stream`` is never batched.
+    ``json_mode=True`` asks for ``response_format={"type": "json_object"}``
+    unless the endpoint has rejected it before.
     """
 
-    def __init__(self, base_url: str, api_key: Optional[str], model: str):
+    def __init__(
+        self,
+        base_url: str,
+        api_key: Optional[str],
+        model: str,
+        pool: Optional[LLMClientPool] = None,
+        batch_window_ms: Optional[float] = None,
+        max_retries: Optional[int] = None,
+    ):
         self.base_url = base_url.rstrip("/")
         self.api_key = api_key
         self.model = model
+        self.pool = pool or llm_pool
+        window = settings.llm_batch_window_ms if batch_window_ms is None else batch_window_ms
+        self.batcher = ChatBatcher(self, window, settings.llm_batch_max) if window > 0 else None
+        self.json_mode_supported = settings.llm_json_mode
+        # 429 retries on this endpoint; 0 when a MultiEndpointClient fails over instead.
+        self.max_retries = settings.llm_max_retries if max_retries is None else max_retries
 
-    async def chat(self, messages: List[Dict[str, str]], temperature: float = 0.0) -> LLMResponse:
-        url = f"{self.base_url}/chat/completions"
+    def _headers(self) -> Dict[str, str]:
         headers = {"Content-Type": "application/json"}
         if self.api_key:
             headers["Authorization"] = f"Bearer {self.api_key}"
+        return headers
 
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            "temperature": temperature,
-        }
-        async with httpx.AsyncClient(timeout=60) as client:
-            r = await client.post(url, headers=headers, json=payload)
-            r.raise_for_status()
+    def _body(self, messages: List[Dict[str, str]], temperature: float, json_mode: bool) -> Dict[str, Any]:
+        body: Dict[str, Any] = {"messages": messages, "temperature": temperature}
+        if json_mode and self.json_mode_supported:
+            body["response_format"] = {"type": "json_object"}
+        return body
+
+    def _rejected_json_mode(self, r: httpx.Response) -> bool:
+        """True (and JSON mode is off from now on) if a 400 complains about ``response_format``."""
+        if r.status_code == 400 and "response_format" in r.text:
+            self.json_mode_supported = False
+            return True
+        return False
+
+    async def chat(self, messages: List[Dict[str, str]], temperature: float = 0.0, json_mode: bool = False) -> LLMResponse:
+        body = self._body(messages, temperature, json_mode)
+        if self.batcher is not None:
+            return await self.batcher.submit(body)
+        return await self._chat_one(body)
+
+    async def _chat_one(self, body: Dict[str, Any]) -> LLMResponse:
+        if not self.json_mode_supported:
+            body = {k: v for k, v in body.items() if k != "response_format"}
+        payload = {"model": self.model, **body}
+        with span("llm.chat", histogram=LLM_SECONDS, model=self.model, stream=False):
+            try:
+                r = await self._post("/chat/completions", payload, estimate_tokens(body["messages"]))
+            except httpx.HTTPStatusError as e:
+                if "response_format" not in payload or not self._rejected_json_mode(e.response):
+                    raise
+                payload.pop("response_format")
+                r = await self._post("/chat/completions", payload, estimate_tokens(body["messages"]))
             data = r.json()
 
         content = data["choices"][0]["message"]["content"]
         return LLMResponse(content=content, raw=data)
 
+    async def _chat_batch(self, bodies: List[Dict[str, Any]]) -> List[Any]:
+        """One batch request; per item an ``LLMResponse`` or the exception for that item."""
+        payload = {"model": self.model, "requests": bodies}
+        tokens = sum(estimate_tokens(b["messages"]) for b in bodies)
+        with span("llm.chat", histogram=LLM_SECONDS, model=self.model, stream=False) as s:
+            s.set(batch_size=len(bodies))
+            data = (await self._post(settings.llm_batch_path, payload, tokens)).json()
+        limiter = self.pool.limiter(self.base_url)
+        limiter.stats.batches += 1
+        limiter.stats.batched_calls += len(bodies)
+
+        out: List[Any] = []
+        for item in data["responses"]:
+            if "error" in item:
+                out.append(RuntimeError(f"LLM batch item failed: {item['error'].get('message', item['error'])}"))
+            else:
+                out.append(LLMResponse(content=item["choices"][0]["message"]["content"], raw=item))
+        return out
+
+    async def _post(self, path: str, payload: Dict[str, Any], tokens: int) -> httpx.Response:
+        """POST through the endpoint's limiter, retrying 429s after the advised pause."""
+        url = f"{self.base_url}{path}"
+        client = self.pool.get(self.base_url)
+        stats = self.pool.stats(self.base_url)
+        limiter = self.pool.limiter(self.base_url)
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                limiter.stats.retries += 1
+            admitted_at = await limiter.acquire(tokens, retry=attempt > 0)
+            stats.requests += 1
+            try:
+                r = await client.post(url, headers=self._headers(), json=payload, extensions={"trace": self.pool.tracer(self.base_url)})
+            except httpx.HTTPError:
+                stats.errors += 1
+                LLM_REQUESTS_TOTAL.inc(model=self.model, status="error")
+                raise
+            finally:
+                limiter.release()
+            LLM_REQUESTS_TOTAL.inc(model=self.model, status=str(r.status_code))
+            if r.status_code == 429:
+                limiter.on_throttled(_retry_after(r), attempt, admitted_at)
+                if attempt < self.max_retries:
+                    continue
+            try:
+                r.raise_for_status()
+            except httpx.HTTPError:
+                stats.errors += 1
+                raise
+            limiter.on_success()
+            stats.http_versions[r.http_version] = stats.http_versions.get(r.http_version, 0) + 1
+            return r
+        raise AssertionError("unreachable")
+
+    async def chat_stream(
+        self, messages: List[Dict[str, str]], temperature: float = 0.0, json_mode: bool = False
+    ) -> AsyncIterator[str]:
+        """Like ``chat`` with ``stream=True``: yields content deltas as SSE chunks arrive."""
+        url = f"{self.base_url}/chat/completions"
+        payload = {"model": self.model, **self._body(messages, temperature, json_mode), "stream": True}
+        client = self.pool.get(self.base_url)
+        stats = self.pool.stats(self.base_url)
+        limiter = self.pool.limiter(self.base_url)
+        tokens = estimate_tokens(messages)
+        with span("llm.chat", histogram=LLM_SECONDS, model=self.model, stream=True):
+            attempt = 0
+            while True:
+                if attempt:
+                    limiter.stats.retries += 1
+                admitted_at = await limiter.acquire(tokens, retry=attempt > 0)
+                stats.requests += 1
+                try:
+                    async with client.stream(
+                        "POST", url, headers=self._headers(), json=payload, extensions={"trace": self.pool.tracer(self.base_url)}
+                    ) as r:
+                        LLM_REQUESTS_TOTAL.inc(model=self.model, status=str(r.status_code))
+                        if r.status_code == 429:
+                            limiter.on_throttled(_retry_after(r), attempt, admitted_at)
+                            if attempt < self.max_retries:
+                                attempt += 1
+                                continue
+                        if r.status_code == 400 and "response_format" in payload:
+                            await r.aread()
+                            if self._rejected_json_mode(r):
+                                # Resend without it, as _chat_one does; not a retry, so max_retries=0 still gets it.
+                                payload.pop("response_format")
+                                continue
+                        r.raise_for_status()
+                        stats.http_versions[r.http_version] = stats.http_versions.get(r.http_version, 0) + 1
+                        async for line in r.aiter_lines():
+                            delta = parse_sse_line(line)
+                            if delta is _DONE:
+                                break
+                            if delta:
+                                yield delta
+                        limiter.on_success()
+                        return
+                except httpx.HTTPError as e:
+                    stats.errors += 1
+                    if not isinstance(e, httpx.HTTPStatusError):
+                        LLM_REQUESTS_TOTAL.inc(model=self.model, status="error")
+                    raise
+                finally:
+                    limiter.release()
+
+
+_DONE = object()
+
+
+def parse_sse_line(line: str) -> Any:
+    """Content delta of one ``data:`` line of a chat.completions stream.
+
+    Returns None for comments, keep-alives and chunks without content, and
+    ``_DONE`` for the terminating ``data: [DONE]``.
+    """
+    if not line.startswith("data:"):
+        return None
+    data = line[5:].strip()
+    if data == "[DONE]":
+        return _DONE
+    if not data:
+        return None
+    chunk = json.loads(data)
+    choices = chunk.get("choices") or [{}]
+    return (choices[0].get("delta") or {}).get("content")
+
+
+@dataclass
+class LLMEndpoint:
+    base_url: str
+    model: str
+    weight: float = 1.0
+    api_key_env: Optional[str] = None  # read the key from this variable instead of OPENAI_API_KEY
+
+
+def parse_endpoints(spec: str, default_model: str) -> List[LLMEndpoint]:
+    """``LLM_ENDPOINTS``: comma-separated ``<base_url> [model=<name>] [weight=<w>] [key_env=<VAR>]``."""
+    endpoints: List[LLMEndpoint] = []
+    for entry in spec.split(","):
+        url, *options = entry.split() or [""]
+        if not url:
+            continue
+        opts: Dict[str, str] = {}
+        for option in options:
+            name, sep, value = option.partition("=")
+            if not sep or name not in ("model", "weight", "key_env"):
+                raise ValueError(f"LLM_ENDPOINTS: bad option {option!r} in {entry.strip()!r}")
+            opts[name] = value
+        endpoints.append(
+            LLMEndpoint(url.rstrip("/"), opts.get("model", default_model), float(opts.get("weight", 1.0)), opts.get("key_env"))
+        )
+    return endpoints
+
+
+class LLMUnavailable(RuntimeError):
+    """Every endpoint's circuit is open."""
+
+
+class MultiEndpointClient:
+    """``chat`` / ``chat_stream`` across several OpenAI-compatible endpoints.
+
+    Each call goes to an endpoint drawn at random by ``weight`` times its
+    health score, skipping endpoints whose circuit is open. A ``chat``
+    still running after the endpoint's ``hedge_percentile`` latency gets a
+    hedged second request on another healthy endpoint (never the same one:
+    that only doubles its tail load, so one endpoint is never hedged); the
+    first good reply wins and the other request is cancelled.
+    Hedges are capped at ``hedge_max_ratio`` of calls. 5xx, transport errors
+    and (with more than one endpoint) 429s are retried up to
+    ``max_retries`` times: on another endpoint when one is healthy,
+    otherwise after a full-jitter exponential backoff. A lone endpoint
+    keeps retrying its 429s behind its ``RateLimiter`` as before. Streams
+    fail over only before their first delta and are not hedged.
+    """
+
+    def __init__(
+        self,
+        endpoints: Sequence[LLMEndpoint],
+        api_key: Optional[str],
+        pool: Optional[LLMClientPool] = None,
+        max_retries: Optional[int] = None,
+        hedge_percentile: Optional[float] = None,
+        hedge_min_ms: Optional[float] = None,
+        hedge_max_ratio: Optional[float] = None,
+        rng: Optional[random.Random] = None,
+    ):
+        if not endpoints:
+            raise ValueError("MultiEndpointClient needs at least one endpoint")
+        self.endpoints = list(endpoints)
+        self.pool = pool or llm_pool
+        self.clients = [
+            OpenAICompatibleClient(
+                base_url=e.base_url,
+                api_key=os.getenv(e.api_key_env) if e.api_key_env else api_key,
+                model=e.model,
+                pool=self.pool,
+                max_retries=None if len(self.endpoints) == 1 else 0,
+            )
+            for e in self.endpoints
+        ]
+        # Part of the decision-cache key: replies may come from any of these models.
+        self.model = "|".join(dict.fromkeys(e.model for e in self.endpoints))
+        self.max_retries = settings.llm_max_retries if max_retries is None else max_retries
+        self.hedge_percentile = settings.llm_hedge_percentile if hedge_percentile is None else hedge_percentile
+        self.hedge_min_s = (settings.llm_hedge_min_ms if hedge_min_ms is None else hedge_min_ms) / 1000
+        self.hedge_max_ratio = settings.llm_hedge_max_ratio if hedge_max_ratio is None else hedge_max_ratio
+        self._rng = rng or random.Random()
+
+    def _health(self, i: int) -> EndpointHealth:
+        return self.pool.health(self.endpoints[i].base_url)
+
+    def _retryable(self, e: BaseException) -> bool:
+        if isinstance(e, httpx.HTTPStatusError):
+            status = e.response.status_code
+            return status >= 500 or (status == 429 and len(self.endpoints) > 1)
+        return isinstance(e, httpx.TransportError)
+
+    def _pick(self, tried: Sequence[int], untried_only: bool = False) -> Optional[Tuple[int, bool]]:
+        """Next endpoint by weight x health among those accepting traffic, untried ones first (or only).
+
+        Returns (index, probe) with the endpoint's slot already claimed (no
+        await between checking and claiming); the caller must ``end`` it.
+        """
+        ready = [i for i in range(len(self.endpoints)) if self._health(i).available()]
+        candidates = [i for i in ready if i not in tried] or ([] if untried_only else ready)
+        if not candidates:
+            return None
+        latencies = [self._health(i).latency_s for i in candidates if self._health(i).latency_s]
+        best = min(latencies) if latencies else None
+        weights = [self.endpoints[i].weight * self._health(i).score(best) for i in candidates]
+        i = self._rng.choices(candidates, weights)[0]
+        return i, self._health(i).claim()
+
+    async def _next(self, tried: List[int], error: Optional[BaseException], attempt: int) -> Tuple[int, bool]:
+        picked = self._pick(tried)
+        if picked is None:
+            raise LLMUnavailable(f"all {len(self.endpoints)} LLM endpoint(s) have an open circuit") from error
+        i, probe = picked
+        if tried:
+            self.pool.routing.retries += 1
+            if i != tried[-1]:
+                self.pool.routing.failovers += 1
+            elif not (isinstance(error, httpx.HTTPStatusError) and error.response.status_code == 429):
+                # same endpoint again: full jitter, so failed callers do not retry in lockstep
+                # (a 429 already paused the endpoint's limiter until Retry-After)
+                cap = min(settings.llm_backoff_max_s, settings.llm_backoff_base_s * 2 ** (attempt - 1))
+                try:
+                    await asyncio.sleep(self._rng.uniform(0, cap))
+                except BaseException:
+                    self._health(i).end(probe)
+                    raise
+        tried.append(i)
+        return i, probe
+
+    def _start(
+        self, i: int, probe: bool, messages: List[Dict[str, str]], temperature: float, json_mode: bool
+    ) -> "asyncio.Task[LLMResponse]":
+        task = asyncio.ensure_future(self._call(i, messages, temperature, json_mode))
+        # Runs even if the task is cancelled before its first step.
+        task.add_done_callback(lambda _t: self._health(i).end(probe))
+        return task
+
+    async def _call(self, i: int, messages: List[Dict[str, str]], temperature: float, json_mode: bool) -> LLMResponse:
+        health = self._health(i)
+        t0 = time.monotonic()
+        try:
+            resp = await self.clients[i].chat(messages, temperature=temperature, json_mode=json_mode)
+        except Exception as e:
+            if self._retryable(e):
+                health.on_failure()
+            raise
+        health.on_success(time.monotonic() - t0)
+        return resp
+
+    def _hedge_delay(self, i: int) -> Optional[float]:
+        routing = self.pool.routing
+        if len(self.endpoints) < 2 or not self.hedge_percentile or routing.hedges >= self.hedge_max_ratio * routing.calls:
+            return None
+        p = self._health(i).percentile(self.hedge_percentile)
+        return None if p is None else max(p, self.hedge_min_s)
+
+    async def _hedged(
+        self, i: int, probe: bool, messages: List[Dict[str, str]], temperature: float, json_mode: bool
+    ) -> LLMResponse:
+        first = self._start(i, probe, messages, temperature, json_mode)
+        running = {first}
+        hedge_to: Optional[int] = None
+        try:
+            delay = self._hedge_delay(i)
+            if delay is not None:
+                await asyncio.wait(running, timeout=delay)
+                picked = None if first.done() else self._pick([i], untried_only=True)
+                if picked is not None:
+                    hedge_to = picked[0]
+                    self.pool.routing.hedges += 1
+                    self._health(hedge_to).stats.hedges += 1
+                    running.add(self._start(hedge_to, picked[1], messages, temperature, json_mode))
+            while running:
+                done, running = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not first:
+                            self.pool.routing.hedge_wins += 1
+                            self._health(hedge_to).stats.hedge_wins += 1
+                        return task.result()
+            raise first.exception()  # both failed: report the primary's error
+        finally:
+            for task in running:
+                task.cancel()  # the loser: its connection is closed, its limiter slot freed
+
+    async def chat(self, messages: List[Dict[str, str]], temperature: float = 0.0, json_mode: bool = False) -> LLMResponse:
+        self.pool.routing.calls += 1
+        tried: List[int] = []
+        error: Optional[Exception] = None
+        for attempt in range(self.max_retries + 1):
+            i, probe = await self._next(tried, error, attempt)
+            try:
+                return await self._hedged(i, probe, messages, temperature, json_mode)
+            except Exception as e:
+                if not self._retryable(e):
+                    raise
+                error = e
+        self.pool.routing.exhausted += 1
+        raise error
+
+    async def chat_stream(
+        self, messages: List[Dict[str, str]], temperature: float = 0.0, json_mode: bool = False
+    ) -> AsyncIterator[str]:
+        self.pool.routing.calls += 1
+        tried: List[int] = []
+        error: Optional[Exception] = None
+        for attempt in range(self.max_retries + 1):
+            i, probe = await self._next(tried, error, attempt)
+            health = self._health(i)
+            started = False
+            stream = self.clients[i].chat_stream(messages, temperature=temperature, json_mode=json_mode)
+            try:
+                async for delta in stream:
+                    if not started:
+                        started = True
+                        health.on_success()
+                    yield delta
+                if not started:
+                    health.on_success()
+                return
+            except Exception as e:
+                if not self._retryable(e):
+                    raise
+                health.on_failure()
+                if started:
+                    raise  # deltas were already handed out: cannot switch endpoints mid-reply
+                error = e
+            finally:
+                health.end(probe)  # also when the consumer closed us mid-reply
+                await stream.aclose()
+        self.pool.routing.exhausted += 1
+        raise error
+
+
+# Per-request API keys each get a client; bounded so a stream of distinct keys
+# cannot grow it forever. Connections live in ``llm_pool``, so eviction closes nothing.
+_MAX_CLIENTS = 64
+_clients: "OrderedDict[Tuple[str, str, str], MultiEndpointClient]" = OrderedDict()
+
 
-def get_llm_client(api_key_override: Optional[str] = None) -> OpenAICompatibleClient:
-    return OpenAICompatibleClient(
-        base_url=settings.openai_base_url,
-        api_key=api_key_override or settings.openai_api_key,
-        model=settings.openai_model,
-    )
+def get_llm_client(api_key_override: Optional[str] = None) -> MultiEndpointClient:
+    api_key = api_key_override or settings.openai_api_key
+    key = (settings.llm_endpoints or settings.openai_base_url, api_key or "", settings.openai_model)
+    client = _clients.get(key)
+    if client is None:
+        endpoints = parse_endpoints(settings.llm_endpoints, settings.openai_model) or [
+            LLMEndpoint(settings.openai_base_url.rstrip("/"), settings.openai_model)
+        ]
+        client = _clients[key] = MultiEndpointClient(endpoints, api_key)
+        while len(_clients) > _MAX_CLIENTS:
+            _clients.popitem(last=False)
+    else:
+        _clients.move_to_end(key)
+    return client
@@ -0,0 +1,286 @@
+from __future__ import annotations
+
+import bisect
+import contextvars
+import json
+import queue
+import random
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from utils.config import settings
+
+# Seconds; finer at the low end than Prometheus' defaults, since most phases are in-process.
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _labels(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _fmt_labels(key: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+    pairs = key + extra
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _fmt_value(v: float) -> str:
+    if v == float("inf"):
+        return "+Inf"
+    return repr(float(v)) if isinstance(v, float) else str(v)
+
+
+class Counter:
+    def __init__(self, name: str, help: str):
+        self.name = name
+        self.help = help
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _labels(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, v in sorted(self._values.items()):
+                lines.append(f"{self.name}{_fmt_labels(key)} {_fmt_value(v)}")
+        return lines
+
+
+@dataclass
+class _HistogramSeries:
+    counts: List[int]
+    total: float = 0.0
+    count: int = 0
+
+
+class Histogram:
+    """Cumulative-bucket histogram (Prometheus semantics), one series per label set."""
+
+    def __init__(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[LabelKey, _HistogramSeries] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _labels(labels)
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            s = self._series.get(key)
+            if s is None:
+                s = self._series[key] = _HistogramSeries(counts=[0] * (len(self.buckets) + 1))
+            s.counts[i] += 1
+            s.total += value
+            s.count += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, s in sorted(self._series.items()):
+                cumulative = 0
+                for le, c in zip(self.buckets + (float("inf"),), s.counts):
+                    cumulative += c
+                    lines.append(f"{self.name}_bucket{_fmt_labels(key, (('le', _fmt_value(le)),))} {cumulative}")
+                lines.append(f"{self.name}_sum{_fmt_labels(key)} {_fmt_value(s.total)}")
+                lines.append(f"{self.name}_count{_fmt_labels(key)} {s.count}")
+        return lines
+
+
+# A collector returns (name, help, type, [(labels, value)]) for values owned elsewhere,
+# e.g. cache or pool stats, read at scrape time.
+Collector = Callable[[], List[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: List[Collector] = []
+        self._lock = threading.Lock()
+
+    def counter(self, name: str, help: str) -> Counter:
+        with self._lock:
+            return self._metrics.setdefault(name, Counter(name, help))
+
+    def histogram(self, name: str, help: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        with self._lock:
+            return self._metrics.setdefault(name, Histogram(name, help, buckets))
+
+    def add_collector(self, collector: Collector) -> None:
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Text exposition format (version 0.0.4)."""
+        lines: List[str] = []
+        with self._lock:
+            metrics = list(self._metrics.values())
+        for m in metrics:
+            lines += m.render()
+        for collect in self._collectors:
+            for name, help, kind, samples in collect():
+                lines += [f"# HELP {name} {help}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_fmt_labels(_labels(l))} {_fmt_value(v)}" for l, v in samples]
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+PHASE_SECONDS = metrics.histogram("agent_phase_seconds", "Time spent per agent phase.")
+RUNS_TOTAL = metrics.counter("agent_runs_total", "Finished agent runs by status.")
+TOOL_SECONDS = metrics.histogram("tool_call_seconds", "Tool call latency, including pool dispatch.")
+TOOL_CALLS_TOTAL = metrics.counter("tool_calls_total", "Tool calls by tool and outcome.")
+LLM_SECONDS = metrics.histogram("llm_request_seconds", "Latency of chat.completions requests.")
+LLM_REQUESTS_TOTAL = metrics.counter("llm_requests_total", "chat.completions requests by status.")
+CONTROLLER_REPLIES_TOTAL = metrics.counter("controller_replies_total", "Controller LLM replies by parse outcome.")
+ROUTER_DECISIONS_TOTAL = metrics.counter("router_decisions_total", "Rule-router decisions by rule and outcome.")
+ROUTER_AGREEMENT_TOTAL = metrics.counter("router_agreement_total", "Rule-router guesses compared with the LLM decision.")
+SPECULATIVE_CALLS_TOTAL = metrics.counter("speculative_tool_calls_total", "Speculative tool calls by outcome.")
+SPECULATION_SECONDS_TOTAL = metrics.counter(
+    "speculation_seconds_total", "Tool time overlapped with the controller (saved) or thrown away (wasted)."
+)
+
+
+# --- spans ---
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_unix_ns: int
+    start_ns: int
+    attributes: Dict[str, Any] = field(default_factory=dict)
+    duration_ns: int = 0
+    error: Optional[str] = None
+
+    def set(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    def to_otel(self) -> Dict[str, Any]:
+        """One span in OTLP/JSON shape (resourceSpans[].scopeSpans[].spans[] element)."""
+
+        def value(v: Any) -> Dict[str, Any]:
+            if isinstance(v, bool):
+                return {"boolValue": v}
+            if isinstance(v, int):
+                return {"intValue": str(v)}
+            if isinstance(v, float):
+                return {"doubleValue": v}
+            return {"stringValue": str(v)}
+
+        out = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(self.start_unix_ns),
+            "endTimeUnixNano": str(self.start_unix_ns + self.duration_ns),
+            "attributes": [{"key": k, "value": value(v)} for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_id:
+            out["parentSpanId"] = self.parent_id
+        return out
+
+
+class SpanFileExporter:
+    """Appends finished spans as OTLP/JSON lines from a background thread."""
+
+    def __init__(self, path: str, queue_size: int = 10000):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.dropped = 0
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._loop, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, span: Span) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _loop(self) -> None:
+        with self.path.open("a", encoding="utf-8") as f:
+            while True:
+                batch = [self._queue.get()]
+                while len(batch) < 512:
+                    try:
+                        batch.append(self._queue.get_nowait())
+                    except queue.Empty:
+                        break
+                spans = [s.to_otel() for s in batch]
+                record = {"resourceSpans": [{
+                    "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "fastapi-agent-sdk-mini"}}]},
+                    "scopeSpans": [{"scope": {"name": "utils.metrics"}, "spans": spans}],
+                }]}
+                f.write(json.dumps(record) + "\n")
+                f.flush()
+
+
+_current_span: "contextvars.ContextVar[Optional[Span]]" = contextvars.ContextVar("current_span", default=None)
+_exporter: Optional[SpanFileExporter] = SpanFileExporter(settings.otel_span_file) if settings.otel_span_file else None
+
+
+@contextmanager
+def span(name: str, histogram: Optional[Histogram] = PHASE_SECONDS, **attributes: Any) -> Iterator[Span]:
+    """Time a block with ``perf_counter_ns``.
+
+    The duration is observed into ``histogram`` (labelled ``phase=name`` for
+    the default phase histogram) and, when ``OTEL_SPAN_FILE`` is set, the
+    span is exported with its parent taken from the enclosing span.
+    """
+    parent = _current_span.get()
+    exporting = _exporter is not None
+    s = Span(
+        name=name,
+        # ids only matter for export; skip generating them otherwise
+        trace_id=(parent.trace_id if parent else f"{random.getrandbits(128):032x}") if exporting else "",
+        span_id=f"{random.getrandbits(64):016x}" if exporting else "",
+        parent_id=parent.span_id if parent else None,
+        start_unix_ns=time.time_ns(),
+        start_ns=time.perf_counter_ns(),
+        attributes=dict(attributes),
+    )
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = type(e).__name__
+        raise
+    finally:
+        s.duration_ns = time.perf_counter_ns() - s.start_ns
+        try:
+            _current_span.reset(token)
+        except ValueError:
+            # Exited from another context (e.g. an async generator resumed by a different task).
+            _current_span.set(parent)
+        if settings.metrics_enabled and histogram is not None:
+            if histogram is PHASE_SECONDS:
+                histogram.observe(s.duration_ns / 1e9, phase=name)
+            else:
+                histogram.observe(s.duration_ns / 1e9, **attributes)
+        if _exporter is not None:
+            _exporter.export(s)
+
+
+def elapsed_ms(start_ns: int) -> int:
+    """Milliseconds since a ``perf_counter_ns()`` reading."""
+    return (time.perf_counter_ns() - start_ns) // 1_000_000
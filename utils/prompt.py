@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import re
+from typing import Any, Dict, List, Tuple
+
+from schemas.tools import ToolSpec
+
+# Words, numbers and single punctuation marks; long words count as several tokens.
+_TOKEN_RE = re.compile(r"\w+|[^\w\s]")
+
+
+def _token_costs(text: str) -> List[Tuple[int, int, int]]:
+    """(start, end, estimated tokens) per word or punctuation mark."""
+    return [(m.start(), m.end(), (m.end() - m.start() + 3) // 4) for m in _TOKEN_RE.finditer(text)]
+
+
+def count_tokens(text: str) -> int:
+    """Local estimate of the BPE token count of ``text``.
+
+    One token per punctuation mark and per four characters of a word; this
+    slightly overestimates cl100k-style tokenizers on English, which is the
+    safe side for budgeting, and needs no model files.
+    """
+    return sum((m.end() - m.start() + 3) // 4 for m in _TOKEN_RE.finditer(text))
+
+
+def truncate_tokens(text: str, budget: int) -> Tuple[str, bool]:
+    """Shorten ``text`` to about ``budget`` tokens, keeping the head and the tail.
+
+    Returns ``(text, truncated)``. The cut is marked in the text so the model
+    knows something was left out.
+    """
+    costs = _token_costs(text)
+    total = sum(c for _, _, c in costs)
+    if total <= budget:
+        return text, False
+    budget = max(0, budget - 8)  # room for the omission marker
+    head_budget = budget * 2 // 3
+    tail_budget = budget - head_budget
+
+    head_end, used = 0, 0
+    for _, end, c in costs:
+        if used + c > head_budget:
+            break
+        used += c
+        head_end = end
+    tail_start, tail_used = len(text), 0
+    for start, _, c in reversed(costs):
+        if tail_used + c > tail_budget or start < head_end:
+            break
+        tail_used += c
+        tail_start = start
+
+    omitted = total - used - tail_used
+    return f"{text[:head_end]} […{omitted} tokens omitted…] {text[tail_start:]}", True
+
+
+def window_history(
+    history: List[Dict[str, str]], budget: int, min_tail_tokens: int = 32
+) -> Tuple[List[Dict[str, str]], int]:
+    """The most recent messages that fit in ``budget`` tokens (oldest first) and their token estimate.
+
+    Walks back from the newest message, so the cost does not grow with the
+    conversation; the oldest message kept may be truncated to fill the rest.
+    """
+    kept: List[Dict[str, str]] = []
+    used = 0
+    for m in reversed(history):
+        cost = count_tokens(m["content"]) + 4  # role and message framing
+        if used + cost > budget:
+            room = budget - used - 4
+            if room >= min_tail_tokens:
+                kept.append({**m, "content": truncate_tokens(m["content"], room)[0]})
+                used += count_tokens(kept[-1]["content"]) + 4
+            break
+        kept.append(m)
+        used += cost
+    return kept[::-1], used
+
+
+def _arg_signature(name: str, prop: Dict[str, Any], required: bool) -> str:
+    types = [p.get("type", "any") for p in prop["anyOf"]] if "anyOf" in prop else [prop.get("type", "any")]
+    sig = f"{name}{'' if required else '?'}: {'|'.join(types)}"
+    if "minimum" in prop and "maximum" in prop:
+        sig += f" {prop['minimum']}-{prop['maximum']}"
+    if "default" in prop:
+        sig += f" = {prop['default']!r}"
+    return sig
+
+
+def compact_spec(spec: ToolSpec) -> str:
+    """One prompt line per tool: ``name(arg: type, opt?: type = default): description``.
+
+    Drops what the controller does not need to pick a tool and fill its
+    arguments (output schema, titles, cache and execution policy).
+    """
+    schema = spec.input_schema
+    props = schema.get("properties", {})
+    required = set(schema.get("required", []))
+    args = ", ".join(_arg_signature(n, p, n in required) for n, p in props.items())
+    notes = "; ".join(f"{n}: {p['description']}" for n, p in props.items() if p.get("description"))
+    line = f"- {spec.name}({args}): {spec.description}"
+    return f"{line} ({notes})" if notes else line
@@ -1,25 +1,140 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
-from typing import Any, Dict, List
+import asyncio
+import inspect
+import multiprocessing
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
 from schemas.tools import ToolPermission, ToolResult, ToolSpec
+from utils.cache import SQLiteCache, TieredCache, TTLCache, stable_hash
+from utils.config import settings
+from utils.metrics import TOOL_CALLS_TOTAL, TOOL_SECONDS, span
+from utils.prompt import compact_spec, count_tokens
+from utils.structured import compile_validator
 
 
 @dataclass
 class Tool:
+    """A tool implementation.
+
+    ``run`` may be a plain function or ``async def``. Sync tools are
+    dispatched according to ``spec.execution``: ``inline`` on the event
+    loop, ``thread`` on the registry's thread pool, or ``process`` on its
+    process pool (the tool must be picklable).
+    """
+
     spec: ToolSpec
 
     def run(self, arguments: Dict[str, Any]) -> ToolResult:  # pragma: no cover
         raise NotImplementedError
 
+    def cache_version(self) -> str:
+        """Part of the result-cache key; include any external state the output depends on."""
+        return self.spec.version
+
+    def warmup(self) -> None:
+        """Build expensive state ahead of the first call, outside the tool timeout."""
+
+
+@dataclass
+class ToolCacheStats:
+    hits: int = 0
+    misses: int = 0
+    invalidations: int = 0
+    # Misses that waited for an identical call already in flight instead of running again.
+    coalesced: int = 0
+
+
+def _run_in_process(tool: Tool, arguments: Dict[str, Any]) -> ToolResult:
+    return tool.run(arguments)
+
+
+def _warm(tools: List[Tool]) -> int:
+    return len(tools)
+
+
+def _count(name: str, result: ToolResult) -> None:
+    outcome = "cached" if result.cached else ("ok" if result.ok else "error")
+    TOOL_CALLS_TOTAL.inc(tool=name, outcome=outcome)
+
 
 class ToolRegistry:
-    def __init__(self):
+    def __init__(
+        self,
+        thread_workers: Optional[int] = None,
+        process_workers: Optional[int] = None,
+        default_timeout_s: Optional[float] = None,
+    ):
         self._tools: Dict[str, Tool] = {}
+        self._version: str | None = None
+        self._prompt_specs: Tuple[str, int] | None = None
+        self._validators: Dict[str, Callable[[Any], List[str]]] = {}
+        self._caches: Dict[str, TieredCache] = {}
+        self._cache_versions: Dict[str, str] = {}
+        self._cache_stats: Dict[str, ToolCacheStats] = {}
+        self._inflight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+        self.thread_workers = thread_workers or settings.tool_thread_workers
+        self.process_workers = process_workers or settings.tool_process_workers
+        self.default_timeout_s = default_timeout_s or settings.tool_timeout_s
+        self._thread_pool: Optional[ThreadPoolExecutor] = None
+        # One single-worker pool per slot, so killing a timed-out call leaves the other workers alone.
+        self._process_pools: List[Optional[ProcessPoolExecutor]] = [None] * self.process_workers
+        self._process_load: Dict[ProcessPoolExecutor, int] = {}
 
     def register(self, tool: Tool) -> None:
         self._tools[tool.spec.name] = tool
+        self._version = None
+        self._prompt_specs = None
+        self._validators.pop(tool.spec.name, None)
+        policy = tool.spec.cache
+        if policy.cacheable:
+            self._caches[tool.spec.name] = self._make_cache(tool.spec.name, policy.max_entries, policy.ttl_s)
+            self._cache_stats[tool.spec.name] = ToolCacheStats()
+        else:
+            self._caches.pop(tool.spec.name, None)
+
+    @staticmethod
+    def _make_cache(name: str, max_entries: int, ttl_s: Optional[float]) -> TieredCache:
+        memory = TTLCache(max_entries=max_entries, ttl_s=ttl_s)
+        if not settings.tool_cache_sqlite_path:
+            return TieredCache(memory)
+        # Keys include the tool's cache_version(), so entries from an old corpus are never read back.
+        disk = SQLiteCache(settings.tool_cache_sqlite_path, max_entries=max_entries * 10, ttl_s=ttl_s, table=f"tool_{name}")
+        return TieredCache(memory, disk, dump=lambda r: r.model_dump(mode="json"), load=ToolResult.model_validate)
+
+    def version(self) -> str:
+        """Hash of all tool specs; changes whenever the tool set changes."""
+        if self._version is None:
+            self._version = stable_hash([s.model_dump() for s in self.list_specs()])
+        return self._version
+
+    def prompt_specs(self) -> Tuple[str, int]:
+        """Compact tool listing for the controller prompt and its token estimate.
+
+        Serialized once per tool-set version instead of dumping every spec's
+        JSON schemas on each step.
+        """
+        if self._prompt_specs is None:
+            text = "\n".join(compact_spec(s) for s in self.list_specs())
+            self._prompt_specs = (text, count_tokens(text))
+        return self._prompt_specs
+
+    def validate_arguments(self, name: str, arguments: Any) -> List[str]:
+        """Errors of ``arguments`` against the tool's ``input_schema`` (empty when valid).
+
+        The schema is compiled on first use and cached per tool until it is
+        registered again.
+        """
+        if name not in self._tools:
+            return [f"unknown tool {name!r}; available: {', '.join(self._tools)}"]
+        validator = self._validators.get(name)
+        if validator is None:
+            validator = self._validators[name] = compile_validator(self._tools[name].spec.input_schema)
+        return validator(arguments)
 
     def list_specs(self) -> List[ToolSpec]:
         return [t.spec for t in self._tools.values()]
@@ -29,8 +144,209 @@ class ToolRegistry:
             raise KeyError(f"Unknown tool: {name}")
         return self._tools[name]
 
+    def _denied(self, tool: Tool) -> Optional[ToolResult]:
+        if tool.spec.permission.allow:
+            return None
+        return ToolResult(tool_name=tool.spec.name, ok=False, error=tool.spec.permission.reason or "Tool not permitted")
+
+    def _cache_lookup(self, tool: Tool, arguments: Dict[str, Any]) -> Tuple[Optional[str], Optional[ToolResult]]:
+        """Returns (cache key, cached result); the key is None for uncached tools."""
+        name = tool.spec.name
+        cache = self._caches.get(name)
+        if cache is None:
+            return None, None
+
+        stats = self._cache_stats[name]
+        version = tool.cache_version()
+        if self._cache_versions.get(name) != version:
+            # e.g. the corpus changed under retrieve_corpus: drop every entry
+            if name in self._cache_versions:
+                stats.invalidations += 1
+            cache.clear()
+            self._cache_versions[name] = version
+        key = stable_hash({"arguments": arguments, "version": version})
+        hit = cache.get(key)
+        if hit is not None:
+            stats.hits += 1
+            return key, hit.model_copy(update={"cached": True})
+        stats.misses += 1
+        return key, None
+
+    def _cache_store(self, tool: Tool, key: Optional[str], result: ToolResult) -> None:
+        if key is not None and result.ok:
+            self._caches[tool.spec.name].set(key, result)
+
     def run(self, name: str, arguments: Dict[str, Any]) -> ToolResult:
+        """Synchronous, inline execution (scripts and sync callers)."""
+        with span("tool", histogram=TOOL_SECONDS, tool=name):
+            result = self._run(name, arguments)
+        _count(name, result)
+        return result
+
+    async def arun(self, name: str, arguments: Dict[str, Any], executor: Optional[Executor] = None) -> ToolResult:
+        """Run a tool without blocking the event loop.
+
+        Async tools are awaited; sync tools go to the executor named by
+        ``spec.execution``. Every call is bounded by ``spec.timeout_s`` (or
+        the registry default): async tools are cancelled on timeout, and the
+        worker process of a timed-out ``process`` call is killed and replaced.
+        ``executor`` replaces the shared thread pool for ``thread`` tools
+        (speculative calls bring their own).
+        """
+        with span("tool", histogram=TOOL_SECONDS, tool=name):
+            result = await self._arun(name, arguments, executor)
+        _count(name, result)
+        return result
+
+    def _run(self, name: str, arguments: Dict[str, Any]) -> ToolResult:
         tool = self.get(name)
-        if not tool.spec.permission.allow:
-            return ToolResult(tool_name=name, ok=False, error=tool.spec.permission.reason or "Tool not permitted")
-        return tool.run(arguments)
+        denied = self._denied(tool)
+        if denied is not None:
+            return denied
+
+        key, hit = self._cache_lookup(tool, arguments)
+        if hit is not None:
+            return hit
+        if inspect.iscoroutinefunction(tool.run):
+            result = asyncio.run(tool.run(arguments))
+        else:
+            result = tool.run(arguments)
+        self._cache_store(tool, key, result)
+        return result
+
+    async def _arun(self, name: str, arguments: Dict[str, Any], executor: Optional[Executor] = None) -> ToolResult:
+        tool = self.get(name)
+        denied = self._denied(tool)
+        if denied is not None:
+            return denied
+
+        key, hit = self._cache_lookup(tool, arguments)
+        if hit is not None:
+            return hit
+        if key is None:
+            return await self._execute(tool, arguments, key, executor)
+
+        # Single flight: concurrent runs (e.g. a batch) asking for the same cacheable call share one execution.
+        inflight = self._inflight.get((name, key))
+        if inflight is not None:
+            self._cache_stats[name].coalesced += 1
+            try:
+                result = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                if not inflight.cancelled():
+                    raise  # this caller was cancelled
+                return await self._execute(tool, arguments, key, executor)  # the first caller was; run it here
+            return result.model_copy(update={"cached": True}) if result.ok else result
+        fut = asyncio.get_running_loop().create_future()
+        self._inflight[(name, key)] = fut
+        try:
+            result = await self._execute(tool, arguments, key, executor)
+        except Exception as e:
+            fut.set_exception(e)
+            fut.exception()  # waiters re-raise it; do not warn when there are none
+            raise
+        except BaseException:
+            fut.cancel()
+            raise
+        else:
+            fut.set_result(result)
+        finally:
+            del self._inflight[(name, key)]
+        return result
+
+    async def _execute(
+        self, tool: Tool, arguments: Dict[str, Any], key: Optional[str], executor: Optional[Executor] = None
+    ) -> ToolResult:
+        name = tool.spec.name
+        timeout = tool.spec.timeout_s or self.default_timeout_s
+        execution = tool.spec.execution
+        try:
+            if inspect.iscoroutinefunction(tool.run):
+                result = await asyncio.wait_for(tool.run(arguments), timeout)
+            elif execution == "thread":
+                fut = asyncio.get_running_loop().run_in_executor(executor or self._threads(), tool.run, arguments)
+                result = await asyncio.wait_for(fut, timeout)
+            elif execution == "process":
+                result = await self._in_process(tool, arguments, timeout)
+            else:
+                result = tool.run(arguments)
+        except asyncio.TimeoutError:
+            return ToolResult(tool_name=name, ok=False, error=f"Tool {name} timed out after {timeout:g}s")
+        except BrokenProcessPool:
+            return ToolResult(tool_name=name, ok=False, error=f"Tool {name} worker process died")
+
+        self._cache_store(tool, key, result)
+        return result
+
+    def _threads(self) -> Executor:
+        if self._thread_pool is None:
+            self._thread_pool = ThreadPoolExecutor(max_workers=self.thread_workers, thread_name_prefix="tool")
+        return self._thread_pool
+
+    def _processes(self) -> ProcessPoolExecutor:
+        """The least busy worker slot (its pool is created, not started, on demand)."""
+        for i, pool in enumerate(self._process_pools):
+            if pool is None:
+                # spawn: forking a process that already runs threads (uvicorn, pools) is unsafe
+                pool = ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn"))
+                self._process_pools[i] = pool
+                self._process_load[pool] = 0
+        return min(self._process_pools, key=self._process_load.__getitem__)
+
+    async def _in_process(self, tool: Tool, arguments: Dict[str, Any], timeout: float) -> ToolResult:
+        for attempt in range(2):
+            pool = self._processes()
+            self._process_load[pool] += 1
+            try:
+                fut = asyncio.get_running_loop().run_in_executor(pool, _run_in_process, tool, arguments)
+                return await asyncio.wait_for(fut, timeout)
+            except asyncio.TimeoutError:
+                self._kill_process_pool(pool)
+                raise
+            except BrokenProcessPool:
+                # Queued behind a call whose worker was killed (or the worker crashed): one retry on a fresh one.
+                self._kill_process_pool(pool)
+                if attempt:
+                    raise
+            finally:
+                if pool in self._process_load:
+                    self._process_load[pool] -= 1
+        raise AssertionError("unreachable")
+
+    def _kill_process_pool(self, pool: ProcessPoolExecutor) -> None:
+        if pool not in self._process_load:
+            return  # already replaced
+        del self._process_load[pool]
+        self._process_pools[self._process_pools.index(pool)] = None
+        # ProcessPoolExecutor cannot cancel a running call; terminate its worker instead.
+        for proc in list((getattr(pool, "_processes", None) or {}).values()):
+            proc.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def warmup(self) -> None:
+        """Warm every tool, and start the process pool ahead of the first call (spawn start-up is slow).
+
+        Shipping each process tool to the workers also imports its module there.
+        """
+        for tool in self._tools.values():
+            tool.warmup()
+        tools = [t for t in self._tools.values() if t.spec.execution == "process"]
+        if tools:
+            self._processes()
+            for f in [pool.submit(_warm, tools) for pool in self._process_pools if pool is not None]:
+                f.result()
+
+    def shutdown(self) -> None:
+        if self._thread_pool is not None:
+            self._thread_pool.shutdown(wait=False, cancel_futures=True)
+            self._thread_pool = None
+        for pool in self._process_pools:
+            if pool is not None:
+                pool.shutdown(wait=True, cancel_futures=True)
+        self._process_pools = [None] * self.process_workers
+        self._process_load.clear()
+
+    def cache_metrics(self) -> Dict[str, Any]:
+        return {
+            name: {"entries": len(self._caches[name]), **asdict(stats)} for name, stats in self._cache_stats.items()
+        }
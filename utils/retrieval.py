@@ -1,11 +1,17 @@
 from __future__ import annotations
 
+import heapq
 import math
 import re
+import threading
 from collections import Counter
 from dataclasses import dataclass
 from pathlib import Path
-from typing import List, Tuple
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from utils.cache import stable_hash
+from utils.config import settings
+from utils.retrieval_index import MappedIndex, build_index
 
 
 WORD_RE = re.compile(r"[A-Za-z0-9_]+")
@@ -15,6 +21,19 @@ def tokenize(text: str) -> List[str]:
     return [t.lower() for t in WORD_RE.findall(text)]
 
 
+def split_passages(text: str, size: int, overlap: int) -> List[Tuple[int, int]]:
+    """Overlapping windows of ``size`` tokens as (start, end) character spans."""
+    spans = [m.span() for m in WORD_RE.finditer(text)]
+    stride = max(1, size - overlap)
+    out: List[Tuple[int, int]] = []
+    for i in range(0, len(spans), stride):
+        window = spans[i : i + size]
+        out.append((window[0][0], window[-1][1]))
+        if i + size >= len(spans):
+            break
+    return out
+
+
 @dataclass
 class Doc:
     doc_id: str
@@ -22,61 +41,412 @@ class Doc:
     text: str
 
 
+@dataclass
+class Passage:
+    doc_index: int
+    start: int
+    end: int
+
+
+@dataclass
+class PassageHit:
+    doc: Doc
+    score: float
+    start: int
+    end: int
+    snippet: str
+    highlights: List[Tuple[int, int]]
+
+
+class PostingsScorer:
+    """Term-at-a-time TF*IDF scoring over any postings source.
+
+    Subclasses provide ``term_idf(term)`` and ``lookup(term)`` returning
+    ``(unit indexes, tf*idf weights)`` or None. A unit is a passage.
+    """
+
+    def query_vector(self, q_terms: List[str]) -> Tuple[Dict[str, float], float]:
+        q_tf = Counter(q_terms)
+        q_vec = {t: c * self.term_idf(t) for t, c in q_tf.items()}
+        norm_q = math.sqrt(sum(w ** 2 for w in q_vec.values())) or 1.0
+        return q_vec, norm_q
+
+    def search(self, q_terms: List[str], k: int) -> List[Tuple[int, float]]:
+        """Returns up to k (unit index, score) with score > 0."""
+        q_vec, norm_q = self.query_vector(q_terms)
+
+        dots: Dict[int, float] = {}
+        sq: Dict[int, float] = {}
+        for t, qw in q_vec.items():
+            plist = self.lookup(t)
+            if plist is None:
+                continue
+            for i, w in zip(*plist):
+                dots[i] = dots.get(i, 0.0) + qw * w
+                sq[i] = sq.get(i, 0.0) + w ** 2
+
+        scored = ((i, dot / (norm_q * (math.sqrt(sq[i]) or 1.0))) for i, dot in dots.items())
+        # Ties break on unit order, same as a stable sort over the corpus.
+        top = heapq.nsmallest(k, scored, key=lambda x: (-x[1], x[0]))
+        return [(i, s) for i, s in top if s > 0]
+
+    def search_batch(self, queries: List[List[str]], k: int) -> List[List[Tuple[int, float]]]:
+        return [self.search(q, k) for q in queries]
+
+
+class InvertedIndex(PostingsScorer):
+    """In-memory postings-list index: term -> (unit indexes, tf*idf weights).
+
+    Built once at load time so a query only touches the postings of its own
+    terms. IDF is precomputed per term.
+    """
+
+    def __init__(self, doc_tfs: List[Counter[str]]):
+        self.n_units = len(doc_tfs)
+        df: Counter[str] = Counter()
+        for tf in doc_tfs:
+            df.update(tf.keys())
+
+        N = self.n_units
+        self.idf: Dict[str, float] = {t: math.log((N + 1) / (d + 1)) + 1.0 for t, d in df.items()}
+        self._missing_idf = math.log(N + 1) + 1.0
+
+        docs: Dict[str, List[int]] = {t: [] for t in df}
+        weights: Dict[str, List[float]] = {t: [] for t in df}
+        for i, tf in enumerate(doc_tfs):
+            for t, c in tf.items():
+                docs[t].append(i)
+                weights[t].append(c * self.idf[t])
+        self.postings: Dict[str, Tuple[List[int], List[float]]] = {t: (docs[t], weights[t]) for t in df}
+
+    def term_idf(self, term: str) -> float:
+        return self.idf.get(term, self._missing_idf)
+
+    def lookup(self, term: str) -> Optional[Tuple[List[int], List[float]]]:
+        return self.postings.get(term)
+
+    def terms(self) -> Iterator[str]:
+        return iter(self.postings)
+
+    def iter_postings(self) -> Iterator[Tuple[str, List[int], List[float]]]:
+        for t, (ids, weights) in self.postings.items():
+            yield t, ids, weights
+
+
+class MappedPostings(PostingsScorer, MappedIndex):
+    """Scoring over a memory-mapped on-disk index (see ``utils.retrieval_index``)."""
+
+
+class SparseIndex:
+    """NumPy/SciPy scoring backend over the same postings.
+
+    Stores the weight matrix term-major as CSR (one row per term, i.e. a
+    postings list per row) together with its element-wise square, scores a
+    whole batch of queries with one sparse mat-mat per matrix over just the
+    query-term rows, and picks top-k per query with ``argpartition``.
+
+    Rows are deliberately not L2-normalised: ``PostingsScorer`` normalises
+    each document over the query terms only, and both backends must rank
+    identically.
+    """
+
+    def __init__(self, index: PostingsScorer):
+        import numpy as np
+        from scipy import sparse
+
+        self._np = np
+        self._sparse = sparse
+        self._index = index
+        self.vocab: Dict[str, int] = {}
+
+        indptr = [0]
+        doc_ids: List[int] = []
+        weights: List[float] = []
+        for t, ids, ws in index.iter_postings():
+            self.vocab[t] = len(self.vocab)
+            doc_ids.extend(ids)
+            weights.extend(ws)
+            indptr.append(len(doc_ids))
+        data = np.asarray(weights, dtype=np.float64)
+        shape = (len(self.vocab), index.n_units)
+        self.matrix = sparse.csr_matrix((data, np.asarray(doc_ids, dtype=np.int64), np.asarray(indptr)), shape=shape)
+        self.matrix_sq = sparse.csr_matrix((data ** 2, self.matrix.indices, self.matrix.indptr), shape=shape)
+
+    def search(self, q_terms: List[str], k: int) -> List[Tuple[int, float]]:
+        return self.search_batch([q_terms], k)[0]
+
+    def search_batch(self, queries: List[List[str]], k: int) -> List[List[Tuple[int, float]]]:
+        np, sparse = self._np, self._sparse
+        if not queries:
+            return []
+
+        # Only the rows (postings) of terms that occur in the batch are touched.
+        rows: Dict[int, int] = {}
+        q_rows: List[int] = []
+        q_cols: List[int] = []
+        q_data: List[float] = []
+        norms = np.ones(len(queries), dtype=np.float64)
+        for b, q_terms in enumerate(queries):
+            q_vec, norms[b] = self._index.query_vector(q_terms)
+            for t, w in q_vec.items():
+                j = self.vocab.get(t)
+                if j is not None:
+                    q_rows.append(b)
+                    q_cols.append(rows.setdefault(j, len(rows)))
+                    q_data.append(w)
+
+        terms = np.fromiter(rows.keys(), dtype=np.int64, count=len(rows))
+        shape = (len(queries), len(rows))
+        q = sparse.csr_matrix((np.asarray(q_data, dtype=np.float64), (q_rows, q_cols)), shape=shape)
+        q_mask = sparse.csr_matrix((np.ones(len(q_data), dtype=np.float64), (q_rows, q_cols)), shape=shape)
+
+        dots = q @ self.matrix[terms]
+        doc_sq = q_mask @ self.matrix_sq[terms]
+        scores = sparse.diags(1.0 / norms) @ dots.multiply(doc_sq.power(-0.5))
+        scores = scores.tocsr()
+
+        out: List[List[Tuple[int, float]]] = []
+        for b in range(len(queries)):
+            lo, hi = scores.indptr[b], scores.indptr[b + 1]
+            idx = scores.indices[lo:hi]
+            vals = scores.data[lo:hi]
+            if len(vals) > k:
+                # Keep everything tied with the k-th score so the tie-break below is exact.
+                kth = vals[np.argpartition(vals, len(vals) - k)[len(vals) - k]]
+                keep = vals >= kth
+                idx, vals = idx[keep], vals[keep]
+            # Same tie-break as PostingsScorer: score desc, then unit order.
+            order = np.lexsort((idx, -vals))[:k]
+            out.append([(int(idx[o]), float(vals[o])) for o in order if vals[o] > 0])
+        return out
+
+
+class HybridScorer:
+    """Fuses lexical (TF*IDF cosine) and semantic (embedding cosine) passage scores.
+
+    Each side contributes its own top-k candidates and the fused score is
+    ``alpha * semantic + (1 - alpha) * lexical``, a side that did not
+    return a passage counting 0 for it. Both scores lie in [0, 1], so no
+    rescaling is needed.
+    """
+
+    def __init__(self, lexical: Any, semantic: Any, alpha: float):
+        self.lexical = lexical
+        self.semantic = semantic
+        self.alpha = alpha
+
+    def search_batch(self, queries: List[List[str]], k: int) -> List[List[Tuple[int, float]]]:
+        out: List[List[Tuple[int, float]]] = []
+        for lex, sem in zip(self.lexical.search_batch(queries, k), self.semantic.search_batch(queries, k)):
+            fused = {i: (1.0 - self.alpha) * v for i, v in lex}
+            for i, v in sem:
+                fused[i] = fused.get(i, 0.0) + self.alpha * v
+            top = heapq.nsmallest(k, fused.items(), key=lambda x: (-x[1], x[0]))
+            out.append([(i, v) for i, v in top if v > 0])
+        return out
+
+
+def _make_engine(index: PostingsScorer, backend: str):
+    if backend == "numpy":
+        try:
+            return SparseIndex(index)
+        except ImportError:
+            pass  # optional dependency missing: keep the pure-Python path
+    return index
+
+
 class TinyRetriever:
-    """A tiny offline retriever (TF*IDF-ish) over a local corpus folder."""
+    """A tiny offline retriever (TF*IDF-ish) over a local corpus folder.
 
-    def __init__(self, corpus_dir: str = "data/corpus"):
+    Documents are split into overlapping passages at index time and scored
+    per passage, so a long document does not drown out a short one and hits
+    come back with the matching passage rather than the whole file.
+
+    Besides exact-term ``lexical`` scoring, ``semantic`` mode ranks passages
+    by embedding cosine (``utils.semantic``, needs numpy) so paraphrases
+    match, and ``hybrid`` fuses both. The dense index is built at startup by
+    ``warmup`` when ``RETRIEVAL_MODE`` is not lexical (otherwise by the first
+    non-lexical search) and rebuilt when the corpus changes.
+    """
+
+    MODES = ("lexical", "semantic", "hybrid")
+
+    # How many candidate passages to score per requested hit before
+    # de-duplicating by document; widened automatically when too few docs.
+    _OVERSAMPLE = 4
+
+    def __init__(
+        self,
+        corpus_dir: str = "data/corpus",
+        backend: Optional[str] = None,
+        index_path: Optional[str] = None,
+    ):
         self.corpus_dir = Path(corpus_dir)
+        self.backend = backend or settings.retrieval_backend
+        self.index_path = Path(index_path) if index_path else self.default_index_path(self.corpus_dir)
         self.docs: List[Doc] = []
-        self._doc_tf: List[Counter[str]] = []
-        self._df: Counter[str] = Counter()
+        self.passages: List[Passage] = []
+        self.version = ""  # changes whenever the indexed corpus changes
+        self._index = InvertedIndex([])
+        self._engine = self._index
+        self._dense: Any = None
+        self._dense_version = ""
+        self._dense_lock = threading.Lock()
         self._load()
 
+    @classmethod
+    def from_docs(cls, docs: List[Doc], backend: Optional[str] = None) -> "TinyRetriever":
+        """Build a retriever over in-memory docs (benchmarks, synthetic corpora)."""
+        r = cls.__new__(cls)
+        r.corpus_dir = Path(".")
+        r.backend = backend or settings.retrieval_backend
+        r.index_path = None
+        r._dense, r._dense_version, r._dense_lock = None, "", threading.Lock()
+        r._index_docs(docs)
+        return r
+
+    @staticmethod
+    def default_index_path(corpus_dir: Path) -> Optional[Path]:
+        if not settings.retrieval_persist_index:
+            return None
+        index_dir = Path(settings.retrieval_index_dir) if settings.retrieval_index_dir else corpus_dir.parent / "index"
+        return index_dir / f"{corpus_dir.name}.idx"
+
+    @staticmethod
+    def passage_params() -> Dict[str, int]:
+        return {"size": settings.retrieval_passage_tokens, "overlap": settings.retrieval_passage_overlap}
+
+    @classmethod
+    def split(cls, text: str) -> List[Tuple[int, int]]:
+        p = cls.passage_params()
+        return split_passages(text, p["size"], p["overlap"])
+
     def _load(self) -> None:
-        self.docs.clear()
-        self._doc_tf.clear()
-        self._df.clear()
+        if self.index_path is not None:
+            try:
+                self._open_index()
+                return
+            except OSError:
+                pass  # e.g. read-only checkout: fall back to the in-memory index
 
+        docs: List[Doc] = []
         for p in sorted(self.corpus_dir.glob("*.txt")):
             text = p.read_text(encoding="utf-8")
             title = p.stem.replace("_", " ")
-            doc = Doc(doc_id=p.name, title=title, text=text)
-            tf = Counter(tokenize(text))
-            self.docs.append(doc)
-            self._doc_tf.append(tf)
-            for term in tf.keys():
-                self._df[term] += 1
-
-    def search(self, query: str, k: int = 3) -> List[Tuple[Doc, float]]:
-        q_terms = tokenize(query)
-        if not q_terms or not self.docs:
-            return []
+            docs.append(Doc(doc_id=p.name, title=title, text=text))
+        self._index_docs(docs)
 
-        N = len(self.docs)
-        q_tf = Counter(q_terms)
+    def _open_index(self) -> None:
+        # Cheap when the index is current: only stats the corpus files.
+        build_index(self.corpus_dir, self.index_path, tokenize, self.split, self.passage_params())
+        index = MappedPostings(self.index_path)
+        self.docs = [Doc(doc_id=m["doc_id"], title=m["title"], text=index.text(i)) for i, m in enumerate(index.docs_meta)]
+        self.passages = [
+            Passage(doc_index=d, start=a, end=b) for d, a, b in zip(index.pass_doc, index.pass_start, index.pass_end)
+        ]
+        self._index = index
+        self._engine = _make_engine(index, self.backend)
+        self.backend = "numpy" if isinstance(self._engine, SparseIndex) else "python"
+        self.version = stable_hash({"docs": [(m["path"], m["sha1"]) for m in index.docs_meta], "params": self.passage_params()})
 
-        def idf(term: str) -> float:
-            df = self._df.get(term, 0)
-            return math.log((N + 1) / (df + 1)) + 1.0
+    def refresh(self) -> None:
+        """Pick up corpus changes (only modified files are re-tokenized)."""
+        self._load()
 
-        q_vec = {t: q_tf[t] * idf(t) for t in q_tf}
+    def _index_docs(self, docs: List[Doc]) -> None:
+        self.docs = docs
+        self.passages = [Passage(doc_index=i, start=a, end=b) for i, d in enumerate(docs) for a, b in self.split(d.text)]
+        self._index = InvertedIndex([Counter(tokenize(self.docs[p.doc_index].text[p.start : p.end])) for p in self.passages])
+        self._engine = _make_engine(self._index, self.backend)
+        self.backend = "numpy" if isinstance(self._engine, SparseIndex) else "python"
+        self.version = stable_hash({"docs": [(d.doc_id, d.text) for d in docs], "params": self.passage_params()})
 
-        scored: List[Tuple[int, float]] = []
-        for i, tf in enumerate(self._doc_tf):
-            # dot product
-            dot = 0.0
-            for t, w in q_vec.items():
-                dot += w * (tf.get(t, 0) * idf(t))
-            # norm
-            norm_d = math.sqrt(sum((tf.get(t, 0) * idf(t)) ** 2 for t in q_vec.keys())) or 1.0
-            norm_q = math.sqrt(sum(w ** 2 for w in q_vec.values())) or 1.0
-            score = dot / (norm_q * norm_d)
-            scored.append((i, score))
-
-        scored.sort(key=lambda x: x[1], reverse=True)
-        out: List[Tuple[Doc, float]] = []
-        for i, s in scored[:k]:
-            if s <= 0:
-                continue
-            out.append((self.docs[i], float(s)))
+    def _dense_index(self) -> Any:
+        """The passages' ``DenseIndex`` for the current corpus version, or None without numpy."""
+        if self._dense is None or self._dense_version != self.version:
+            with self._dense_lock:  # tool calls run on a thread pool: build once
+                if self._dense is None or self._dense_version != self.version:
+                    try:
+                        from utils.semantic import DenseIndex
+                    except ImportError:
+                        return None  # optional dependency missing: lexical only
+                    texts = [tokenize(self.docs[p.doc_index].text[p.start : p.end]) for p in self.passages]
+                    self._dense = DenseIndex(texts, dim=settings.retrieval_embed_dim, n_probe=settings.retrieval_ivf_probe)
+                    self._dense_version = self.version
+        return self._dense
+
+    def warmup(self) -> None:
+        """Build the dense index now if the default mode uses it, rather than in the first search."""
+        if settings.retrieval_mode != "lexical" and self.passages:
+            self._dense_index()
+
+    def resolve_mode(self, mode: Optional[str] = None) -> str:
+        """The mode a search will actually use (``lexical`` when numpy is missing)."""
+        mode = mode or settings.retrieval_mode
+        if mode not in self.MODES:
+            raise ValueError(f"unknown retrieval mode {mode!r}; expected one of {', '.join(self.MODES)}")
+        if mode != "lexical" and self.passages and self._dense_index() is None:
+            return "lexical"
+        return mode
+
+    def _engine_for(self, mode: str) -> Any:
+        if mode == "semantic":
+            return self._dense_index()
+        if mode == "hybrid":
+            return HybridScorer(self._engine, self._dense_index(), settings.retrieval_hybrid_alpha)
+        return self._engine
+
+    def search(self, query: str, k: int = 3, mode: Optional[str] = None) -> List[Tuple[Doc, float]]:
+        """Top-k documents, each scored by its best passage."""
+        return [(h.doc, h.score) for h in self.search_passages(query, k=k, mode=mode)]
+
+    def search_batch(self, queries: List[str], k: int = 3, mode: Optional[str] = None) -> List[List[Tuple[Doc, float]]]:
+        """Score many queries in one call (one sparse mat-mat on the numpy backend)."""
+        return [[(h.doc, h.score) for h in hits] for hits in self.search_passages_batch(queries, k=k, mode=mode)]
+
+    def search_passages(self, query: str, k: int = 3, per_doc: int = 1, mode: Optional[str] = None) -> List[PassageHit]:
+        return self.search_passages_batch([query], k=k, per_doc=per_doc, mode=mode)[0]
+
+    def search_passages_batch(
+        self, queries: List[str], k: int = 3, per_doc: int = 1, mode: Optional[str] = None
+    ) -> List[List[PassageHit]]:
+        """Best passages for up to k documents per query (at most ``per_doc`` each)."""
+        out: List[List[PassageHit]] = [[] for _ in queries]
+        if not self.passages:
+            return out
+
+        engine = self._engine_for(self.resolve_mode(mode))
+        q_terms = [tokenize(q) for q in queries]
+        pending = [i for i, terms in enumerate(q_terms) if terms]
+        limit = k * per_doc * self._OVERSAMPLE
+        while pending:
+            retry = []
+            for i, hits in zip(pending, engine.search_batch([q_terms[i] for i in pending], limit)):
+                picked = self._dedupe(hits, k, per_doc)
+                docs = {self.passages[u].doc_index for u, _ in picked}
+                if len(docs) < k and len(hits) == limit and limit < len(self.passages):
+                    retry.append(i)
+                    continue
+                out[i] = [self._hit(u, s, set(q_terms[i])) for u, s in picked]
+            pending = retry
+            limit = len(self.passages)
         return out
+
+    def _dedupe(self, hits: List[Tuple[int, float]], k: int, per_doc: int) -> List[Tuple[int, float]]:
+        per: Dict[int, int] = {}
+        picked: List[Tuple[int, float]] = []
+        for u, s in hits:
+            d = self.passages[u].doc_index
+            if d not in per and len(per) == k:
+                continue
+            if per.get(d, 0) < per_doc:
+                per[d] = per.get(d, 0) + 1
+                picked.append((u, s))
+        return picked
+
+    def _hit(self, unit: int, score: float, q_terms: set) -> PassageHit:
+        p = self.passages[unit]
+        doc = self.docs[p.doc_index]
+        snippet = doc.text[p.start : p.end].replace("\n", " ")
+        highlights = [m.span() for m in WORD_RE.finditer(snippet) if m.group(0).lower() in q_terms]
+        return PassageHit(doc=doc, score=float(score), start=p.start, end=p.end, snippet=snippet, highlights=highlights)
@@ -0,0 +1,348 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import mmap
+import os
+import struct
+from array import array
+from collections import Counter
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+try:  # POSIX only; without it concurrent builders just race on os.replace
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+# On-disk layout (one file, little-endian, sections 8-byte aligned):
+#
+#   MAGIC | u32 version | u64 header_len | header JSON | sections...
+#
+# The JSON header holds the doc table (id, title, path, mtime_ns, size, sha1),
+# the passage-splitting parameters and the byte range of each flat-array
+# section. The scoring unit is a passage (U of them, contiguous per doc):
+#
+#   terms         utf-8 bytes of all terms, sorted
+#   term_off      u64[V+1]  offsets into `terms`
+#   post_off      u64[V+1]  offsets into the postings arrays
+#   post_doc      u32[P]    passage indexes, ascending within a term
+#   post_tf       u32[P]    raw term frequencies (IDF is derived from df at query time)
+#   pass_doc      u32[U]    doc index of each passage
+#   pass_start    u64[U]    passage start (character offset in the doc text)
+#   pass_end      u64[U]    passage end
+#   doc_pass_off  u64[D+1]  first passage of each doc
+#   text          utf-8 bytes of all document texts
+#   text_off      u64[D+1]  offsets into `text`
+MAGIC = b"TRIX"
+FORMAT_VERSION = 2
+_PREAMBLE = struct.Struct("<4sIQ")
+
+
+@dataclass
+class BuildStats:
+    reused: int = 0
+    reindexed: int = 0
+    removed: int = 0
+    written: bool = False
+
+
+def _align(n: int) -> int:
+    return (n + 7) & ~7
+
+
+def _sha1(path: Path) -> str:
+    h = hashlib.sha1()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class MappedIndex:
+    """Read-only postings index backed by a memory-mapped file.
+
+    Every worker that opens the same file shares its pages through the OS
+    page cache; nothing is tokenized or copied into per-process Counters.
+    Implements the same lookup interface as ``utils.retrieval.InvertedIndex``;
+    postings point at passages, not whole documents.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        with self.path.open("rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, header_len = _PREAMBLE.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"Unsupported index file: {self.path}")
+        self.header: Dict[str, Any] = json.loads(self._mm[_PREAMBLE.size : _PREAMBLE.size + header_len])
+        self.docs_meta: List[Dict[str, Any]] = self.header["docs"]
+        self.n_docs = len(self.docs_meta)
+
+        buf = memoryview(self._mm)
+        sec = self.header["sections"]
+
+        def view(name: str, fmt: Optional[str] = None) -> memoryview:
+            off, nbytes = sec[name]
+            mv = buf[off : off + nbytes]
+            return mv.cast(fmt) if fmt else mv
+
+        self._terms = view("terms")
+        self._term_off = view("term_off", "Q")
+        self._post_off = view("post_off", "Q")
+        self._post_doc = view("post_doc", "I")
+        self._post_tf = view("post_tf", "I")
+        self.pass_doc = view("pass_doc", "I")
+        self.pass_start = view("pass_start", "Q")
+        self.pass_end = view("pass_end", "Q")
+        self.doc_pass_off = view("doc_pass_off", "Q")
+        self._text = view("text")
+        self._text_off = view("text_off", "Q")
+        self.n_terms = len(self._term_off) - 1
+        self.n_units = len(self.pass_doc)
+
+    def _term_at(self, j: int) -> bytes:
+        return bytes(self._terms[self._term_off[j] : self._term_off[j + 1]])
+
+    def find(self, term: str) -> int:
+        """Binary search the sorted term dictionary; -1 if absent."""
+        key = term.encode("utf-8")
+        lo, hi = 0, self.n_terms
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._term_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.n_terms and self._term_at(lo) == key else -1
+
+    def _idf_for_df(self, df: int) -> float:
+        N = self.n_units
+        return math.log((N + 1) / (df + 1)) + 1.0
+
+    def term_idf(self, term: str) -> float:
+        j = self.find(term)
+        df = 0 if j < 0 else self._post_off[j + 1] - self._post_off[j]
+        return self._idf_for_df(df)
+
+    def _postings_at(self, j: int) -> Tuple[Sequence[int], List[float]]:
+        lo, hi = self._post_off[j], self._post_off[j + 1]
+        idf = self._idf_for_df(hi - lo)
+        return self._post_doc[lo:hi], [tf * idf for tf in self._post_tf[lo:hi]]
+
+    def lookup(self, term: str) -> Optional[Tuple[Sequence[int], List[float]]]:
+        j = self.find(term)
+        return None if j < 0 else self._postings_at(j)
+
+    def terms(self) -> Iterator[str]:
+        for j in range(self.n_terms):
+            yield self._term_at(j).decode("utf-8")
+
+    def iter_postings(self) -> Iterator[Tuple[str, Sequence[int], List[float]]]:
+        for j, term in enumerate(self.terms()):
+            ids, weights = self._postings_at(j)
+            yield term, ids, weights
+
+    def iter_raw_postings(self) -> Iterator[Tuple[str, Sequence[int], Sequence[int]]]:
+        for j, term in enumerate(self.terms()):
+            lo, hi = self._post_off[j], self._post_off[j + 1]
+            yield term, self._post_doc[lo:hi], self._post_tf[lo:hi]
+
+    def text(self, i: int) -> str:
+        return bytes(self._text[self._text_off[i] : self._text_off[i + 1]]).decode("utf-8")
+
+
+def write_index(
+    path: Path,
+    docs_meta: List[Dict[str, Any]],
+    texts: List[str],
+    passages: List[Tuple[int, int, int]],
+    postings: Dict[str, List[Tuple[int, int]]],
+    params: Dict[str, Any],
+) -> None:
+    """Write an index file atomically (temp file + os.replace).
+
+    ``passages`` holds (doc index, start, end) ordered by doc; ``postings``
+    maps term -> [(passage index, tf)].
+    """
+    terms = sorted(postings)
+    term_bytes = bytearray()
+    term_off = array("Q", [0])
+    post_off = array("Q", [0])
+    post_doc = array("I")
+    post_tf = array("I")
+    for t in terms:
+        term_bytes += t.encode("utf-8")
+        term_off.append(len(term_bytes))
+        for d, tf in postings[t]:
+            post_doc.append(d)
+            post_tf.append(tf)
+        post_off.append(len(post_doc))
+
+    pass_doc = array("I", [d for d, _, _ in passages])
+    pass_start = array("Q", [a for _, a, _ in passages])
+    pass_end = array("Q", [b for _, _, b in passages])
+    doc_pass_off = array("Q", [0] * (len(docs_meta) + 1))
+    for d, _, _ in passages:
+        doc_pass_off[d + 1] += 1
+    for d in range(len(docs_meta)):
+        doc_pass_off[d + 1] += doc_pass_off[d]
+
+    text_bytes = bytearray()
+    text_off = array("Q", [0])
+    for text in texts:
+        text_bytes += text.encode("utf-8")
+        text_off.append(len(text_bytes))
+
+    blobs = [
+        ("terms", bytes(term_bytes)),
+        ("term_off", term_off.tobytes()),
+        ("post_off", post_off.tobytes()),
+        ("post_doc", post_doc.tobytes()),
+        ("post_tf", post_tf.tobytes()),
+        ("pass_doc", pass_doc.tobytes()),
+        ("pass_start", pass_start.tobytes()),
+        ("pass_end", pass_end.tobytes()),
+        ("doc_pass_off", doc_pass_off.tobytes()),
+        ("text", bytes(text_bytes)),
+        ("text_off", text_off.tobytes()),
+    ]
+
+    # Section offsets depend on the header length, which depends on the
+    # offsets; reserve a fixed-width placeholder and fill it in afterwards.
+    sections = {name: [0, len(b)] for name, b in blobs}
+    header = {"docs": docs_meta, "params": params, "sections": sections}
+    header_len = len(json.dumps(header).encode("utf-8")) + 32 * len(blobs)
+    pos = _align(_PREAMBLE.size + header_len)
+    for name, b in blobs:
+        sections[name][0] = pos
+        pos = _align(pos + len(b))
+    header_bytes = json.dumps(header).encode("utf-8").ljust(header_len)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f"{path.name}.tmp-{os.getpid()}")
+    with tmp.open("wb") as f:
+        f.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, header_len))
+        f.write(header_bytes)
+        for name, b in blobs:
+            f.seek(sections[name][0])
+            f.write(b)
+        f.truncate(pos)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def _open_existing(path: Path) -> Optional[MappedIndex]:
+    try:
+        return MappedIndex(path)
+    except (OSError, ValueError, KeyError, json.JSONDecodeError, struct.error):
+        return None
+
+
+def build_index(corpus_dir: Path, path: Path, tokenize, split, params: Dict[str, Any]) -> BuildStats:
+    """Bring the index at ``path`` up to date with ``corpus_dir/*.txt``.
+
+    ``split(text)`` returns the (start, end) passage spans of a document and
+    ``params`` records how they were produced; a change in ``params`` forces
+    a full rebuild.
+
+    Files whose (mtime, size) match the doc table are reused without being
+    read; a changed mtime with an unchanged SHA-1 is also reused. Only new
+    or modified files are tokenized, and their postings are merged with the
+    postings of the reused documents. The file is only rewritten if
+    something changed.
+    """
+    corpus_dir = Path(corpus_dir)
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with (path.parent / f"{path.name}.lock").open("w") as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        return _build_locked(corpus_dir, path, tokenize, split, params)
+
+
+def _build_locked(corpus_dir: Path, path: Path, tokenize, split, params: Dict[str, Any]) -> BuildStats:
+    stats = BuildStats()
+    old = _open_existing(path)
+    if old is not None and old.header.get("params") != params:
+        old = None
+    old_by_path: Dict[str, int] = {}
+    if old is not None:
+        old_by_path = {m["path"]: i for i, m in enumerate(old.docs_meta)}
+
+    docs_meta: List[Dict[str, Any]] = []
+    texts: List[str] = []
+    passages: List[Tuple[int, int, int]] = []
+    unit_map: Dict[int, int] = {}  # old passage index -> new passage index
+    fresh: List[Tuple[int, Counter[str]]] = []  # (new passage index, term counts)
+
+    paths = sorted(corpus_dir.glob("*.txt"))
+    for p in paths:
+        st = p.stat()
+        rel = p.name
+        meta = {
+            "doc_id": p.name,
+            "title": p.stem.replace("_", " "),
+            "path": rel,
+            "mtime_ns": st.st_mtime_ns,
+            "size": st.st_size,
+            "sha1": None,
+        }
+        new_i = len(docs_meta)
+        old_i = old_by_path.get(rel)
+        if old is not None and old_i is not None:
+            prev = old.docs_meta[old_i]
+            same = prev["mtime_ns"] == st.st_mtime_ns and prev["size"] == st.st_size
+            if not same and prev["size"] == st.st_size:
+                meta["sha1"] = _sha1(p)
+                same = meta["sha1"] == prev["sha1"]
+            if same:
+                meta["sha1"] = prev["sha1"]
+                docs_meta.append(meta)
+                texts.append(old.text(old_i))
+                for u in range(old.doc_pass_off[old_i], old.doc_pass_off[old_i + 1]):
+                    unit_map[u] = len(passages)
+                    passages.append((new_i, old.pass_start[u], old.pass_end[u]))
+                stats.reused += 1
+                continue
+
+        text = p.read_text(encoding="utf-8")
+        meta["sha1"] = meta["sha1"] or _sha1(p)
+        docs_meta.append(meta)
+        texts.append(text)
+        for start, end in split(text):
+            fresh.append((len(passages), Counter(tokenize(text[start:end]))))
+            passages.append((new_i, start, end))
+        stats.reindexed += 1
+
+    if old is not None:
+        stats.removed = len(set(old_by_path) - {p.name for p in paths})
+        unchanged = (
+            not stats.reindexed
+            and len(docs_meta) == old.n_docs
+            and [m["mtime_ns"] for m in docs_meta] == [m["mtime_ns"] for m in old.docs_meta]
+        )
+        if unchanged:
+            return stats
+
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    if old is not None and unit_map:
+        for term, ids, tfs in old.iter_raw_postings():
+            kept = [(unit_map[u], tf) for u, tf in zip(ids, tfs) if u in unit_map]
+            if kept:
+                postings[term] = kept
+    touched = set()
+    for unit, counts in fresh:
+        for term, c in counts.items():
+            postings.setdefault(term, []).append((unit, c))
+            touched.add(term)
+    for term in touched:
+        postings[term].sort()
+
+    write_index(path, docs_meta, texts, passages, postings, params)
+    stats.written = True
+    return stats
@@ -0,0 +1,180 @@
+from __future__ import annotations
+
+import random
+import re
+from dataclasses import asdict, dataclass
+from typing import Callable, Dict, Optional, Sequence, Set, Tuple
+
+from schemas.tools import ToolCall, ToolChoice
+from utils.config import settings
+from utils.metrics import ROUTER_AGREEMENT_TOTAL, ROUTER_DECISIONS_TOTAL
+
+# One alternation, one pass: each match reports which rule fired via ``lastgroup``.
+_RULES = {
+    "calc_kw": r"\b(?:calculate|calc|compute|evaluate)\b",
+    "arith": r"\d\s*(?:\*\*|[-+*/%])\s*[\d(.]|\(\s*\d",
+    # "2^3": the calculator rejects ^ (XOR in Python, often meant as a power)
+    "caret": r"\d\s*\^\s*[\d(.]",
+    "summarize_kw": r"\bsummari[sz]e\b|\bsummary\b|\btl;?dr\b",
+    "retrieve_kw": r"\b(?:what is|what are|explain|describe|how does|ollama|fastapi|agent sdk)\b",
+    "chain": r"\b(?:then|after that|afterwards|compare|and also|step by step)\b",
+}
+_SCANNER = re.compile("|".join(f"(?P<{name}>{pattern})" for name, pattern in _RULES.items()))
+
+_LEAD_RE = re.compile(r"^\s*(?:please\s+)?(?:calculate|calc|compute|evaluate|what is)\s*:?\s*", re.I)
+_PURE_ARITH_RE = re.compile(r"^[\d\s.+\-*/%()]+$")
+_SUMMARIZE_RE = re.compile(r"^\s*(?:please\s+)?summari[sz]e\b[^:]*:\s*(?P<text>\S.*)$", re.I | re.S)
+
+# How safely the raw observation of a tool can stand in for the final answer.
+# Deterministic tools produce the answer itself; retrieval snippets usually need synthesis.
+_FINALIZE_CONFIDENCE = {"calculator": 0.95, "summarize_text": 0.95, "retrieve_corpus": 0.7}
+
+
+@dataclass(frozen=True)
+class Route:
+    choice: ToolChoice
+    confidence: float
+    rule: str
+
+
+@dataclass
+class RouterRuleStats:
+    bypassed: int = 0  # confident: the LLM was not called
+    deferred: int = 0  # below the threshold: the LLM decided
+    shadowed: int = 0  # confident, but sampled for an LLM comparison
+    compared: int = 0
+    agreed: int = 0
+
+
+def _scan(text: str) -> Set[str]:
+    return {m.lastgroup for m in _SCANNER.finditer(text.lower())}
+
+
+def _route_clause(clause: str) -> Optional[Tuple[ToolCall, float, str]]:
+    """(call, confidence, rule) for one clause of the user message, or None."""
+    hits = _scan(clause)
+    kinds = {k for k in ("calc_kw", "arith", "summarize_kw", "retrieve_kw") if k in hits}
+    if not kinds or "caret" in hits:
+        return None  # nothing recognised, or arithmetic no tool can evaluate as written: the LLM decides
+
+    remainder = _LEAD_RE.sub("", clause).strip().rstrip("?").strip()
+    if "arith" in hits and _PURE_ARITH_RE.match(remainder):
+        return ToolCall(tool_name="calculator", arguments={"expression": remainder}), 0.97, "calculator.expression"
+
+    m = _SUMMARIZE_RE.match(clause)
+    if m is not None:
+        args = {"text": m.group("text").strip(), "max_sentences": 3}
+        return ToolCall(tool_name="summarize_text", arguments=args), 0.95, "summarize.explicit"
+
+    if kinds == {"retrieve_kw"}:
+        return ToolCall(tool_name="retrieve_corpus", arguments={"query": clause.strip(), "k": 3}), 0.9, "retrieve.keyword"
+    if "summarize_kw" in kinds:
+        return ToolCall(tool_name="summarize_text", arguments={"text": clause, "max_sentences": 3}), 0.5, "summarize.keyword"
+    if "calc_kw" in kinds:
+        # "calculate the area of a circle of radius 3": the calculator alone cannot do it
+        return ToolCall(tool_name="calculator", arguments={"expression": remainder or clause}), 0.5, "calculator.keyword"
+    return None
+
+
+def route(user_message: str, observation: str = "", prev_tools: Sequence[str] = ()) -> Optional[Route]:
+    """The rule table's controller decision and how sure it is, or None when no rule applies."""
+    chained = "chain" in _scan(user_message)
+    if observation:
+        if not prev_tools or " error: " in observation:
+            return None  # a failed tool call: let the LLM decide how to recover
+        confidence = min(_FINALIZE_CONFIDENCE.get(t, 0.5) for t in prev_tools)
+        if chained:
+            confidence *= 0.6  # "... then ...": more steps may be needed
+        return Route(ToolChoice(action="final", final=observation), confidence, "finalize")
+
+    clauses = [c for c in user_message.split(";") if c.strip()]
+    routed = [_route_clause(c) for c in clauses]
+    if not routed or any(r is None for r in routed):
+        return None
+    confidence = min(r[1] for r in routed)
+    if chained:
+        confidence *= 0.6
+    if len(routed) == 1:
+        call, _, rule = routed[0]
+        return Route(ToolChoice(action="tool", tool_call=call), confidence, rule)
+    return Route(ToolChoice(action="tool", tool_calls=[r[0] for r in routed]), confidence * 0.95, "multi")
+
+
+def agrees(a: ToolChoice, b: ToolChoice) -> bool:
+    """Same action and, for tool steps, the same tools (arguments may be phrased differently)."""
+    if a.action != b.action:
+        return False
+    return sorted(c.tool_name for c in a.calls()) == sorted(c.tool_name for c in b.calls())
+
+
+class RuleRouter:
+    """Rule tier in front of the LLM controller.
+
+    Routes at or above ``threshold`` confidence skip the LLM, except for a
+    ``shadow_rate`` sample that still asks it (and uses its answer) so the
+    agreement of confident rules keeps being measured. Below the threshold
+    the LLM decides and is compared with the rule's guess for free.
+    """
+
+    def __init__(
+        self,
+        enabled: bool = True,
+        threshold: float = 0.85,
+        shadow_rate: float = 0.0,
+        sample: Callable[[], float] = random.random,
+    ):
+        self.enabled = enabled
+        self.threshold = threshold
+        self.shadow_rate = shadow_rate
+        self._sample = sample
+        self.stats: Dict[str, RouterRuleStats] = {}
+
+    def route(self, user_message: str, observation: str = "", prev_tools: Sequence[str] = ()) -> Optional[Route]:
+        return self.predict(user_message, observation, prev_tools) if self.enabled else None
+
+    @staticmethod
+    def predict(user_message: str, observation: str = "", prev_tools: Sequence[str] = ()) -> Optional[Route]:
+        """The rule table's guess even when the tier is disabled (e.g. for speculative tool calls)."""
+        return route(user_message, observation, prev_tools)
+
+    def bypass(self, r: Route) -> bool:
+        """Decide whether to skip the LLM for this route, and count the outcome."""
+        stats = self.stats.setdefault(r.rule, RouterRuleStats())
+        if r.confidence < self.threshold:
+            stats.deferred += 1
+            outcome = "deferred"
+        elif self.shadow_rate and self._sample() < self.shadow_rate:
+            stats.shadowed += 1
+            outcome = "shadowed"
+        else:
+            stats.bypassed += 1
+            outcome = "bypassed"
+        ROUTER_DECISIONS_TOTAL.inc(rule=r.rule, outcome=outcome)
+        return outcome == "bypassed"
+
+    def compare(self, r: Route, llm_choice: ToolChoice) -> bool:
+        stats = self.stats.setdefault(r.rule, RouterRuleStats())
+        agreed = agrees(r.choice, llm_choice)
+        stats.compared += 1
+        stats.agreed += agreed
+        ROUTER_AGREEMENT_TOTAL.inc(rule=r.rule, agree=str(agreed).lower())
+        return agreed
+
+    def metrics(self) -> Dict[str, object]:
+        routed = sum(s.bypassed + s.deferred + s.shadowed for s in self.stats.values())
+        bypassed = sum(s.bypassed for s in self.stats.values())
+        compared = sum(s.compared for s in self.stats.values())
+        agreed = sum(s.agreed for s in self.stats.values())
+        return {
+            "enabled": self.enabled,
+            "threshold": self.threshold,
+            "shadow_rate": self.shadow_rate,
+            "bypass_rate": bypassed / routed if routed else None,
+            "agreement": agreed / compared if compared else None,
+            "rules": {name: asdict(s) for name, s in sorted(self.stats.items())},
+        }
+
+
+rule_router = RuleRouter(
+    enabled=settings.router_enabled, threshold=settings.router_threshold, shadow_rate=settings.router_shadow_rate
+)
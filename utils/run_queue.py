@@ -0,0 +1,434 @@
+from __future__ import annotations
+
+import asyncio
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Any, AsyncIterator, Callable, Deque, Dict, List, Optional
+
+from schemas.agent import AgentRunRequest
+
+LANES = ("high", "normal", "low")
+TERMINAL = ("done", "failed", "cancelled")
+# final status -> RunQueueStats counter
+_COUNTERS = {"done": "completed", "failed": "failed", "cancelled": "cancelled"}
+
+# (request, run_id) -> the agent's event stream for that run
+Runner = Callable[[AgentRunRequest, str], AsyncIterator[Dict[str, Any]]]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    run_id TEXT PRIMARY KEY,
+    lane TEXT NOT NULL,
+    status TEXT NOT NULL,
+    owner TEXT,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    cancel INTEGER NOT NULL DEFAULT 0,
+    request TEXT NOT NULL,
+    created_at_ms INTEGER NOT NULL,
+    started_at_ms INTEGER,
+    finished_at_ms INTEGER,
+    final TEXT,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_open ON jobs (status, owner);
+CREATE TABLE IF NOT EXISTS owners (owner TEXT PRIMARY KEY, heartbeat_ms INTEGER NOT NULL);
+"""
+
+
+def _now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+class QueueFull(Exception):
+    """Admission control refused a submission; retry after ``retry_after_s``."""
+
+    def __init__(self, depth: int, retry_after_s: float):
+        super().__init__(f"run queue is full ({depth} queued)")
+        self.depth = depth
+        self.retry_after_s = retry_after_s
+
+
+class _Journal:
+    """SQLite (WAL) record of every submitted run, so queued and running runs survive a restart.
+
+    Each process is an *owner* with a heartbeat; jobs whose owner stopped
+    heartbeating (crash, restart, scale-down) are claimed by whichever
+    process looks next. Commits are not fsynced (``synchronous=NORMAL``):
+    a process crash loses nothing, a power loss may lose the last writes.
+    """
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def add(self, run_id: str, lane: str, owner: str, request: str) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (run_id, lane, status, owner, request, created_at_ms) VALUES (?, ?, 'queued', ?, ?, ?)",
+                (run_id, lane, owner, request, _now_ms()),
+            )
+
+    def update(self, run_id: str, **fields: Any) -> None:
+        cols = ", ".join(f"{k} = ?" for k in fields)
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {cols} WHERE run_id = ?", (*fields.values(), run_id))
+
+    def get(self, run_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM jobs WHERE run_id = ?", (run_id,)).fetchone()
+        return dict(row) if row is not None else None
+
+    def heartbeat(self, owner: str) -> None:
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO owners VALUES (?, ?)", (owner, _now_ms()))
+
+    def claim_orphans(self, owner: str, lease_ms: int) -> List[Dict[str, Any]]:
+        """Take over unfinished jobs of owners that stopped heartbeating, oldest first."""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                self._db.execute("DELETE FROM owners WHERE heartbeat_ms < ? AND owner != ?", (_now_ms() - lease_ms, owner))
+                rows = self._db.execute(
+                    "SELECT * FROM jobs WHERE status IN ('queued', 'running') "
+                    "AND (owner IS NULL OR owner NOT IN (SELECT owner FROM owners)) ORDER BY rowid"
+                ).fetchall()
+                self._db.executemany("UPDATE jobs SET owner = ? WHERE run_id = ?", [(owner, r["run_id"]) for r in rows])
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return [dict(r) for r in rows]
+
+    def cancel_requests(self, owner: str) -> List[str]:
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT run_id FROM jobs WHERE owner = ? AND cancel = 1 AND status IN ('queued', 'running')", (owner,)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def release(self, owner: str) -> None:
+        """Clean shutdown: hand unfinished jobs back immediately instead of waiting for the lease to expire.
+
+        An interrupted run does not count as a failed attempt here.
+        """
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET attempts = attempts - (status = 'running'), status = 'queued', owner = NULL "
+                "WHERE owner = ? AND status IN ('queued', 'running')",
+                (owner,),
+            )
+            self._db.execute("DELETE FROM owners WHERE owner = ?", (owner,))
+
+    def prune(self, keep: int) -> None:
+        with self._lock:
+            self._db.execute(
+                "DELETE FROM jobs WHERE rowid IN (SELECT rowid FROM jobs WHERE status IN ('done', 'failed', 'cancelled') "
+                "ORDER BY rowid DESC LIMIT -1 OFFSET ?)",
+                (keep,),
+            )
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+@dataclass(eq=False)
+class _Job:
+    run_id: str
+    lane: str
+    request: AgentRunRequest
+    status: str = "queued"
+    attempts: int = 0
+    created_at_ms: int = field(default_factory=_now_ms)
+    started_at_ms: Optional[int] = None
+    finished_at_ms: Optional[int] = None
+    final: Optional[str] = None
+    error: Optional[str] = None
+    cancel_requested: bool = False
+    task: Optional[asyncio.Task] = None
+    # Replay buffer for subscribers, plus a wake-up for new events.
+    events: List[Dict[str, Any]] = field(default_factory=list)
+    changed: asyncio.Event = field(default_factory=asyncio.Event)
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        if len(self.events) < 1000:
+            self.events.append(event)
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+
+@dataclass
+class RunQueueStats:
+    submitted: int = 0
+    rejected: int = 0
+    started: int = 0
+    completed: int = 0
+    failed: int = 0
+    cancelled: int = 0
+    recovered: int = 0
+
+
+class RunQueue:
+    """Background execution of agent runs: priority lanes, a fixed worker pool, cancellation.
+
+    ``submit`` journals the request and returns at once; ``workers`` asyncio
+    tasks take jobs strictly by lane (``high`` before ``normal`` before
+    ``low``, FIFO within a lane). Admission control rejects submissions
+    beyond ``max_depth`` queued jobs, and ``low`` beyond half of that, so
+    bursts are shed with a ``Retry-After`` estimate instead of piling up.
+    """
+
+    def __init__(
+        self,
+        runner: Runner,
+        path: str,
+        workers: int = 4,
+        max_depth: int = 1000,
+        lease_s: float = 15.0,
+        max_attempts: int = 3,
+        keep_finished: int = 10000,
+    ):
+        self.runner = runner
+        self.workers = workers
+        self.max_depth = max_depth
+        self.lease_s = lease_s
+        self.max_attempts = max_attempts
+        self.keep_finished = keep_finished
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.stats = RunQueueStats()
+        self._journal = _Journal(path)
+        self._lanes: Dict[str, Deque[_Job]] = {lane: deque() for lane in LANES}
+        self._jobs: Dict[str, _Job] = {}  # jobs this process owns, plus recently finished ones
+        self._finished: Deque[str] = deque()
+        self._ready: Optional[asyncio.Semaphore] = None
+        self._tasks: List[asyncio.Task] = []
+        self._avg_run_s = 1.0
+
+    # --- lifecycle ---
+
+    async def start(self) -> None:
+        self._ready = asyncio.Semaphore(0)
+        self._journal.heartbeat(self.owner)
+        self._recover()
+        self._tasks = [asyncio.create_task(self._worker(), name=f"run-worker-{i}") for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._maintain(), name="run-queue-heartbeat"))
+
+    async def stop(self) -> None:
+        for t in self._tasks:
+            t.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._journal.release(self.owner)
+
+    # --- API ---
+
+    def submit(self, req: AgentRunRequest) -> Dict[str, Any]:
+        lane = req.priority
+        depth = self.depth()
+        limit = self.max_depth // 2 if lane == "low" else self.max_depth
+        if self.max_depth and depth >= limit:
+            self.stats.rejected += 1
+            raise QueueFull(depth, max(1.0, depth * self._avg_run_s / max(1, self.workers)))
+        job = _Job(run_id=str(uuid.uuid4()), lane=lane, request=req)
+        self._journal.add(job.run_id, lane, self.owner, req.model_dump_json())
+        self._enqueue(job)
+        self.stats.submitted += 1
+        return self._describe(job)
+
+    def status(self, run_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(run_id)
+        if job is not None:
+            return self._describe(job)
+        row = self._journal.get(run_id)  # another worker's job, or from before a restart
+        if row is None:
+            return None
+        fields = ("run_id", "status", "attempts", "created_at_ms", "started_at_ms", "finished_at_ms", "final", "error")
+        return {**{k: row[k] for k in fields}, "priority": row["lane"], "position": None}
+
+    async def cancel(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued or running run; finished runs are returned unchanged."""
+        job = self._jobs.get(run_id)
+        if job is None:
+            row = self._journal.get(run_id)
+            if row is None:
+                return None
+            if row["status"] not in TERMINAL:
+                # Owned by another process: its heartbeat loop picks the flag up.
+                self._journal.update(run_id, cancel=1)
+                return {**self.status(run_id), "status": "cancelling"}
+            return self.status(run_id)
+        if job.status == "queued":
+            self._lanes[job.lane].remove(job)
+            self._finish(job, "cancelled", error="cancelled")
+        elif job.status == "running" and job.task is not None:
+            job.cancel_requested = True
+            job.task.cancel()
+            await asyncio.wait({job.task}, timeout=5)
+        return self._describe(job)
+
+    async def events(self, run_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Events of a run as they happen (earlier ones replayed first), ending with ``final``.
+
+        Runs owned by another worker are followed by polling the journal and
+        yield only their final status.
+        """
+        job = self._jobs.get(run_id)
+        if job is None:
+            while True:
+                st = self.status(run_id)
+                if st is None or st["status"] in TERMINAL:
+                    if st is not None:
+                        yield {"type": "final", "run_id": run_id, "status": st["status"], "final": st["final"], "error": st["error"]}
+                    return
+                await asyncio.sleep(0.5)
+        sent = 0
+        while True:
+            changed = job.changed
+            while sent < len(job.events):
+                yield job.events[sent]
+                sent += 1
+            if job.status in TERMINAL and sent >= len(job.events):
+                return
+            await changed.wait()
+
+    def depth(self) -> int:
+        return sum(len(q) for q in self._lanes.values())
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "workers": self.workers,
+            "max_depth": self.max_depth,
+            "queued": {lane: len(q) for lane, q in self._lanes.items()},
+            "running": sum(1 for j in self._jobs.values() if j.status == "running"),
+            "avg_run_s": round(self._avg_run_s, 3),
+            **asdict(self.stats),
+        }
+
+    # --- internals ---
+
+    def _describe(self, job: _Job) -> Dict[str, Any]:
+        position = None
+        if job.status == "queued":
+            ahead = 0
+            for lane in LANES:
+                if lane == job.lane:
+                    position = ahead + self._lanes[lane].index(job)
+                    break
+                ahead += len(self._lanes[lane])
+        return {
+            "run_id": job.run_id,
+            "status": job.status,
+            "priority": job.lane,
+            "position": position,
+            "attempts": job.attempts,
+            "created_at_ms": job.created_at_ms,
+            "started_at_ms": job.started_at_ms,
+            "finished_at_ms": job.finished_at_ms,
+            "final": job.final,
+            "error": job.error,
+        }
+
+    def _enqueue(self, job: _Job) -> None:
+        self._jobs[job.run_id] = job
+        self._lanes[job.lane].append(job)
+        if self._ready is not None:
+            self._ready.release()
+
+    def _recover(self) -> None:
+        for row in self._journal.claim_orphans(self.owner, int(self.lease_s * 1000)):
+            if row["run_id"] in self._jobs:
+                continue
+            job = _Job(
+                run_id=row["run_id"],
+                lane=row["lane"],
+                request=AgentRunRequest.model_validate_json(row["request"]),
+                attempts=row["attempts"],
+                created_at_ms=row["created_at_ms"],
+            )
+            if row["cancel"]:
+                self._jobs[job.run_id] = job
+                self._finish(job, "cancelled", error="cancelled")
+            elif job.attempts >= self.max_attempts:
+                # Interrupted mid-run every time: do not let one request crash-loop the pool.
+                self._jobs[job.run_id] = job
+                self._finish(job, "failed", error=f"interrupted {job.attempts} times")
+            else:
+                self._journal.update(job.run_id, status="queued")
+                self._enqueue(job)
+                self.stats.recovered += 1
+
+    async def _next(self) -> _Job:
+        while True:
+            await self._ready.acquire()
+            for lane in LANES:
+                if self._lanes[lane]:
+                    return self._lanes[lane].popleft()
+            # the job this permit was for was cancelled while queued
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._next()
+            job.status, job.started_at_ms = "running", _now_ms()
+            job.attempts += 1
+            self._journal.update(job.run_id, status="running", attempts=job.attempts, started_at_ms=job.started_at_ms)
+            self.stats.started += 1
+            job.task = asyncio.create_task(self._consume(job))
+            try:
+                await job.task
+            except asyncio.CancelledError:
+                if not job.cancel_requested:
+                    raise  # shutting down: the journal keeps the job for the next start
+                self._finish(job, "cancelled", error="cancelled")
+            except Exception as e:
+                self._finish(job, "failed", error=str(e))
+            else:
+                self._finish(job, "failed" if job.error else "done", error=job.error)
+                run_s = (job.finished_at_ms - job.started_at_ms) / 1000
+                self._avg_run_s = 0.9 * self._avg_run_s + 0.1 * run_s
+
+    async def _consume(self, job: _Job) -> None:
+        async for event in self.runner(job.request, job.run_id):
+            if event["type"] == "final":
+                job.final, job.error = event["final"], event.get("error")
+                continue  # published by _finish with the final status
+            job.publish(event)
+
+    def _finish(self, job: _Job, status: str, error: Optional[str] = None) -> None:
+        job.status, job.error, job.finished_at_ms = status, error, _now_ms()
+        self._journal.update(job.run_id, status=status, final=job.final, error=error, finished_at_ms=job.finished_at_ms)
+        counter = _COUNTERS[status]
+        setattr(self.stats, counter, getattr(self.stats, counter) + 1)
+        job.publish({"type": "final", "run_id": job.run_id, "status": status, "final": job.final, "error": error})
+        # Keep a bounded tail of finished jobs in memory for subscribers; the journal has the rest.
+        self._finished.append(job.run_id)
+        while len(self._finished) > 1000:
+            self._jobs.pop(self._finished.popleft(), None)
+
+    async def _maintain(self) -> None:
+        """Heartbeat the lease, pick up orphaned jobs and cross-worker cancellations, prune old rows."""
+        interval = max(0.5, self.lease_s / 3)
+        ticks = 0
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self._journal.heartbeat(self.owner)
+                self._recover()
+                for run_id in self._journal.cancel_requests(self.owner):
+                    await self.cancel(run_id)
+                ticks += 1
+                if ticks % 100 == 0:
+                    self._journal.prune(self.keep_finished)
+            except sqlite3.Error:
+                continue  # e.g. a busy database; try again next tick
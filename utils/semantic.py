@@ -0,0 +1,221 @@
+from __future__ import annotations
+
+import math
+import zlib
+from functools import lru_cache
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+# Per-feature weights before IDF: whole words count most, word pairs add some
+# phrase signal, and character n-grams let "retrieval" meet "retrieving".
+_WORD_WEIGHT = 1.0
+_BIGRAM_WEIGHT = 0.5
+_CHAR_WEIGHT = 0.5
+_CHAR_NGRAMS = (3,)
+# Odd multiplier that mixes the first word's bucket before it is xor-ed with the second's.
+_BIGRAM_MIX = 0x9E3779B1
+
+
+def _bucket(feature: str, n_buckets: int) -> int:
+    return zlib.crc32(feature.encode("utf-8")) & (n_buckets - 1)
+
+
+class HashingEncoder:
+    """Deterministic dense text encoder: no model files, no network, no GPU.
+
+    Words, word bigrams and character trigrams are feature-hashed into
+    ``n_buckets`` (a power of two), weighted by a bucket IDF fitted on the
+    corpus, and reduced to ``dim`` dimensions by a very sparse random
+    projection (``taps`` signed entries per bucket, fixed by ``seed``).
+    Vectors are L2-normalised float32, so a dot product is the cosine.
+    """
+
+    def __init__(self, dim: int = 256, n_buckets: int = 1 << 18, taps: int = 8, seed: int = 0):
+        if n_buckets & (n_buckets - 1):
+            raise ValueError("n_buckets must be a power of two")
+        self.dim = dim
+        self.n_buckets = n_buckets
+        rng = np.random.default_rng(seed)
+        self._proj = rng.integers(0, dim, size=(n_buckets, taps), dtype=np.int32)
+        self._sign = (rng.integers(0, 2, size=(n_buckets, taps)) * 2 - 1).astype(np.float32) / math.sqrt(taps)
+        self.idf = np.ones(n_buckets, dtype=np.float32)
+        self._word = lru_cache(maxsize=1 << 16)(self._word_features)
+
+    def _word_features(self, word: str) -> Tuple[int, ...]:
+        """The word's own bucket first, then one per character trigram."""
+        padded = f"<{word}>"
+        grams = (padded[i : i + n] for n in _CHAR_NGRAMS for i in range(len(padded) - n + 1))
+        return (_bucket("w:" + word, self.n_buckets), *(_bucket("c:" + g, self.n_buckets) for g in grams))
+
+    def features(self, texts: Sequence[Sequence[str]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """(row, bucket, weight) arrays for tokenized texts; buckets repeat for repeated features.
+
+        Python only touches each distinct word once; expanding tokens into
+        their n-grams and pairing neighbours into bigrams is done in numpy.
+        """
+        lengths = np.fromiter((len(t) for t in texts), dtype=np.int64, count=len(texts))
+        words: Dict[str, int] = {}
+        ids = np.fromiter((words.setdefault(w, len(words)) for t in texts for w in t), dtype=np.int64)
+        per_word = [self._word(w) for w in words]
+        n_feats = np.fromiter((len(f) for f in per_word), dtype=np.int64, count=len(per_word))
+        flat = np.fromiter((b for f in per_word for b in f), dtype=np.int64)
+        first = np.concatenate([[0], np.cumsum(n_feats)[:-1]]).astype(np.int64)
+
+        token_row = np.repeat(np.arange(len(texts), dtype=np.int64), lengths)
+        counts = n_feats[ids]
+        # Gather every token's feature run: its word's start plus 0, 1, ... count-1.
+        starts = np.repeat(first[ids], counts)
+        steps = np.arange(counts.sum(), dtype=np.int64) - np.repeat(np.cumsum(counts) - counts, counts)
+        buckets = flat[starts + steps]
+        weights = np.where(steps == 0, _WORD_WEIGHT, _CHAR_WEIGHT).astype(np.float32)
+        rows = np.repeat(token_row, counts)
+
+        # Bigrams: neighbouring tokens of the same text, hashed from their word buckets.
+        word_bucket = flat[first[ids]]
+        pair = token_row[1:] == token_row[:-1]
+        bigrams = ((word_bucket[:-1][pair] * _BIGRAM_MIX) ^ word_bucket[1:][pair]) & (self.n_buckets - 1)
+        return (
+            np.concatenate([rows, token_row[1:][pair]]),
+            np.concatenate([buckets, bigrams]),
+            np.concatenate([weights, np.full(len(bigrams), _BIGRAM_WEIGHT, dtype=np.float32)]),
+        )
+
+    def fit(self, texts: Sequence[Sequence[str]], batch: int = 4096) -> "HashingEncoder":
+        """Bucket IDF over tokenized texts (one document frequency per bucket)."""
+        df = np.zeros(self.n_buckets, dtype=np.int64)
+        for lo in range(0, len(texts), batch):
+            rows, buckets, _ = self.features(texts[lo : lo + batch])
+            keys = np.sort(rows * self.n_buckets + buckets)
+            first = np.concatenate([[True], keys[1:] != keys[:-1]])  # once per (text, bucket)
+            df += np.bincount(keys[first] % self.n_buckets, minlength=self.n_buckets)
+        self.idf = (np.log((len(texts) + 1) / (df + 1)) + 1.0).astype(np.float32)
+        return self
+
+    def encode(self, texts: Sequence[Sequence[str]], batch: int = 1024) -> np.ndarray:
+        """(len(texts), dim) float32, unit rows (all-zero for texts without tokens)."""
+        out = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for lo in range(0, len(texts), batch):
+            rows, b, w = self.features(texts[lo : lo + batch])
+            if not len(b):
+                continue
+            w = w * self.idf[b]
+            # Scatter every feature into its projection taps in one bincount.
+            flat = (rows[:, None] * self.dim + self._proj[b]).ravel()
+            n = min(batch, len(texts) - lo)
+            dense = np.bincount(flat, weights=(w[:, None] * self._sign[b]).ravel(), minlength=n * self.dim)
+            out[lo : lo + n] = dense.reshape(n, self.dim)
+        norms = np.linalg.norm(out, axis=1, keepdims=True)
+        np.divide(out, norms, out=out, where=norms > 0)
+        return out
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest scores, best first (ties by index)."""
+    if len(scores) > k:
+        part = np.argpartition(-scores, k - 1)[:k]
+    else:
+        part = np.arange(len(scores))
+    return part[np.lexsort((part, -scores[part]))]
+
+
+class IVFIndex:
+    """Inverted-file approximate nearest-neighbour index for unit vectors (inner product).
+
+    Spherical k-means on a sample picks ``n_lists`` centroids (about
+    4·√n); every vector is filed under its nearest one and stored
+    contiguously per list. A query scores the centroids, then only the
+    ``n_probe`` closest lists, each as one matrix-vector product over a
+    slice. Below ``exact_below`` vectors it is a plain exact scan.
+    """
+
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        n_lists: Optional[int] = None,
+        n_probe: int = 16,
+        train_iters: int = 10,
+        seed: int = 0,
+        exact_below: int = 20000,
+    ):
+        n = len(vectors)
+        self.n_probe = n_probe
+        self.centroids: Optional[np.ndarray] = None
+        if n < exact_below:
+            self.vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+            self.ids = np.arange(n, dtype=np.int64)
+            self.offsets = np.asarray([0, n], dtype=np.int64)
+            return
+        n_lists = n_lists or max(1, min(n // 32, int(4 * math.sqrt(n))))
+        rng = np.random.default_rng(seed)
+        self.centroids = self._train(vectors, n_lists, train_iters, rng)
+        assign = self._assign(vectors, self.centroids)
+        order = np.argsort(assign, kind="stable")
+        self.vectors = np.ascontiguousarray(vectors[order], dtype=np.float32)
+        self.ids = order.astype(np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(np.bincount(assign, minlength=n_lists))]).astype(np.int64)
+
+    @property
+    def n_lists(self) -> int:
+        return len(self.offsets) - 1
+
+    @staticmethod
+    def _assign(vectors: np.ndarray, centroids: np.ndarray, chunk: int = 8192) -> np.ndarray:
+        """Nearest centroid of every vector, scored a chunk at a time to bound memory."""
+        parts = [np.argmax(vectors[i : i + chunk] @ centroids.T, axis=1) for i in range(0, len(vectors), chunk)]
+        return np.concatenate(parts)
+
+    @classmethod
+    def _train(cls, vectors: np.ndarray, n_lists: int, iters: int, rng: np.random.Generator) -> np.ndarray:
+        sample = vectors[rng.choice(len(vectors), size=min(len(vectors), n_lists * 64), replace=False)]
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(iters):
+            assign = cls._assign(sample, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, sample)
+            empty = np.bincount(assign, minlength=n_lists) == 0
+            sums[empty] = sample[rng.choice(len(sample), size=int(empty.sum()), replace=False)]
+            norms = np.linalg.norm(sums, axis=1, keepdims=True)
+            centroids = sums / np.where(norms > 0, norms, 1.0)
+        return centroids.astype(np.float32)
+
+    def search(self, queries: np.ndarray, k: int, n_probe: Optional[int] = None) -> List[List[Tuple[int, float]]]:
+        """Per query, up to k (vector id, inner product) pairs, best first."""
+        if self.centroids is None:
+            return self.exact(queries, k)
+        n_probe = min(self.n_lists, n_probe or self.n_probe)
+        lists = np.argpartition(-(queries @ self.centroids.T), n_probe - 1, axis=1)[:, :n_probe]
+        out: List[List[Tuple[int, float]]] = []
+        for q, probe in zip(queries, lists):
+            spans = [(self.offsets[l], self.offsets[l + 1]) for l in probe]
+            rows = np.concatenate([np.arange(a, b) for a, b in spans])
+            scores = np.concatenate([self.vectors[a:b] @ q for a, b in spans])
+            best = top_k(scores, k)
+            out.append([(int(self.ids[rows[i]]), float(scores[i])) for i in best])
+        return out
+
+    def exact(self, queries: np.ndarray, k: int) -> List[List[Tuple[int, float]]]:
+        """Brute-force top-k over every vector (the recall reference)."""
+        out: List[List[Tuple[int, float]]] = []
+        for q in queries:
+            scores = self.vectors @ q
+            out.append([(int(self.ids[i]), float(scores[i])) for i in top_k(scores, k)])
+        return out
+
+
+class DenseIndex:
+    """Encoder plus ANN index over passages, with the lexical engines' ``search_batch``."""
+
+    def __init__(self, texts: Sequence[Sequence[str]], dim: int = 256, n_probe: int = 16):
+        self.encoder = HashingEncoder(dim=dim).fit(texts)
+        self.index = IVFIndex(self.encoder.encode(texts), n_probe=n_probe)
+
+    def search_batch(self, queries: List[List[str]], k: int) -> List[List[Tuple[int, float]]]:
+        """Up to k (passage index, cosine) per tokenized query, cosine > 0."""
+        if not queries:
+            return []
+        hits = self.index.search(self.encoder.encode(queries), k)
+        return [[(i, s) for i, s in h if s > 0] for h in hits]
+
+    def search(self, q_terms: List[str], k: int) -> List[Tuple[int, float]]:
+        return self.search_batch([q_terms], k)[0]
@@ -0,0 +1,230 @@
+from __future__ import annotations
+
+import asyncio
+import time
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from schemas.tools import ToolCall, ToolResult
+from schemas.trace import RunTrace, TraceEvent
+from utils.cache import stable_hash
+from utils.metrics import SPECULATION_SECONDS_TOTAL, SPECULATIVE_CALLS_TOTAL
+
+
+@dataclass
+class SpeculationStats:
+    started: int = 0
+    hits: int = 0  # the controller asked for a call already running or done
+    wasted: int = 0  # thrown away: the controller chose something else
+    skipped: int = 0  # not started: at the in-flight cap or over the run's budget
+    saved_ms: float = 0.0
+    wasted_ms: float = 0.0
+
+
+class _TrackedExecutor(Executor):
+    """One speculative call's view of the speculation pool: remembers the work it submitted.
+
+    Cancelling the asyncio side cannot stop a thread that already started,
+    so the call only counts as finished once this future is done.
+    """
+
+    def __init__(self, inner: Executor):
+        self.inner = inner
+        self.work: Optional[Future] = None
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        self.work = self.inner.submit(fn, *args, **kwargs)
+        return self.work
+
+
+class _Pending:
+    __slots__ = ("call", "task", "executor", "started", "ended", "wasted")
+
+    def __init__(self, call: ToolCall, task: "asyncio.Future[ToolResult]", executor: _TrackedExecutor):
+        self.call = call
+        self.task = task
+        self.executor = executor
+        self.started = time.perf_counter()
+        self.ended: Optional[float] = None  # when the tool really stopped, thread included
+        self.wasted = False
+
+    def ran_ms(self, until: float) -> float:
+        """How long the call had run by ``until`` (or in total, if it finished earlier)."""
+        return (min(until, self.ended or until) - self.started) * 1000
+
+
+class Speculator:
+    """Starts the rule router's predicted tool calls while the LLM controller is deciding.
+
+    Only tools whose spec is ``speculative`` (pure and cheap) qualify. When
+    the controller's choice contains the same call (arguments compared with
+    schema defaults filled in), its result is used as is; otherwise it is
+    cancelled and counted as wasted. At most ``max_inflight`` speculative
+    calls run at once, and a run that has wasted ``budget_ms`` of tool time
+    stops speculating. Thread tools run on a pool of their own, so wasted
+    work never holds the registry's shared threads; a call keeps its slot,
+    and is charged, until its thread has actually finished.
+    """
+
+    def __init__(self, registry: Any, enabled: bool = False, max_inflight: int = 4, budget_ms: float = 250.0):
+        self.registry = registry
+        self.enabled = enabled
+        self.max_inflight = max_inflight
+        self.budget_ms = budget_ms
+        self.inflight = 0
+        self.stats = SpeculationStats()
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def executor(self) -> Executor:
+        if self._pool is None:
+            # One thread per slot: a speculative call never queues behind another.
+            self._pool = ThreadPoolExecutor(max_workers=max(1, self.max_inflight), thread_name_prefix="speculate")
+        return self._pool
+
+    def shutdown(self) -> None:
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    def session(self, run: RunTrace, clock: Callable[[], int]) -> "Speculation":
+        return Speculation(self, run, clock)
+
+    def eligible(self, call: ToolCall) -> bool:
+        try:
+            spec = self.registry.get(call.tool_name).spec
+        except KeyError:
+            return False
+        return spec.speculative and spec.permission.allow and not self.registry.validate_arguments(call.tool_name, call.arguments)
+
+    def key(self, call: ToolCall) -> Optional[str]:
+        try:
+            schema = self.registry.get(call.tool_name).spec.input_schema
+        except KeyError:
+            return None
+        defaults = {k: p["default"] for k, p in schema.get("properties", {}).items() if "default" in p}
+        return stable_hash([call.tool_name, {**defaults, **call.arguments}])
+
+    def metrics(self) -> Dict[str, Any]:
+        s = self.stats
+        decided = s.hits + s.wasted
+        return {
+            "enabled": self.enabled,
+            "max_inflight": self.max_inflight,
+            "budget_ms": self.budget_ms,
+            "inflight": self.inflight,
+            "hit_rate": s.hits / decided if decided else None,
+            **asdict(s),
+        }
+
+
+class Speculation:
+    """One run's speculative calls: ``expect`` the prediction, ``start`` it
+    when the LLM call goes out, ``take`` what the controller chose and
+    ``discard`` the rest at the end of the step."""
+
+    def __init__(self, speculator: Speculator, run: RunTrace, clock: Callable[[], int]):
+        self.speculator = speculator
+        self.run = run
+        self.clock = clock
+        self._expected: List[ToolCall] = []
+        self._pending: Dict[str, _Pending] = {}
+
+    def expect(self, calls: Sequence[ToolCall]) -> None:
+        self._expected = [c for c in calls if self.speculator.eligible(c)] if self.speculator.enabled else []
+
+    def start(self) -> None:
+        """Launch the expected calls (no-op if there are none or the run is over budget)."""
+        s = self.speculator
+        calls, self._expected = self._expected, []
+        for call in calls:
+            key = s.key(call)
+            if key is None or key in self._pending:
+                continue
+            if s.inflight >= s.max_inflight or self.run.counters.get("speculation_wasted_ms", 0) >= s.budget_ms:
+                s.stats.skipped += 1
+                SPECULATIVE_CALLS_TOTAL.inc(outcome="skipped")
+                continue
+            executor = _TrackedExecutor(s.executor())
+            task = asyncio.ensure_future(s.registry.arun(call.tool_name, call.arguments, executor=executor))
+            pending = _Pending(call, task, executor)
+            task.add_done_callback(lambda _t, p=pending: self._settle(p))
+            s.inflight += 1
+            s.stats.started += 1
+            self._pending[key] = pending
+
+    def _settle(self, pending: _Pending) -> None:
+        """The asyncio side is done; the call is finished once its thread (if any) is too."""
+        work = pending.executor.work
+        if work is None or work.done():
+            self._finished(pending)
+            return
+        loop = asyncio.get_running_loop()
+
+        def later(_work: Future) -> None:
+            try:
+                loop.call_soon_threadsafe(self._finished, pending)
+            except RuntimeError:
+                pass  # the loop is gone (shutdown): nothing left to account for
+
+        work.add_done_callback(later)
+
+    def _finished(self, pending: _Pending) -> None:
+        pending.ended = time.perf_counter()
+        self.speculator.inflight -= 1
+        if pending.wasted:
+            self._record("wasted", pending.call, round(pending.ran_ms(pending.ended), 3))
+
+    async def take(self, call: ToolCall) -> Optional[ToolResult]:
+        """The speculative result for ``call``, or None if it was not started."""
+        if not self._pending:
+            return None
+        pending = self._pending.pop(self.speculator.key(call) or "", None)
+        if pending is None:
+            return None
+        asked = time.perf_counter()
+        result = await pending.task
+        # Only the part that overlapped the controller is time the step did not wait.
+        saved_ms = round(pending.ran_ms(asked), 3)
+        self._record("hit", call, saved_ms)
+        return result
+
+    def discard(self) -> None:
+        """Cancel every speculative call the controller did not ask for.
+
+        Each is charged as wasted once it has really stopped: a tool thread
+        that already started cannot be interrupted and runs to completion.
+        """
+        for pending in self._pending.values():
+            pending.wasted = True
+            if not pending.task.done():
+                pending.task.cancel()
+            elif not pending.task.cancelled():
+                pending.task.exception()  # retrieved: nobody will await it
+            if pending.ended is not None:
+                self._record("wasted", pending.call, round(pending.ran_ms(pending.ended), 3))
+        self._pending.clear()
+        self._expected = []
+
+    def _record(self, outcome: str, call: ToolCall, ms: float) -> None:
+        stats = self.speculator.stats
+        c = self.run.counters
+        if outcome == "hit":
+            stats.hits += 1
+            stats.saved_ms += ms
+            c["speculation_hits"] = c.get("speculation_hits", 0) + 1
+            c["speculation_saved_ms"] = round(c.get("speculation_saved_ms", 0.0) + ms, 3)
+        else:
+            stats.wasted += 1
+            stats.wasted_ms += ms
+            c["speculation_wasted"] = c.get("speculation_wasted", 0) + 1
+            c["speculation_wasted_ms"] = round(c.get("speculation_wasted_ms", 0.0) + ms, 3)
+        SPECULATIVE_CALLS_TOTAL.inc(outcome=outcome)
+        SPECULATION_SECONDS_TOTAL.inc(ms / 1000, kind="saved" if outcome == "hit" else "wasted")
+        self.run.events.append(
+            TraceEvent(
+                t_ms=self.clock(),
+                type=f"speculation_{outcome}",
+                data={"tool_name": call.tool_name, "ms": ms},
+            )
+        )
@@ -0,0 +1,236 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# --- JSON extraction ---
+
+
+class JSONObjectScanner:
+    """Finds the first complete top-level JSON object in text that arrives in pieces.
+
+    Leading prose and code fences are skipped. A brace-balanced candidate
+    that does not parse is abandoned and scanning resumes just after its
+    opening brace. Feed stream deltas as they come; ``feed`` returns the
+    object's text as soon as its closing brace arrives, so the rest of the
+    stream can be dropped.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.result: Optional[str] = None
+        self.value: Any = None
+        self._pos = 0
+        self._start = -1
+        self._depth = 0
+        self._in_str = False
+        self._escaped = False
+
+    def feed(self, chunk: str) -> Optional[str]:
+        if self.result is not None:
+            return self.result
+        self.text += chunk
+        text, i = self.text, self._pos
+        while i < len(text):
+            ch = text[i]
+            if self._start < 0:
+                if ch == "{":
+                    self._start, self._depth = i, 1
+            elif self._in_str:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == "\\":
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_str = False
+            elif ch == '"':
+                self._in_str = True
+            elif ch == "{":
+                self._depth += 1
+            elif ch == "}":
+                self._depth -= 1
+                if self._depth == 0:
+                    candidate = text[self._start : i + 1]
+                    try:
+                        value = json.loads(candidate)
+                    except ValueError:
+                        i = self._start  # resume after the failed opening brace
+                        self._start = -1
+                    else:
+                        self.result, self.value, self._pos = candidate, value, i + 1
+                        return candidate
+            i += 1
+        self._pos = i
+        return None
+
+
+def extract_json_object(text: str) -> Optional[Tuple[str, Any]]:
+    """``(json_text, value)`` of the first JSON object embedded in ``text``, or None."""
+    scanner = JSONObjectScanner()
+    if scanner.feed(text) is None:
+        return None
+    return scanner.result, scanner.value
+
+
+# --- argument validation ---
+
+# path, value -> error messages (empty when valid)
+Validator = Callable[[Any, str], List[str]]
+
+
+def _is_number(v: Any) -> bool:
+    if isinstance(v, bool):
+        return False
+    if isinstance(v, (int, float)):
+        return True
+    # The tools' pydantic models coerce numeric strings; do not reject what they accept.
+    if isinstance(v, str):
+        try:
+            float(v)
+        except ValueError:
+            return False
+        return True
+    return False
+
+
+def _is_integer(v: Any) -> bool:
+    if isinstance(v, float):
+        return v.is_integer()
+    if isinstance(v, str):
+        return v.strip().lstrip("+-").isdigit()
+    return _is_number(v)
+
+
+_TYPE_CHECKS: Dict[str, Callable[[Any], bool]] = {
+    "string": lambda v: isinstance(v, str),
+    "integer": _is_integer,
+    "number": _is_number,
+    "boolean": lambda v: isinstance(v, bool),
+    "object": lambda v: isinstance(v, dict),
+    "array": lambda v: isinstance(v, list),
+    "null": lambda v: v is None,
+}
+
+
+def compile_validator(schema: Dict[str, Any]) -> Callable[[Any], List[str]]:
+    """Turn a JSON schema into a function returning error messages for a value.
+
+    Covers what pydantic emits for tool inputs: ``type``, ``properties``,
+    ``required``, ``additionalProperties: false``, numeric bounds, string
+    lengths, ``enum``/``const``, ``items``, ``anyOf`` and local ``$ref``s.
+    The schema is walked once here, so validating a call is a few closure
+    calls rather than a schema interpretation.
+    """
+    defs = schema.get("$defs") or schema.get("definitions") or {}
+    compiled: Dict[str, Validator] = {}
+
+    def ref(name: str) -> Validator:
+        def check(v: Any, path: str) -> List[str]:
+            if name not in compiled:
+                compiled[name] = build(defs.get(name, {}))
+            return compiled[name](v, path)
+
+        return check
+
+    def build(s: Dict[str, Any]) -> Validator:
+        if "$ref" in s:
+            return ref(s["$ref"].rsplit("/", 1)[-1])
+
+        checks: List[Validator] = []
+        if "anyOf" in s or "oneOf" in s:
+            options = [build(o) for o in s.get("anyOf", s.get("oneOf"))]
+
+            def any_of(v: Any, path: str) -> List[str]:
+                if any(not o(v, path) for o in options):
+                    return []
+                return [f"{path or 'value'}: does not match any allowed form"]
+
+            checks.append(any_of)
+
+        t = s.get("type")
+        if t is not None:
+            names = t if isinstance(t, list) else [t]
+            type_checks = [_TYPE_CHECKS[n] for n in names if n in _TYPE_CHECKS]
+            expected = " or ".join(names)
+
+            def type_of(v: Any, path: str) -> List[str]:
+                if any(c(v) for c in type_checks):
+                    return []
+                return [f"{path or 'value'}: expected {expected}, got {type(v).__name__}"]
+
+            checks.append(type_of)
+
+        if "enum" in s or "const" in s:
+            allowed = s["enum"] if "enum" in s else [s["const"]]
+            checks.append(lambda v, p: [] if v in allowed else [f"{p or 'value'}: must be one of {allowed}"])
+
+        bounds = [
+            (k, op)
+            for k, op in (
+                ("minimum", lambda v, b: v >= b),
+                ("maximum", lambda v, b: v <= b),
+                ("exclusiveMinimum", lambda v, b: v > b),
+                ("exclusiveMaximum", lambda v, b: v < b),
+            )
+            if k in s
+        ]
+        if bounds:
+
+            def in_bounds(v: Any, path: str) -> List[str]:
+                if not _is_number(v):
+                    return []
+                n = float(v)
+                return [f"{path or 'value'}: {k} is {s[k]}" for k, op in bounds if not op(n, s[k])]
+
+            checks.append(in_bounds)
+
+        if "minLength" in s or "maxLength" in s:
+            lo, hi = s.get("minLength", 0), s.get("maxLength")
+
+            def length(v: Any, path: str) -> List[str]:
+                if not isinstance(v, str) or (len(v) >= lo and (hi is None or len(v) <= hi)):
+                    return []
+                return [f"{path or 'value'}: length must be between {lo} and {hi if hi is not None else 'any'}"]
+
+            checks.append(length)
+
+        if "properties" in s or "required" in s:
+            props = {name: build(p) for name, p in s.get("properties", {}).items()}
+            required = list(s.get("required", []))
+            closed = s.get("additionalProperties") is False
+
+            def fields(v: Any, path: str) -> List[str]:
+                if not isinstance(v, dict):
+                    return []
+                errors = [f"{path + '.' if path else ''}{name}: required" for name in required if name not in v]
+                for name, value in v.items():
+                    sub = f"{path}.{name}" if path else name
+                    if name in props:
+                        errors += props[name](value, sub)
+                    elif closed:
+                        errors.append(f"{sub}: unexpected field")
+                return errors
+
+            checks.append(fields)
+
+        if "items" in s:
+            item = build(s["items"])
+
+            def items(v: Any, path: str) -> List[str]:
+                if not isinstance(v, list):
+                    return []
+                return [e for i, x in enumerate(v) for e in item(x, f"{path}[{i}]")]
+
+            checks.append(items)
+
+        def validate(v: Any, path: str) -> List[str]:
+            for check in checks:
+                errors = check(v, path)
+                if errors:
+                    return errors
+            return []
+
+        return validate
+
+    root = build(schema)
+    return lambda value: root(value, "")
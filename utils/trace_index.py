@@ -0,0 +1,231 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from schemas.trace import RunTrace
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    created_at_ms INTEGER NOT NULL,
+    duration_ms INTEGER,
+    ok INTEGER NOT NULL,
+    error TEXT,
+    step_count INTEGER NOT NULL,
+    tools TEXT NOT NULL,
+    message TEXT,
+    final TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_created ON runs (created_at_ms DESC, run_id DESC);
+CREATE TABLE IF NOT EXISTS tool_calls (
+    run_id TEXT NOT NULL,
+    step INTEGER NOT NULL,
+    idx INTEGER NOT NULL,
+    tool_name TEXT NOT NULL,
+    created_at_ms INTEGER NOT NULL,
+    duration_ms INTEGER,
+    ok INTEGER NOT NULL,
+    cached INTEGER NOT NULL,
+    PRIMARY KEY (run_id, step, idx)
+);
+CREATE INDEX IF NOT EXISTS tool_calls_tool ON tool_calls (tool_name, created_at_ms);
+"""
+
+_PERCENTILES = (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))
+_PREVIEW_CHARS = 200
+
+
+def _preview(text: Optional[str]) -> Optional[str]:
+    if text is None or len(text) <= _PREVIEW_CHARS:
+        return text
+    return text[:_PREVIEW_CHARS] + "…"
+
+
+def encode_cursor(created_at_ms: int, run_id: str) -> str:
+    return f"{created_at_ms}:{run_id}"
+
+
+def decode_cursor(cursor: str) -> Tuple[int, str]:
+    created, _, run_id = cursor.partition(":")
+    return int(created), run_id
+
+
+class TraceIndex:
+    """SQLite (WAL) index of persisted runs: one summary row per run, one row per tool call.
+
+    Serves filtered, cursor-paginated run summaries and per-tool latency
+    percentiles without loading full traces.
+    """
+
+    def __init__(self, path: str):
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=5)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def add(self, runs: Iterable[RunTrace]) -> None:
+        run_rows: List[Tuple[Any, ...]] = []
+        call_rows: List[Tuple[Any, ...]] = []
+        for run in runs:
+            tools: List[str] = []
+            for s in run.steps:
+                calls = s.tool_calls or ([s.tool_call] if s.tool_call else [])
+                results = s.tool_results or ([s.tool_result] if s.tool_result else [])
+                timings = {t.index: t for t in s.tool_timings}
+                for i, call in enumerate(calls):
+                    t = timings.get(i)
+                    result = results[i] if i < len(results) else None
+                    duration = t.ended_at_ms - t.started_at_ms if t else s.ended_at_ms - s.started_at_ms
+                    call_rows.append(
+                        (
+                            run.run_id,
+                            s.step,
+                            i,
+                            call.tool_name,
+                            run.created_at_ms,
+                            duration,
+                            int(bool(result and result.ok)),
+                            int(bool(result and result.cached)),
+                        )
+                    )
+                    if call.tool_name not in tools:
+                        tools.append(call.tool_name)
+            run_rows.append(
+                (
+                    run.run_id,
+                    run.created_at_ms,
+                    run.duration_ms,
+                    int(run.error is None),
+                    run.error,
+                    len(run.steps),
+                    ",".join(tools),
+                    _preview(str(run.input.get("message", ""))),
+                    _preview(run.final),
+                )
+            )
+        if not run_rows:
+            return
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("DELETE FROM tool_calls WHERE run_id = ?", [(r[0],) for r in run_rows])
+            self._db.executemany("INSERT OR REPLACE INTO runs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", run_rows)
+            self._db.executemany("INSERT INTO tool_calls VALUES (?, ?, ?, ?, ?, ?, ?, ?)", call_rows)
+            self._db.execute("COMMIT")
+
+    def remove(self, run_ids: Iterable[str]) -> None:
+        ids = [(r,) for r in run_ids]
+        with self._lock:
+            self._db.execute("BEGIN")
+            self._db.executemany("DELETE FROM tool_calls WHERE run_id = ?", ids)
+            self._db.executemany("DELETE FROM runs WHERE run_id = ?", ids)
+            self._db.execute("COMMIT")
+
+    def run_ids(self) -> set:
+        with self._lock:
+            return {r[0] for r in self._db.execute("SELECT run_id FROM runs")}
+
+    def query(
+        self,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+        since_ms: Optional[int] = None,
+        until_ms: Optional[int] = None,
+        tool: Optional[str] = None,
+        status: Optional[str] = None,
+        min_duration_ms: Optional[int] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Newest-first run summaries plus the cursor of the next page (None on the last)."""
+        where, args = self._filters(since_ms, until_ms, status)
+        if tool:
+            where.append("EXISTS (SELECT 1 FROM tool_calls c WHERE c.run_id = runs.run_id AND c.tool_name = ?)")
+            args.append(tool)
+        if min_duration_ms is not None:
+            where.append("duration_ms >= ?")
+            args.append(min_duration_ms)
+        if cursor:
+            created, run_id = decode_cursor(cursor)
+            where.append("(created_at_ms, run_id) < (?, ?)")
+            args += [created, run_id]
+        sql = (
+            "SELECT run_id, created_at_ms, duration_ms, ok, error, step_count, tools, message, final FROM runs"
+            + (" WHERE " + " AND ".join(where) if where else "")
+            + " ORDER BY created_at_ms DESC, run_id DESC LIMIT ?"
+        )
+        with self._lock:
+            rows = self._db.execute(sql, args + [limit + 1]).fetchall()
+        page = [
+            {
+                "run_id": r[0],
+                "created_at_ms": r[1],
+                "duration_ms": r[2],
+                "ok": bool(r[3]),
+                "error": r[4],
+                "step_count": r[5],
+                "tools": r[6].split(",") if r[6] else [],
+                "message": r[7],
+                "final": r[8],
+            }
+            for r in rows[:limit]
+        ]
+        next_cursor = encode_cursor(rows[limit - 1][1], rows[limit - 1][0]) if len(rows) > limit and limit > 0 else None
+        return page, next_cursor
+
+    def stats(self, since_ms: Optional[int] = None, until_ms: Optional[int] = None) -> Dict[str, Any]:
+        """Run counts and nearest-rank p50/p95/p99 durations, overall and per tool call."""
+        where, args = self._filters(since_ms, until_ms, None)
+        clause = " WHERE " + " AND ".join(where) if where else ""
+        pct = ", ".join(f"MIN(CASE WHEN rn >= {q} * n THEN duration_ms END)" for _, q in _PERCENTILES)
+
+        runs_sql = (
+            f"WITH r AS (SELECT duration_ms, ok, ROW_NUMBER() OVER (ORDER BY duration_ms) AS rn, "
+            f"COUNT(*) OVER () AS n FROM runs{clause}{' AND' if clause else ' WHERE'} duration_ms IS NOT NULL) "
+            f"SELECT COUNT(*), SUM(1 - ok), AVG(duration_ms), MAX(duration_ms), {pct} FROM r"
+        )
+        tools_sql = (
+            f"WITH r AS (SELECT tool_name, duration_ms, ok, cached, "
+            f"ROW_NUMBER() OVER (PARTITION BY tool_name ORDER BY duration_ms) AS rn, "
+            f"COUNT(*) OVER (PARTITION BY tool_name) AS n FROM tool_calls{clause}) "
+            f"SELECT tool_name, COUNT(*), SUM(1 - ok), SUM(cached), AVG(duration_ms), MAX(duration_ms), {pct} "
+            f"FROM r GROUP BY tool_name ORDER BY tool_name"
+        )
+        with self._lock:
+            run_row = self._db.execute(runs_sql, args).fetchone()
+            tool_rows = self._db.execute(tools_sql, args).fetchall()
+
+        def pcts(values: Tuple[Any, ...]) -> Dict[str, Any]:
+            return {name: v for (name, _), v in zip(_PERCENTILES, values)}
+
+        return {
+            "runs": {
+                "count": run_row[0],
+                "errors": run_row[1] or 0,
+                "mean_ms": run_row[2],
+                "max_ms": run_row[3],
+                **pcts(run_row[4:]),
+            },
+            "tools": {
+                r[0]: {"calls": r[1], "errors": r[2], "cached": r[3], "mean_ms": r[4], "max_ms": r[5], **pcts(r[6:])}
+                for r in tool_rows
+            },
+        }
+
+    @staticmethod
+    def _filters(since_ms: Optional[int], until_ms: Optional[int], status: Optional[str]) -> Tuple[List[str], List[Any]]:
+        where: List[str] = []
+        args: List[Any] = []
+        if since_ms is not None:
+            where.append("created_at_ms >= ?")
+            args.append(since_ms)
+        if until_ms is not None:
+            where.append("created_at_ms < ?")
+            args.append(until_ms)
+        if status == "ok":
+            where.append("ok = 1")
+        elif status == "error":
+            where.append("ok = 0")
+        return where, args
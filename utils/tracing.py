@@ -1,49 +1,540 @@
 from __future__ import annotations
 
+import atexit
 import json
 import os
+import queue
+import re
+import sqlite3
+import threading
 import time
 import uuid
-from dataclasses import asdict
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
 
 from schemas.trace import RunTrace
+from utils.config import settings
+from utils.trace_index import TraceIndex
+
+try:  # POSIX only; without it every writer takes slot 0, as with a single worker
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+_SAVED_RE = re.compile(rb'\{"type": "run_saved", "run_id": "([^"]+)"')
+
+
+@dataclass
+class TraceStoreStats:
+    in_memory: int = 0
+    evicted: int = 0
+    queued: int = 0
+    written: int = 0
+    dropped: int = 0
+    batches: int = 0
+    fsyncs: int = 0
+    segments: int = 0
+    disk_loads: int = 0
+
+
+class TraceBackend:
+    """Where runs are persisted, and looked up once they leave the in-memory ring.
+
+    Callers only enqueue records (``run_created`` / ``run_saved``); a single
+    background thread batches them into ``_write``, so persistence stays off
+    the request path. The queue is bounded: when full, records are dropped
+    and counted (``policy="drop"``) or the caller waits for room
+    (``policy="block"``). Subclasses implement ``_write``, ``load`` and
+    ``recent_ids`` and call ``_start`` at the end of ``__init__``.
+    """
+
+    name = "base"
+    _STOP = object()
+
+    def __init__(self, queue_size: int, policy: str, stats: TraceStoreStats, index: Optional[TraceIndex] = None):
+        self.policy = policy
+        self.stats = stats
+        self.index = index
+        self._queue: "queue.Queue[Any]" = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._loop, name="trace-writer", daemon=True)
+
+    def _start(self) -> None:
+        self._thread.start()
+
+    def submit(self, record: Dict[str, Any]) -> bool:
+        try:
+            if self.policy == "block":
+                self._queue.put(record)
+            else:
+                self._queue.put_nowait(record)
+        except queue.Full:
+            self.stats.dropped += 1
+            return False
+        self.stats.queued = self._queue.qsize()
+        return True
+
+    def load(self, run_id: str) -> Optional[RunTrace]:
+        raise NotImplementedError
+
+    def recent_ids(self, limit: Optional[int] = None) -> List[str]:
+        """Persisted run ids, newest first."""
+        raise NotImplementedError
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        """Wait until everything enqueued so far has been written."""
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self) -> None:
+        if not self._thread.is_alive():
+            return
+        self._queue.put(self._STOP)
+        self._thread.join(timeout=10)
+
+    def _loop(self) -> None:
+        stop = False
+        while not stop:
+            batch = [self._queue.get()]
+            while len(batch) < 256:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            waiters = [item for item in batch if isinstance(item, threading.Event)]
+            stop = any(item is self._STOP for item in batch)
+            records = [item for item in batch if isinstance(item, dict)]
+            try:
+                self._write(records, force_sync=stop)
+            except Exception:
+                self.stats.dropped += len(records)
+            self.stats.queued = self._queue.qsize()
+            for w in waiters:
+                w.set()
+        self._shutdown()
+
+    def _write(self, records: List[Dict[str, Any]], force_sync: bool = False) -> None:
+        raise NotImplementedError
+
+    def _shutdown(self) -> None:
+        """Release files/connections; runs on the writer thread after the last batch."""
+
+
+class SegmentWriter(TraceBackend):
+    """Rotating JSONL segment files in the log directory (``TRACE_BACKEND=local``).
+
+    The run-id -> offset map lives in this process, so only the worker that
+    wrote a run can load it back: run one worker, or use ``SQLiteTraceBackend``.
+    Each writer holds a slot (an exclusive lock on ``writer-<slot>.lock``)
+    and appends, rotates and prunes only its own segments: slot 0 keeps the
+    ``traces-NNNNNN.jsonl`` names, slot N writes ``traces-wN-NNNNNN.jsonl``.
+    Several workers sharing a directory therefore never write to one file.
+
+    Fsync policy: ``always`` after every batch, ``interval`` at most every
+    ``fsync_interval_s``, ``never`` leaves it to the OS.
+    """
+
+    name = "local"
+
+    def __init__(
+        self,
+        directory: Path,
+        segment_max_bytes: int,
+        max_segments: int,
+        fsync: str,
+        fsync_interval_s: float,
+        queue_size: int,
+        policy: str,
+        stats: TraceStoreStats,
+        index: Optional[TraceIndex] = None,
+    ):
+        super().__init__(queue_size, policy, stats, index)
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.max_segments = max_segments
+        self.fsync = fsync
+        self.fsync_interval_s = fsync_interval_s
+        self._lock = threading.Lock()
+        self.slot, self._slot_lock = self._claim_slot(directory)
+        self._prefix = "traces-" if self.slot == 0 else f"traces-w{self.slot}-"
+        # run_id -> (segment, byte offset) of its latest full snapshot
+        self._offsets: "OrderedDict[str, Tuple[Path, int]]" = OrderedDict()
+        own = re.compile(re.escape(self._prefix) + r"\d{6}\.jsonl")
+        self._segments: List[Path] = sorted(p for p in directory.glob("traces-*.jsonl") if own.fullmatch(p.name))
+        self._scan()
+        self._file = None
+        self._open_segment(new=not self._segments)
+        self._last_fsync = time.monotonic()
+        self._start()
+
+    def locate(self, run_id: str) -> Optional[Tuple[Path, int]]:
+        with self._lock:
+            return self._offsets.get(run_id)
+
+    def load(self, run_id: str) -> Optional[RunTrace]:
+        loc = self.locate(run_id)
+        if loc is None:
+            return None
+        seg, offset = loc
+        try:
+            with seg.open("rb") as f:
+                f.seek(offset)
+                rec = json.loads(f.readline())
+        except (OSError, ValueError):
+            return None
+        self.stats.disk_loads += 1
+        return RunTrace.model_validate(rec["run"])
+
+    def recent_ids(self, limit: Optional[int] = None) -> List[str]:
+        with self._lock:
+            ids = list(reversed(self._offsets))
+        return ids if limit is None else ids[:limit]
+
+    @staticmethod
+    def _claim_slot(directory: Path) -> Tuple[int, Any]:
+        """The lowest writer slot no other live process holds, and its (held-open) lock file."""
+        slot = 0
+        while True:
+            lock = (directory / f"writer-{slot}.lock").open("w")
+            if fcntl is None:
+                return slot, lock
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock.close()
+                slot += 1
+                continue
+            return slot, lock
+
+    # --- writer thread ---
+
+    def _scan(self) -> None:
+        """Index every writer's segments (oldest first), so runs from before a restart can be found."""
+        indexed = self.index.run_ids() if self.index is not None else set()
+        missing: Dict[str, RunTrace] = {}
+        segments = []
+        for seg in self.directory.glob("traces-*.jsonl"):
+            try:
+                segments.append((seg.stat().st_mtime, seg))
+            except OSError:
+                continue  # pruned by its writer meanwhile
+        for _, seg in sorted(segments):
+            try:
+                f = seg.open("rb")
+            except OSError:
+                continue
+            with f:
+                while True:
+                    offset = f.tell()
+                    line = f.readline()
+                    if not line:
+                        break
+                    # Records start with type and run_id; only unindexed runs need a full parse.
+                    m = _SAVED_RE.match(line)
+                    if m is None:
+                        continue
+                    run_id = m.group(1).decode()
+                    self._offsets[run_id] = (seg, offset)
+                    self._offsets.move_to_end(run_id)
+                    if self.index is not None and run_id not in indexed:
+                        try:
+                            missing[run_id] = RunTrace.model_validate(json.loads(line)["run"])
+                        except ValueError:
+                            continue  # torn tail from a crash
+        if missing:
+            # Segments written before the index existed (or a lost index file).
+            self.index.add(missing.values())
+        self.stats.segments = len(self._segments)
+
+    def _open_segment(self, new: bool) -> None:
+        if self._file is not None:
+            self._file.close()
+        if new:
+            seq = int(self._segments[-1].stem.rsplit("-", 1)[1]) + 1 if self._segments else 1
+            self._segments.append(self.directory / f"{self._prefix}{seq:06d}.jsonl")
+            self._prune()
+        self._file = self._segments[-1].open("ab")
+        self.stats.segments = len(self._segments)
+
+    def _prune(self) -> None:
+        while self.max_segments and len(self._segments) > self.max_segments:
+            old = self._segments.pop(0)
+            with self._lock:
+                gone = [r for r, (seg, _) in self._offsets.items() if seg == old]
+                for run_id in gone:
+                    del self._offsets[run_id]
+            if self.index is not None:
+                self.index.remove(gone)
+            old.unlink(missing_ok=True)
+
+    def _shutdown(self) -> None:
+        self._file.close()
+        self._slot_lock.close()  # releases the slot
+
+    def _write(self, records: List[Dict[str, Any]], force_sync: bool = False) -> None:
+        saved: Dict[str, Dict[str, Any]] = {}
+        for rec in records:
+            if rec["type"] == "run_saved":
+                saved[rec["run_id"]] = rec["run"]
+            line = (json.dumps(rec, ensure_ascii=False) + "\n").encode("utf-8")
+            if self._file.tell() and self._file.tell() + len(line) > self.segment_max_bytes:
+                self._sync()
+                self._open_segment(new=True)
+            offset = self._file.tell()
+            self._file.write(line)
+            if rec["type"] == "run_saved":
+                with self._lock:
+                    self._offsets[rec["run_id"]] = (self._segments[-1], offset)
+                    self._offsets.move_to_end(rec["run_id"])
+        if records:
+            self._file.flush()
+            self.stats.written += len(records)
+            self.stats.batches += 1
+        if saved and self.index is not None:
+            self.index.add(RunTrace.model_validate(r) for r in saved.values())
+        now = time.monotonic()
+        if records and (
+            force_sync
+            or self.fsync == "always"
+            or (self.fsync == "interval" and now - self._last_fsync >= self.fsync_interval_s)
+        ):
+            self._sync()
+
+    def _sync(self) -> None:
+        if self.fsync == "never":
+            return
+        os.fsync(self._file.fileno())
+        self._last_fsync = time.monotonic()
+        self.stats.fsyncs += 1
+
+
+class SQLiteTraceBackend(TraceBackend):
+    """Full runs as JSON rows in one SQLite (WAL) file shared by every worker (``TRACE_BACKEND=sqlite``).
+
+    A run written by one uvicorn process can be read by any other, including
+    runs still in progress (stored at creation, replaced when saved). Only
+    the newest ``max_runs`` are kept; pruned runs leave the index too.
+    ``fsync="always"`` maps to ``synchronous=FULL``, anything else to
+    ``NORMAL`` (durable at WAL checkpoints).
+    """
+
+    name = "sqlite"
+
+    def __init__(
+        self,
+        path: str,
+        max_runs: int,
+        fsync: str,
+        queue_size: int,
+        policy: str,
+        stats: TraceStoreStats,
+        index: Optional[TraceIndex] = None,
+    ):
+        super().__init__(queue_size, policy, stats, index)
+        self.path = path
+        self.max_runs = max_runs
+        Path(path).parent.mkdir(parents=True, exist_ok=True)
+        self._write_db = self._connect(fsync)
+        self._write_db.execute(
+            "CREATE TABLE IF NOT EXISTS traces ("
+            "run_id TEXT PRIMARY KEY, created_at_ms INTEGER NOT NULL, finished INTEGER NOT NULL, data TEXT NOT NULL)"
+        )
+        self._write_db.execute("CREATE INDEX IF NOT EXISTS traces_created ON traces (created_at_ms DESC)")
+        # Request threads read on their own connection so they never wait on a write transaction.
+        self._read_lock = threading.Lock()
+        self._read_db = self._connect(fsync)
+        self._since_prune = 0
+        self._start()
+
+    def _connect(self, fsync: str) -> sqlite3.Connection:
+        db = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=5)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute(f"PRAGMA synchronous={'FULL' if fsync == 'always' else 'NORMAL'}")
+        return db
+
+    def load(self, run_id: str) -> Optional[RunTrace]:
+        with self._read_lock:
+            row = self._read_db.execute("SELECT data FROM traces WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            return None
+        self.stats.disk_loads += 1
+        return RunTrace.model_validate_json(row[0])
+
+    def recent_ids(self, limit: Optional[int] = None) -> List[str]:
+        with self._read_lock:
+            rows = self._read_db.execute(
+                "SELECT run_id FROM traces ORDER BY created_at_ms DESC LIMIT ?", (-1 if limit is None else limit,)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def _write(self, records: List[Dict[str, Any]], force_sync: bool = False) -> None:
+        if not records:
+            return
+        created: List[Tuple[Any, ...]] = []
+        saved: Dict[str, Dict[str, Any]] = {}
+        for rec in records:
+            if rec["type"] == "run_saved":
+                saved[rec["run_id"]] = rec["run"]
+            elif rec["type"] == "run_created":
+                stub = {"run_id": rec["run_id"], "created_at_ms": rec["t_ms"], "input": rec["input"]}
+                created.append((rec["run_id"], rec["t_ms"], json.dumps(stub, ensure_ascii=False)))
+        db = self._write_db
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            db.executemany("INSERT OR IGNORE INTO traces VALUES (?, ?, 0, ?)", created)
+            db.executemany(
+                "INSERT OR REPLACE INTO traces VALUES (?, ?, 1, ?)",
+                [(r["run_id"], r["created_at_ms"], json.dumps(r, ensure_ascii=False)) for r in saved.values()],
+            )
+            db.execute("COMMIT")
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        self.stats.written += len(records)
+        self.stats.batches += 1
+        if saved and self.index is not None:
+            self.index.add(RunTrace.model_validate(r) for r in saved.values())
+        self._since_prune += len(created) + len(saved)
+        if self.max_runs and self._since_prune >= 1000:
+            self._since_prune = 0
+            self._prune()
+
+    def _prune(self) -> None:
+        gone = [
+            r[0]
+            for r in self._write_db.execute(
+                "SELECT run_id FROM traces ORDER BY created_at_ms DESC LIMIT -1 OFFSET ?", (self.max_runs,)
+            )
+        ]
+        if not gone:
+            return
+        self._write_db.executemany("DELETE FROM traces WHERE run_id = ?", [(r,) for r in gone])
+        if self.index is not None:
+            self.index.remove(gone)
+
+    def _shutdown(self) -> None:
+        self._write_db.close()
 
 
 class TraceStore:
-    """In-memory store + optional JSONL persistence."""
+    """Bounded in-memory ring of recent runs in front of a persistent ``TraceBackend``.
 
-    def __init__(self, log_dir: str = ".runs"):
-        self._runs: Dict[str, RunTrace] = {}
+    The ring holds at most ``capacity`` runs no older than ``max_age_s``;
+    runs that are not in it (evicted, or handled by another worker) are
+    loaded from the backend on demand. ``backend`` is ``local`` (JSONL
+    segments, one worker) or ``sqlite`` (shared by all workers).
+    """
+
+    def __init__(
+        self,
+        log_dir: str = ".runs",
+        capacity: Optional[int] = None,
+        max_age_s: Optional[float] = None,
+        backend: Optional[str] = None,
+    ):
+        self._runs: "OrderedDict[str, RunTrace]" = OrderedDict()
+        self._lock = threading.Lock()  # sync endpoints read from FastAPI's threadpool
         self._log_dir = Path(log_dir)
         self._log_dir.mkdir(parents=True, exist_ok=True)
+        self.capacity = capacity or settings.trace_capacity
+        self.max_age_s = max_age_s if max_age_s is not None else settings.trace_max_age_s
+        self.stats = TraceStoreStats()
+        # Summary rows for filtering/pagination/aggregates; fed by the writer thread.
+        self.index = TraceIndex(settings.trace_index_path or str(self._log_dir / "trace_index.sqlite"))
+        self.backend = self._make_backend(backend or settings.trace_backend)
+        atexit.register(self.close)
+
+    def _make_backend(self, name: str) -> TraceBackend:
+        common = dict(
+            queue_size=settings.trace_queue_size, policy=settings.trace_queue_policy, stats=self.stats, index=self.index
+        )
+        if name == "sqlite":
+            return SQLiteTraceBackend(
+                settings.trace_db_path or str(self._log_dir / "traces.sqlite"),
+                max_runs=settings.trace_db_max_runs,
+                fsync=settings.trace_fsync,
+                **common,
+            )
+        if name != "local":
+            raise ValueError(f"unknown TRACE_BACKEND {name!r} (expected 'local' or 'sqlite')")
+        return SegmentWriter(
+            self._log_dir,
+            segment_max_bytes=settings.trace_segment_max_bytes,
+            max_segments=settings.trace_max_segments,
+            fsync=settings.trace_fsync,
+            fsync_interval_s=settings.trace_fsync_interval_s,
+            **common,
+        )
 
     @staticmethod
     def now_ms() -> int:
         return int(time.time() * 1000)
 
-    def new_run(self, input_payload: dict) -> RunTrace:
-        run_id = str(uuid.uuid4())
+    def new_run(self, input_payload: dict, run_id: Optional[str] = None) -> RunTrace:
+        run_id = run_id or str(uuid.uuid4())
         run = RunTrace(run_id=run_id, created_at_ms=self.now_ms(), input=input_payload)
-        self._runs[run_id] = run
-        self._append_jsonl(run_id, {"type": "run_created", "t_ms": self.now_ms(), "input": input_payload})
+        self._remember(run)
+        self.backend.submit({"type": "run_created", "run_id": run_id, "t_ms": run.created_at_ms, "input": input_payload})
         return run
 
     def get(self, run_id: str) -> Optional[RunTrace]:
-        return self._runs.get(run_id)
+        with self._lock:
+            run = self._runs.get(run_id)
+        if run is not None:
+            return run
+        return self.backend.load(run_id)
 
     def list_runs(self, limit: int = 50) -> List[RunTrace]:
-        return list(self._runs.values())[-limit:][::-1]
+        with self._lock:
+            self._evict()
+            out = list(reversed(self._runs.values()))[:limit]
+            seen = set(self._runs)
+        if len(out) < limit:
+            # Older runs (or other workers' runs) are not in the ring: continue from the backend, newest first.
+            for run_id in self.backend.recent_ids(limit + len(seen)):
+                if len(out) >= limit:
+                    break
+                if run_id not in seen:
+                    run = self.backend.load(run_id)
+                    if run is not None:
+                        out.append(run)
+        return out
 
     def save(self, run: RunTrace) -> None:
-        self._runs[run.run_id] = run
-        self._append_jsonl(run.run_id, {"type": "run_saved", "t_ms": self.now_ms(), "duration_ms": run.duration_ms})
+        self._remember(run)
+        # Snapshot now: the writer thread must not serialise a run the caller may still touch.
+        snapshot = run.model_dump(mode="json")
+        self.backend.submit(
+            {"type": "run_saved", "run_id": run.run_id, "t_ms": self.now_ms(), "duration_ms": run.duration_ms, "run": snapshot}
+        )
+
+    def flush(self, timeout: Optional[float] = None) -> None:
+        self.backend.flush(timeout)
+
+    def close(self) -> None:
+        self.backend.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        self.stats.in_memory = len(self._runs)
+        return {"backend": self.backend.name, "capacity": self.capacity, "max_age_s": self.max_age_s, **asdict(self.stats)}
+
+    def _remember(self, run: RunTrace) -> None:
+        with self._lock:
+            self._runs[run.run_id] = run
+            self._runs.move_to_end(run.run_id)
+            self._evict()
 
-    def _append_jsonl(self, run_id: str, payload: dict) -> None:
-        path = self._log_dir / f"{run_id}.jsonl"
-        with path.open("a", encoding="utf-8") as f:
-            f.write(json.dumps(payload, ensure_ascii=False) + "\n")
+    def _evict(self) -> None:
+        cutoff = self.now_ms() - self.max_age_s * 1000 if self.max_age_s else None
+        while self._runs:
+            run_id, oldest = next(iter(self._runs.items()))
+            if len(self._runs) <= self.capacity and (cutoff is None or oldest.created_at_ms >= cutoff):
+                break
+            del self._runs[run_id]
+            self.stats.evicted += 1
 
 
-trace_store = TraceStore(log_dir=os.getenv("APP_LOG_DIR", ".runs"))
+trace_store = TraceStore(log_dir=settings.app_log_dir)